@@ -0,0 +1,186 @@
+# annotations.py
+"""
+目标集合的列式 (struct-of-arrays) 存储：每个字段一个定长类型数组，而不是每个目标一个 dict。
+
+    coords       float32 N×K  坐标 (矩形只用前 4 列，顶点较少的多边形用 NaN 补齐；由 dict 列表构造时为 float64)
+    kinds        uint8   N    KIND_BOX / KIND_POLY
+    class_ids    int32   N    类别索引，对应 class_names
+    ids          int32   N    目标编号 (从 1 开始，取子集后保持不变)
+    visible      bool    N    勾选状态 (界面列表、点选与绘图共用同一个数组)
+    score        float32 N    置信度 (检测结果)，标注为 1
+    line_starts / line_ends   int64 N  原始行在 raw_text 中的位置
+
+每个目标的开销约 60 字节 (加上原始文本)；旧接口需要的 obj['class_name'] 等通过 AnnotationView 按需读取。
+"""
+import numpy as np
+
+from geometry import ObjectGeometry, box_vertices, poly_vertices
+
+KIND_BOX, KIND_POLY = 0, 1
+KIND_NAMES = ('box', 'poly')
+
+
+class AnnotationView:
+    """单个目标的只读视图，支持旧版 dict 的读取方式 (obj['class_name'] / obj.get('raw_line'))"""
+    __slots__ = ('owner', 'index')
+    KEYS = ('type', 'coords', 'class_name', 'id', 'raw_line')
+
+    def __init__(self, owner, index):
+        self.owner = owner
+        self.index = index
+
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+    def keys(self):
+        return self.KEYS
+
+    @property
+    def type(self):
+        return KIND_NAMES[self.owner.kinds[self.index]]
+
+    @property
+    def coords(self):
+        row = self.owner.coords[self.index]
+        if self.owner.kinds[self.index] == KIND_BOX:
+            return row[:4].tolist()
+        return row[~np.isnan(row)].tolist()
+
+    @property
+    def class_name(self):
+        return self.owner.class_name(self.index)
+
+    @property
+    def id(self):
+        return int(self.owner.ids[self.index])
+
+    @property
+    def raw_line(self):
+        return self.owner.raw_line(self.index)
+
+
+class _ItemTexts:
+    """列表控件的行文字 "#编号 类别"，按需生成而不是预先构造 N 个字符串"""
+
+    def __init__(self, owner, max_len):
+        self.ids = owner.ids
+        self.class_ids = owner.class_ids
+        self.names = [n if len(n) <= max_len else n[:max_len - 2] + ".." for n in owner.class_names]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return f"#{self.ids[index]} {self.names[self.class_ids[index]]}"
+
+
+class AnnotationSet:
+    def __init__(self, coords, kinds, class_ids, class_names, raw_text='', line_starts=None, line_ends=None,
+                 ids=None, visible=None, score=None):
+        n = len(coords)
+        self.coords = coords
+        self.kinds = kinds
+        self.class_ids = class_ids
+        self.class_names = class_names
+        self.raw_text = raw_text
+        self.line_starts = line_starts if line_starts is not None else np.zeros(n, dtype=np.int64)
+        self.line_ends = line_ends if line_ends is not None else np.zeros(n, dtype=np.int64)
+        self.ids = ids if ids is not None else np.arange(1, n + 1, dtype=np.int32)
+        self.visible = visible if visible is not None else np.ones(n, dtype=bool)
+        self.score = score if score is not None else np.ones(n, dtype=np.float32)
+        self._geometry = None
+
+    # ---------- 构造 ----------
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.int32), [])
+
+    @classmethod
+    def from_columns(cls, columns):
+        """由 parsers.parse_label_columns 的结果构造 (坐标等数组直接共用，不复制)"""
+        raw_lines = columns['raw_lines']
+        n = len(columns['coords'])
+        lengths = np.fromiter(map(len, raw_lines), dtype=np.int64, count=n)
+        # 保留下来的原始行以换行连接成一个缓冲区，每个目标记录其在缓冲区中的起止位置
+        ends = np.cumsum(lengths + 1) - 1
+        return cls(columns['coords'], np.full(n, KIND_NAMES.index(columns['type']), dtype=np.uint8),
+                   np.asarray(columns['class_ids'], dtype=np.int32), list(columns['class_names']),
+                   '\n'.join(raw_lines), ends - lengths, ends, score=columns['score'])
+
+    @classmethod
+    def from_objects(cls, objects):
+        """由旧版 list-of-dicts 构造 (box 与 poly 可以混合)"""
+        n = len(objects)
+        if n == 0:
+            return cls.empty()
+        width = max(4, max(len(obj['coords']) for obj in objects))
+        coords = np.full((n, width), np.nan, dtype=np.float64)  # 保持 Python float 的精度
+        for i, obj in enumerate(objects):
+            coords[i, :len(obj['coords'])] = obj['coords']
+        kinds = np.array([KIND_NAMES.index(obj['type']) for obj in objects], dtype=np.uint8)
+        class_names = sorted(set(obj['class_name'] for obj in objects))
+        lookup = {name: i for i, name in enumerate(class_names)}
+        class_ids = np.array([lookup[obj['class_name']] for obj in objects], dtype=np.int32)
+        raw_lines = [obj.get('raw_line', '') for obj in objects]
+        lengths = np.array([len(r) for r in raw_lines], dtype=np.int64)
+        ends = np.cumsum(lengths + 1) - 1
+        ids = np.array([obj.get('id', i + 1) for i, obj in enumerate(objects)], dtype=np.int32)
+        return cls(coords, kinds, class_ids, class_names, '\n'.join(raw_lines), ends - lengths, ends, ids)
+
+    # ---------- 访问 ----------
+    def __len__(self):
+        return len(self.coords)
+
+    def __getitem__(self, index):
+        return AnnotationView(self, int(index))
+
+    def __iter__(self):
+        return (AnnotationView(self, i) for i in range(len(self)))
+
+    def class_name(self, index):
+        return self.class_names[self.class_ids[index]]
+
+    def raw_line(self, index):
+        return self.raw_text[self.line_starts[index]:self.line_ends[index]]
+
+    @property
+    def labels(self):
+        """每个目标的类别名 (object 数组)"""
+        if not len(self):
+            return np.zeros(0, dtype=object)
+        return np.array(self.class_names, dtype=object)[self.class_ids]
+
+    @property
+    def geometry(self):
+        """geometry.ObjectGeometry，第一次访问时计算 (预取线程中提前访问即可在后台算好)"""
+        if self._geometry is None:
+            is_box = self.kinds == KIND_BOX
+            if is_box.all():
+                self._geometry = ObjectGeometry(box_vertices(self.coords[:, :4]), is_box)
+            elif not is_box.any() and not np.isnan(self.coords).any():
+                self._geometry = ObjectGeometry(poly_vertices(self.coords), is_box)
+            else:
+                self._geometry = ObjectGeometry.from_objects(list(self))
+        return self._geometry
+
+    def take(self, indices):
+        """取出部分目标 (编号、可见状态与已算好的几何量随之取出，原始文本缓冲区共用)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        sub = AnnotationSet(self.coords[indices], self.kinds[indices], self.class_ids[indices], self.class_names,
+                            self.raw_text, self.line_starts[indices], self.line_ends[indices],
+                            self.ids[indices], self.visible[indices], self.score[indices])
+        if self._geometry is not None:
+            sub._geometry = self._geometry.take(indices)
+        return sub
+
+    def item_texts(self, max_len=10):
+        """列表控件的行文字，类别名超过 max_len 个字符时截断"""
+        return _ItemTexts(self, max_len)
@@ -0,0 +1,187 @@
+# batch_render.py
+"""
+命令行批量渲染：将整个图片目录与标注目录配对，解析并绘制后输出到目标目录。
+
+用法示例:
+    python batch_render.py --images DOTA/images --labels DOTA/labelTxt --output out --dataset DOTA
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image
+
+import parsers
+import drawer
+import image_source
+from annotations import AnnotationSet
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+
+def shared_label_file(label_dir, dataset_type=None):
+    """目录中唯一的多图片标注文件 (COCO JSON 一个文件包含所有图片的标注)，没有或不唯一时返回 None"""
+    exts = parsers.label_extensions(dataset_type, shared=True)
+    if not exts:
+        return None
+    names = [n for n in os.listdir(label_dir) if os.path.splitext(n)[1].lower() in exts]
+    return os.path.join(label_dir, names[0]) if len(names) == 1 else None
+
+
+def find_label(label_dir, stem, extensions, shared=None):
+    """按 extensions 的顺序查找同名标注文件，没有时返回 shared"""
+    for ext in extensions:
+        path = os.path.join(label_dir, stem + ext)
+        if os.path.isfile(path):
+            return path
+    return shared
+
+
+def iter_pairs(image_dir, label_dir, dataset_type=None):
+    """
+    按文件名 (不含扩展名) 配对图片与标注，逐个产出，不一次性列出整个目录
+    标注扩展名取自格式注册表 (parsers.label_extensions)；没有同名标注时使用目录中唯一的 COCO JSON
+    :return: 生成器 (image_path, label_path)，缺少标注的图片会被跳过
+    """
+    extensions = parsers.label_extensions(dataset_type)
+    shared = shared_label_file(label_dir, dataset_type)
+    with os.scandir(image_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() not in IMAGE_EXTS:
+                continue
+            label_path = find_label(label_dir, stem, extensions, shared)
+            if label_path:
+                yield entry.path, label_path
+
+
+def output_path_for(image_path, output_dir, out_ext=None):
+    stem, ext = os.path.splitext(os.path.basename(image_path))
+    return os.path.join(output_dir, stem + (out_ext or ext))
+
+
+def render_one(task):
+    """
+    工作进程：解析、绘制并保存单张图片
+    :return: (image_path, 绘制数量, 错误信息或 None)
+    """
+    image_path, label_path, out_path, options = task
+    try:
+        source = image_source.open_source(image_path)
+        objects = AnnotationSet.from_columns(parsers.parse_label_columns(
+            label_path, options['dataset'], source.size, os.path.basename(image_path)))
+        # load() 返回新解码的图片，直接在上面绘制，进程内只保留一份原图
+        img_drawn, count = drawer.draw_on_image(
+            source.load(),
+            objects,
+            color_name=options['color'],
+            show_labels=options['show_labels'],
+            dota_mode=options['dota_mode'],
+            line_style=options['line_style'],
+            line_width=options['line_width'],
+            inplace=True
+        )
+
+        if out_path.lower().endswith(('.jpg', '.jpeg')) and img_drawn.mode not in ('RGB', 'L'):
+            img_drawn = img_drawn.convert('RGB')
+
+        # 先写临时文件再改名，中断后不会留下半张图，续跑时也不会误判为已完成
+        tmp_path = out_path + '.part'
+        img_drawn.save(tmp_path, format=Image.registered_extensions().get(
+            os.path.splitext(out_path)[1].lower()))
+        os.replace(tmp_path, out_path)
+        return image_path, count, None
+    except Exception as e:
+        return image_path, 0, str(e)
+
+
+def iter_bounded(pool, func, tasks, max_pending):
+    """
+    流式提交任务：同时在途的任务不超过 max_pending，按完成顺序产出结果
+    (Executor.map 会一次性提交全部任务，数据集很大时内存会随之增长)
+    """
+    pending = set()
+    tasks = iter(tasks)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_pending:
+            task = next(tasks, None)
+            if task is None:
+                exhausted = True
+                break
+            pending.add(pool.submit(func, task))
+
+        if not pending:
+            break
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in finished:
+            yield fut.result()
+
+
+def iter_tasks(args, options):
+    for image_path, label_path in iter_pairs(args.images, args.labels, args.dataset):
+        out_path = output_path_for(image_path, args.output, args.ext)
+        if not args.overwrite and os.path.exists(out_path):
+            continue
+        yield image_path, label_path, out_path, options
+
+
+def run(args):
+    os.makedirs(args.output, exist_ok=True)
+    options = {
+        'dataset': args.dataset,
+        'color': args.color,
+        'show_labels': args.show_labels,
+        'dota_mode': args.dota_mode,
+        'line_style': args.line_style,
+        'line_width': args.line_width
+    }
+
+    workers = args.workers or os.cpu_count() or 1
+    # 限制同时在途的任务数量，让目录遍历与渲染流式进行，内存不随数据集大小增长
+    max_pending = workers * 4
+
+    done, failed = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for image_path, count, error in iter_bounded(pool, render_one, iter_tasks(args, options), max_pending):
+            if error:
+                failed += 1
+                print(f"[失败] {os.path.basename(image_path)}: {error}", file=sys.stderr)
+            else:
+                done += 1
+                if not args.quiet:
+                    print(f"[完成] {os.path.basename(image_path)} ({count} 个目标)")
+
+    print(f"共完成 {done} 张，失败 {failed} 张")
+    return 0 if failed == 0 else 1
+
+
+def build_arg_parser():
+    p = argparse.ArgumentParser(description="遥感检测数据集批量可视化")
+    p.add_argument('--images', required=True, help="图片目录")
+    p.add_argument('--labels', required=True, help="标注目录 (与图片同名的标注文件，或一个 COCO JSON)")
+    p.add_argument('--output', required=True, help="输出目录")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--color', default='red', help="边框颜色 (PIL 颜色名或 #RRGGBB)")
+    p.add_argument('--line-style', default='solid', choices=drawer.LINE_STYLE_NAMES, help="线型")
+    p.add_argument('--line-width', type=int, default=2, help="线宽")
+    p.add_argument('--dota-mode', default='OBB', choices=['OBB', 'HBB'], help="DOTA 框型")
+    p.add_argument('--show-labels', action='store_true', help="显示类别名")
+    p.add_argument('--ext', default=None, help="输出扩展名 (例如 .jpg)，默认与原图相同")
+    p.add_argument('--workers', type=int, default=0, help="进程数，默认使用全部 CPU 核心")
+    p.add_argument('--overwrite', action='store_true', help="覆盖已存在的输出 (默认跳过，用于断点续跑)")
+    p.add_argument('--quiet', action='store_true', help="只输出错误与汇总")
+    return p
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,566 @@
+# benchmark.py
+"""
+性能基准：在合成数据上无界面地测量各热点路径，结果可保存为 JSON 并与之前的结果对比，用于发现性能回退。
+
+- parse:   标注解析 (列式解析、列缓存读取、逐行解析的旧实现)，AI-TOD / DOTA / VisDrone 三种格式
+- draw:    视口标注绘制 (drawer 实线 / 虚线 / 带文字，以及 LOD 绘制)
+- hittest: 点选命中测试 (空间索引构建，GridIndex 候选查询 + ObjectGeometry 精确判断)
+- display: 视口底图渲染 (ImagePyramid 分块读取与缩放，冷缓存 / 热缓存 / 快速预览 / 1:1 / 放大)
+- dash:    实线、批量虚线与逐段虚线 (draw_dashed_line) 在不同边数下的对比
+
+每一项记录多次运行的延迟分位数 (p50 / p90 / p99)、吞吐量，以及单独一次运行中的峰值内存：
+py_peak_mb 为 tracemalloc 统计的 Python / NumPy 分配，rss_peak_mb 为进程常驻内存的增量 (仅 Linux，
+包含 PIL 的图像缓冲区)。display 使用按需生成像素的合成数据源，2 万像素边长的图片也不需要占用整图内存。
+
+用法:
+    python benchmark.py                                   # 全部测试
+    python benchmark.py --suites parse hittest --quick    # 只测部分项目，缩小规模
+    python benchmark.py --json base.json                  # 保存结果
+    python benchmark.py --json new.json --compare base.json --tolerance 0.2
+    python benchmark.py --suites dash --edges 1000 10000 --no-legacy
+    python benchmark.py --generate ./synthetic --format DOTA --objects 1000 --images 10
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+import drawer
+import geometry
+import image_source
+import label_cache
+import lod
+import parsers
+import render_worker
+import spatial_index
+import tiles
+from annotations import AnnotationSet
+
+SUITES = ('parse', 'draw', 'hittest', 'display', 'dash')
+DEFAULT_COUNTS = [10, 100, 1000, 10000, 100000]
+DEFAULT_SIZES = [1000, 4000, 20000]
+QUICK_COUNTS = [10, 1000, 10000]
+QUICK_SIZES = [1000, 4000]
+CANVAS_SIZE = (1600, 1000)
+SYNTHETIC_FORMATS = ('AI-TOD', 'DOTA', 'VisDrone2019')
+
+DOTA_CLASSES = ('plane', 'ship', 'storage-tank', 'baseball-diamond', 'tennis-court', 'basketball-court',
+                'ground-track-field', 'harbor', 'bridge', 'large-vehicle', 'small-vehicle', 'helicopter',
+                'roundabout', 'soccer-ball-field', 'swimming-pool')
+AITOD_CLASSES = ('airplane', 'bridge', 'storage-tank', 'ship', 'swimming-pool', 'vehicle', 'person', 'wind-mill')
+
+
+# ================= 合成数据 =================
+def random_quads(n_objects, img_size, seed=0):
+    """在图片范围内随机生成旋转四边形目标 (每个目标 4 条边)"""
+    rng = np.random.default_rng(seed)
+    w, h = img_size
+    centers = rng.uniform(0, 1, (n_objects, 2)) * (w, h)
+    sizes = rng.uniform(10, 120, (n_objects, 2))
+    angles = rng.uniform(0, np.pi, n_objects)
+
+    corners = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    local = corners[None, :, :] * sizes[:, None, :]
+    xs = centers[:, 0:1] + local[:, :, 0] * cos - local[:, :, 1] * sin
+    ys = centers[:, 1:2] + local[:, :, 0] * sin + local[:, :, 1] * cos
+    coords = np.stack([xs, ys], axis=2).reshape(n_objects, 8)
+    return [{'type': 'poly', 'coords': c, 'class_name': 'obj'} for c in coords.tolist()]
+
+
+def random_boxes(n_objects, img_size, seed=0):
+    """在图片范围内随机生成水平框 [x1, y1, x2, y2]，尺寸偏向微小目标 (对数分布 2 ~ 200 像素)"""
+    rng = np.random.default_rng(seed)
+    w, h = img_size
+    sides = np.exp(rng.uniform(np.log(2), np.log(200), (n_objects, 2)))
+    x1 = rng.uniform(0, 1, n_objects) * np.maximum(w - sides[:, 0], 1)
+    y1 = rng.uniform(0, 1, n_objects) * np.maximum(h - sides[:, 1], 1)
+    return np.column_stack([x1, y1, x1 + sides[:, 0], y1 + sides[:, 1]])
+
+
+def label_text(fmt, n_objects, img_size, seed=0):
+    """
+    生成一个标注文件的内容
+    :param fmt: 'AI-TOD'、'DOTA' 或 'VisDrone2019'
+    """
+    rng = np.random.default_rng(seed + 1)
+    if fmt == 'DOTA':
+        quads = random_quads(n_objects, img_size, seed)
+        names = rng.choice(DOTA_CLASSES, n_objects)
+        diffs = rng.integers(0, 2, n_objects)
+        lines = ['imagesource:synthetic', 'gsd:0.5']
+        lines += [" ".join(f"{v:.1f}" for v in q['coords']) + f" {name} {d}"
+                  for q, name, d in zip(quads, names, diffs)]
+    elif fmt == 'AI-TOD':
+        boxes = random_boxes(n_objects, img_size, seed)
+        names = rng.choice(AITOD_CLASSES, n_objects)
+        lines = [f"{x1:.4f} {y1:.4f} {x2:.4f} {y2:.4f} {name}" for (x1, y1, x2, y2), name in zip(boxes, names)]
+    elif fmt == 'VisDrone2019':
+        boxes = random_boxes(n_objects, img_size, seed)
+        cats = rng.integers(1, 11, n_objects)
+        lines = [f"{int(x1)},{int(y1)},{max(1, int(x2 - x1))},{max(1, int(y2 - y1))},1,{c},0,0"
+                 for (x1, y1, x2, y2), c in zip(boxes, cats)]
+    else:
+        raise ValueError(f"不支持生成的格式: {fmt}")
+    return "\n".join(lines) + "\n"
+
+
+def pattern_pixels(box, scale=1, channels=3):
+    """
+    合成图像在原图坐标 box 范围内的像素 (按 scale 倍降采样)：棋盘格叠加渐变，任意窗口可独立生成
+    :param box: 该层上的 (x0, y0, x1, y1)
+    """
+    x0, y0, x1, y1 = box
+    xs = (np.arange(x0, x1, dtype=np.int64) * scale)[None, :]
+    ys = (np.arange(y0, y1, dtype=np.int64) * scale)[:, None]
+    checker = (((xs >> 6) + (ys >> 6)) & 1).astype(np.uint8) * 60
+    planes = [(checker + ((xs >> 4) & 0x7F)).astype(np.uint8),
+              (checker + ((ys >> 4) & 0x7F)).astype(np.uint8),
+              np.broadcast_to(checker + (((xs + ys) >> 5) & 0x7F), checker.shape).astype(np.uint8)]
+    return np.stack([np.broadcast_to(p, (y1 - y0, x1 - x0)) for p in planes[:channels]], axis=2)
+
+
+class SyntheticSource(image_source.ImageSource):
+    """按需生成像素的图像数据源：各降采样层都可直接读取，模拟带 overview 的分块 TIFF"""
+
+    def __init__(self, size, overviews=True):
+        super().__init__(tuple(size), 'RGB')
+        if overviews:
+            levels, (w, h) = 0, size
+            while max(w, h) > tiles.TILE_SIZE:
+                levels += 1
+                w, h = image_source.level_size(size, levels)
+            self.native_levels = list(range(levels + 1))
+
+    def _read(self, level, box):
+        return Image.fromarray(pattern_pixels(box, 1 << level))
+
+
+def write_image(path, size, seed=0):
+    """写出一张合成图片 (整图在内存中生成，适合数千像素以内的尺寸)"""
+    w, h = size
+    pixels = pattern_pixels((0, 0, w, h)).copy()
+    rng = np.random.default_rng(seed)
+    pixels[rng.integers(0, h, w * h // 64), rng.integers(0, w, w * h // 64)] = 255
+    Image.fromarray(pixels).save(path, quality=90)
+
+
+def generate_dataset(out_dir, fmt, n_images, n_objects, img_size, image_ext='.jpg'):
+    """
+    在 out_dir/images 与 out_dir/labels 下生成合成数据集
+    :return: [(图片路径, 标注路径)]
+    """
+    image_dir = os.path.join(out_dir, 'images')
+    label_dir = os.path.join(out_dir, 'labels')
+    os.makedirs(image_dir, exist_ok=True)
+    os.makedirs(label_dir, exist_ok=True)
+    pairs = []
+    for i in range(n_images):
+        stem = f"synthetic_{i:05d}"
+        image_path = os.path.join(image_dir, stem + image_ext)
+        label_path = os.path.join(label_dir, stem + '.txt')
+        write_image(image_path, img_size, seed=i)
+        with open(label_path, 'w', encoding='utf-8') as f:
+            f.write(label_text(fmt, n_objects, img_size, seed=i))
+        pairs.append((image_path, label_path))
+    return pairs
+
+
+def write_labels(fmt, n_objects, img_size, work_dir, seed=0):
+    """写出合成标注文件 (已存在时直接复用)，返回路径"""
+    path = os.path.join(work_dir, f"{fmt}_{n_objects}_{img_size[0]}.txt")
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(label_text(fmt, n_objects, img_size, seed))
+    return path
+
+
+def fit_transform(img_size, canvas_size=CANVAS_SIZE):
+    """与查看器的 compute_fit 相同：整图居中适应画布"""
+    (iw, ih), (cw, ch) = img_size, canvas_size
+    ratio = min(cw / iw, ch / ih)
+    return ratio, (cw - int(iw * ratio)) // 2, (ch - int(ih * ratio)) // 2
+
+
+# ================= 测量 =================
+class RssSampler:
+    """后台线程按固定间隔读取进程常驻内存，得到一段代码执行期间的峰值增量 (仅 Linux)"""
+    STATM = '/proc/self/statm'
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.available = os.path.exists(self.STATM)
+        self.page = os.sysconf('SC_PAGE_SIZE') if self.available else 0
+
+    def _rss(self):
+        with open(self.STATM) as f:
+            return int(f.read().split()[1]) * self.page
+
+    def __enter__(self):
+        self.peak_bytes = None
+        if not self.available:
+            return self
+        self._stop = threading.Event()
+        self._base = self._peak = self._rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self._rss())
+
+    def __exit__(self, *exc):
+        if self.available:
+            self._stop.set()
+            self._thread.join()
+            self._peak = max(self._peak, self._rss())
+            self.peak_bytes = self._peak - self._base
+        return False
+
+
+def percentile_summary(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000.0
+    return {'min': float(ms.min()), 'p50': float(np.percentile(ms, 50)), 'p90': float(np.percentile(ms, 90)),
+            'p99': float(np.percentile(ms, 99)), 'max': float(ms.max()), 'mean': float(ms.mean())}
+
+
+def measure(func, repeat, warmup=1, setup=None, memory=True):
+    """
+    运行 func 并计时
+    :param setup: 每次运行前调用 (不计时)，例如清空缓存以测量冷启动
+    :return: (每次运行的耗时列表 [秒], 内存统计 dict)
+    """
+    for _ in range(warmup):
+        if setup: setup()
+        func()
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    mem = {'py_peak_mb': None, 'rss_peak_mb': None}
+    if memory:
+        # 内存单独测一次：tracemalloc 会明显拖慢运行，不能和计时混在一起
+        if setup: setup()
+        tracemalloc.start()
+        try:
+            with RssSampler() as rss:
+                func()
+            mem['py_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+        if rss.peak_bytes is not None:
+            mem['rss_peak_mb'] = rss.peak_bytes / 2 ** 20
+    return times, mem
+
+
+def make_record(suite, case, params, times, mem, units=1, unit='ops'):
+    """
+    :param units: 每次运行处理的数量 (目标数、点击数、像素数)，用于计算吞吐量
+    """
+    latency = percentile_summary(times)
+    return {'suite': suite, 'case': case, 'params': params, 'runs': len(times), 'latency_ms': latency,
+            'throughput': units / (latency['p50'] / 1000.0) if latency['p50'] > 0 else None,
+            'throughput_unit': unit + '/s', **mem}
+
+
+# ================= 测试项目 =================
+def legacy_parse(path, fmt, img_size):
+    """逐行调用 line_parser 的旧解析方式，作为对照"""
+    parse = parsers.DATASET_PARSERS[fmt]
+    w, h = img_size
+    objects = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            obj = parse(parsers.clean_line(line), w, h)
+            if obj:
+                objects.append(obj)
+    return objects
+
+
+def bench_parse(counts, repeat, work_dir, legacy=True, img_size=(4000, 4000)):
+    cache_dir = os.path.join(work_dir, 'label_cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    for fmt in SYNTHETIC_FORMATS:
+        for n in counts:
+            path = write_labels(fmt, n, img_size, work_dir)
+            params = {'format': fmt, 'objects': n}
+
+            times, mem = measure(lambda: AnnotationSet.from_columns(
+                parsers.parse_label_columns(path, fmt, img_size)), repeat)
+            yield make_record('parse', 'columns', params, times, mem, n, 'objects')
+
+            npz = os.path.join(cache_dir, f"{fmt}_{n}.npz")
+            label_cache.save_columns(npz, parsers.parse_label_columns(path, fmt, img_size))
+            times, mem = measure(lambda: AnnotationSet.from_columns(label_cache.load_columns(npz)), repeat)
+            yield make_record('parse', 'cache_load', params, times, mem, n, 'objects')
+
+            if legacy:
+                times, mem = measure(lambda: legacy_parse(path, fmt, img_size), repeat)
+                yield make_record('parse', 'legacy_lines', params, times, mem, n, 'objects')
+
+
+def bench_draw(counts, sizes, repeat, work_dir):
+    canvas = Image.new('RGB', CANVAS_SIZE, (51, 51, 51))
+    first_dash = next(iter(drawer.DASH_PATTERNS))
+    cases = [('solid', {'line_style': 'solid', 'show_labels': False}),
+             ('solid_labels', {'line_style': 'solid', 'show_labels': True}),
+             (first_dash, {'line_style': first_dash, 'show_labels': False})]
+    for size in sizes:
+        img_size = (size, size)
+        transform = fit_transform(img_size)
+        for n in counts:
+            path = write_labels('DOTA', n, img_size, work_dir)
+            objects = AnnotationSet.from_columns(parsers.parse_label_columns(path, 'DOTA', img_size))
+            index = spatial_index.GridIndex(objects.geometry.envelopes)
+            params = {'objects': n, 'image_size': size}
+            for name, options in cases:
+                times, mem = measure(lambda: drawer.draw_on_image(canvas, objects, transform=transform,
+                                                                  line_width=2, **options), repeat)
+                yield make_record('draw', name, params, times, mem, n, 'objects')
+            times, mem = measure(lambda: lod.draw_view(canvas.copy(), objects, transform, index=index,
+                                                       line_width=2, show_labels=True), repeat)
+            yield make_record('draw', 'lod_labels', params, times, mem, n, 'objects')
+
+
+def bench_hittest(counts, sizes, repeat, work_dir, clicks=200):
+    for size in sizes:
+        img_size = (size, size)
+        for n in counts:
+            columns = parsers.parse_label_columns(write_labels('DOTA', n, img_size, work_dir), 'DOTA', img_size)
+            params = {'objects': n, 'image_size': size}
+
+            # 构建：几何数据 (顶点、外接矩形) 与网格索引，加载标注后执行一次
+            times, mem = measure(lambda: spatial_index.GridIndex(
+                geometry.ObjectGeometry.from_columns(columns).envelopes), repeat)
+            yield make_record('hittest', 'build_index', params, times, mem, n, 'objects')
+
+            geom = geometry.ObjectGeometry.from_columns(columns)
+            index = spatial_index.GridIndex(geom.envelopes)
+            rng = np.random.default_rng(size + n)
+            # 一半点击落在目标中心附近，一半随机落点
+            centers = geom.centroids[rng.integers(0, len(geom), clicks // 2)] if len(geom) else np.zeros((0, 2))
+            points = np.vstack([centers, rng.uniform(0, size, (clicks - len(centers), 2))]).tolist()
+            for hbb in (False, True):
+                latencies = []
+                for x, y in points:
+                    start = time.perf_counter()
+                    geom.hit_test(x, y, index.query_point(x, y), hbb)
+                    latencies.append(time.perf_counter() - start)
+                _, mem = measure(lambda: [geom.hit_test(x, y, index.query_point(x, y), hbb) for x, y in points],
+                                 0, warmup=0)
+                yield make_record('hittest', 'click_hbb' if hbb else 'click_obb', params, latencies, mem, 1,
+                                  'clicks')
+
+
+def bench_display(sizes, repeat):
+    cache = tiles.TileCache()
+    cw, ch = CANVAS_SIZE
+    for size in sizes:
+        pyramid = tiles.ImagePyramid(SyntheticSource((size, size)), cache=cache)
+        ratio, off_x, off_y = fit_transform(pyramid.size)
+        params = {'image_size': size}
+        pixels = cw * ch
+        # 适应窗口：冷缓存 (切换图片后第一次显示) 与热缓存 (缩放 / 拖动后重绘)
+        fit = lambda: pyramid.render(ratio, off_x, off_y, CANVAS_SIZE)
+        times, mem = measure(fit, repeat, setup=cache.clear)
+        yield make_record('display', 'fit_cold', params, times, mem, pixels, 'pixels')
+        times, mem = measure(fit, repeat)
+        yield make_record('display', 'fit_warm', params, times, mem, pixels, 'pixels')
+        # 后台渲染先显示的快速预览 (粗一级的层级 + NEAREST)
+        times, mem = measure(lambda: pyramid.render(ratio, off_x, off_y, CANVAS_SIZE,
+                                                    resample=Image.Resampling.NEAREST,
+                                                    level_bias=render_worker.PREVIEW_LEVEL_BIAS),
+                             repeat, setup=cache.clear)
+        yield make_record('display', 'preview_cold', params, times, mem, pixels, 'pixels')
+        # 1:1 显示图片中心，以及放大 4 倍 (NEAREST 插值)
+        for name, zoom in (('zoom_1x_cold', 1.0), ('zoom_4x_cold', 4.0)):
+            ox, oy = int(cw / 2 - size / 2 * zoom), int(ch / 2 - size / 2 * zoom)
+            times, mem = measure(lambda: pyramid.render(zoom, ox, oy, CANVAS_SIZE), repeat, setup=cache.clear)
+            yield make_record('display', name, params, times, mem, pixels, 'pixels')
+        pyramid.close()
+
+
+def legacy_dashed(img, objects, dash_len, gap_len, width):
+    """逐条边、逐段调用 ImageDraw.line 的旧实现，作为对照"""
+    img = img.copy()
+    draw = ImageDraw.Draw(img)
+    for obj in objects:
+        c = obj['coords']
+        pts = list(zip(c[::2], c[1::2]))
+        pts.append(pts[0])
+        for i in range(len(pts) - 1):
+            drawer.draw_dashed_line(draw, pts[i], pts[i + 1], width=width,
+                                    dash_len=dash_len, gap_len=gap_len, color='red')
+    return img
+
+
+def bench_dash(edge_counts, img_size=(4000, 4000), line_width=2, repeat=3, legacy=True):
+    base = Image.new('RGB', img_size, 'black')
+    for n_edges in edge_counts:
+        objects = random_quads(max(1, n_edges // 4), img_size)
+        params = {'edges': n_edges, 'image_size': img_size[0]}
+        styles = ['solid'] + list(drawer.DASH_PATTERNS)
+        for style in styles:
+            times, mem = measure(lambda: drawer.draw_on_image(
+                base, objects, show_labels=False, line_style=style, line_width=line_width), repeat)
+            yield make_record('dash', style, params, times, mem, n_edges, 'edges')
+            if legacy and style in drawer.DASH_PATTERNS:
+                d_len, g_len = drawer.DASH_PATTERNS[style]
+                times, mem = measure(lambda: legacy_dashed(base, objects, d_len, g_len, line_width), 1,
+                                     warmup=0, memory=False)
+                yield make_record('dash', style + '_legacy', params, times, mem, n_edges, 'edges')
+
+
+# ================= 结果 =================
+def record_key(record):
+    return record['suite'], record['case'], json.dumps(record['params'], sort_keys=True)
+
+
+def format_params(params):
+    return " ".join(f"{k}={v}" for k, v in params.items())
+
+
+def _mb(value):
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_record(record):
+    lat = record['latency_ms']
+    rate = f"{record['throughput']:.3g} {record['throughput_unit']}" if record['throughput'] else "-"
+    print(f"{record['suite']:<8} {record['case']:<16} {format_params(record['params']):<36} "
+          f"{lat['p50']:>10.2f} {lat['p90']:>10.2f} {lat['p99']:>10.2f} {rate:>22} "
+          f"{_mb(record['py_peak_mb']):>8} {_mb(record['rss_peak_mb']):>8}", flush=True)
+
+
+def print_header():
+    print(f"{'suite':<8} {'case':<16} {'params':<36} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} "
+          f"{'throughput':>22} {'py MB':>8} {'rss MB':>8}")
+
+
+def environment():
+    return {'time': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pillow': PIL.__version__, 'platform': platform.platform(),
+            'machine': platform.machine(), 'cpu_count': os.cpu_count()}
+
+
+def compare_results(current, baseline, tolerance=0.1):
+    """
+    按 (suite, case, params) 对比两次结果的 p50 延迟
+    :param tolerance: 允许的变慢比例，超过即视为回退
+    :return: 回退的项目列表 [(record, 旧 p50, 新 p50)]
+    """
+    old = {record_key(r): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'suite':<8} {'case':<16} {'params':<36} {'old p50':>10} {'new p50':>10} {'ratio':>7}")
+    for record in current['results']:
+        prev = old.get(record_key(record))
+        if prev is None:
+            continue
+        before, after = prev['latency_ms']['p50'], record['latency_ms']['p50']
+        ratio = after / before if before > 0 else float('inf')
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "  ← 变慢"
+            regressions.append((record, before, after))
+        elif ratio < 1 - tolerance:
+            mark = "  ↑ 变快"
+        print(f"{record['suite']:<8} {record['case']:<16} {format_params(record['params']):<36} "
+              f"{before:>10.2f} {after:>10.2f} {ratio:>7.2f}{mark}")
+    return regressions
+
+
+def run(args, work_dir):
+    counts = args.objects or (QUICK_COUNTS if args.quick else DEFAULT_COUNTS)
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    repeat = args.repeat or (3 if args.quick else 5)
+    suites = {
+        'parse': lambda: bench_parse(counts, repeat, work_dir, legacy=not args.no_legacy),
+        'draw': lambda: bench_draw(counts, sizes, repeat, work_dir),
+        'hittest': lambda: bench_hittest(counts, sizes, repeat, work_dir, clicks=args.clicks),
+        'display': lambda: bench_display(sizes, repeat),
+        'dash': lambda: bench_dash(args.edges, (args.dash_size, args.dash_size), args.line_width, repeat,
+                                   legacy=not args.no_legacy),
+    }
+    results = []
+    print_header()
+    for name in args.suites:
+        for record in suites[name]():
+            print_record(record)
+            results.append(record)
+    return {'environment': environment(), 'args': {'suites': args.suites, 'objects': counts, 'sizes': sizes,
+                                                   'repeat': repeat}, 'results': results}
+
+
+def build_arg_parser():
+    p = argparse.ArgumentParser(description="解析 / 绘制 / 命中测试 / 显示的性能基准")
+    p.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES), help="要运行的测试项目")
+    p.add_argument('--objects', type=int, nargs='+', help=f"目标数量，默认 {DEFAULT_COUNTS}")
+    p.add_argument('--sizes', type=int, nargs='+', help=f"图片边长，默认 {DEFAULT_SIZES}")
+    p.add_argument('--repeat', type=int, help="每项重复次数 (默认 5，--quick 时为 3)")
+    p.add_argument('--clicks', type=int, default=200, help="命中测试的点击次数")
+    p.add_argument('--quick', action='store_true', help="缩小规模，快速检查")
+    p.add_argument('--json', help="把结果保存为 JSON 文件")
+    p.add_argument('--compare', help="与之前保存的 JSON 结果对比，有项目变慢时返回非零退出码")
+    p.add_argument('--tolerance', type=float, default=0.1, help="对比时允许的变慢比例")
+    p.add_argument('--work-dir', help="合成标注文件的存放目录，默认使用临时目录")
+    p.add_argument('--edges', type=int, nargs='+', default=[1000, 10000, 100000], help="dash 项目的边数")
+    p.add_argument('--dash-size', type=int, default=4000, help="dash 项目的图片边长")
+    p.add_argument('--line-width', type=int, default=2)
+    p.add_argument('--no-legacy', action='store_true', help="不运行逐行解析、逐段虚线等旧实现 (规模很大时很慢)")
+
+    g = p.add_argument_group("生成合成数据集 (不运行基准)")
+    g.add_argument('--generate', metavar='DIR', help="在 DIR/images 与 DIR/labels 下生成合成数据集")
+    g.add_argument('--format', default='DOTA', choices=SYNTHETIC_FORMATS, help="生成的标注格式")
+    g.add_argument('--images', type=int, default=10, help="生成的图片数量")
+    g.add_argument('--image-size', type=int, default=2000, help="生成的图片边长")
+    return p
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    if args.generate:
+        n = (args.objects or [1000])[0]
+        pairs = generate_dataset(args.generate, args.format, args.images, n, (args.image_size, args.image_size))
+        print(f"已生成 {len(pairs)} 张图片 ({args.format}，每张 {n} 个目标) -> {args.generate}")
+        return 0
+
+    if args.work_dir:
+        os.makedirs(args.work_dir, exist_ok=True)
+        report = run(args, args.work_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix='rsvis_bench_') as work_dir:
+            report = run(args, work_dir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1, ensure_ascii=False)
+        print(f"\n结果已保存: {args.json}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} 项比基准慢 {args.tolerance:.0%} 以上")
+            return 1
+        print("\n没有发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# compare.py
+"""
+真值 (GT) 与检测结果对比：按 IoU 贪心匹配，区分 TP / FP / FN，并统计 precision / recall。
+
+- 候选配对由 spatial_index.GridIndex.query_boxes 批量给出，只对外接矩形相交的配对计算 IoU
+- 水平框使用向量化 IoU；DOTA 旋转框 (OBB 模式) 使用向量化的凸多边形裁剪 (Sutherland-Hodgman) 求交
+- 匹配规则与 VOC 相同：预测按置信度从高到低，依次匹配 IoU 最大且尚未被匹配的同类真值
+
+批量统计整个目录 (多进程):
+    python compare.py --gt VisDrone/annotations --pred results/ --dataset VisDrone2019 --images VisDrone/images --csv pr.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import drawer
+import geometry
+import image_source
+import parsers
+import spatial_index
+from batch_render import iter_bounded
+from stats import find_image, iter_label_files, parse_size, _batched
+
+IOU_THRESHOLD = 0.5
+FILES_PER_TASK = 64
+
+# 三类结果的绘制样式 (drawer.draw_on_image 参数)
+STYLES = {
+    'tp': {'color_name': '#00ff00', 'line_style': 'solid'},  # 正确检测 (画预测框)
+    'fp': {'color_name': '#ff3030', 'line_style': 'solid'},  # 误检 (画预测框)
+    'fn': {'color_name': '#ffd700', 'line_style': 'dashed_dense'},  # 漏检 (画真值框)
+}
+
+
+# ================= IoU =================
+def hbb_iou(a, b):
+    """逐对计算水平框 IoU，a、b 为等长的 N×4 数组"""
+    iw = np.clip(np.minimum(a[:, 2], b[:, 2]) - np.maximum(a[:, 0], b[:, 0]), 0, None)
+    ih = np.clip(np.minimum(a[:, 3], b[:, 3]) - np.maximum(a[:, 1], b[:, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]) + (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _clip_by_edge(poly, n, a, b, sign):
+    """
+    用有向边 a->b 所在直线裁剪一批多边形，保留内侧部分
+    :param poly: P×K×2 顶点，n: 每个多边形的顶点数，sign: 裁剪多边形的环绕方向 (+1 / -1)
+    :return: (新的顶点数组, 新的顶点数)
+    """
+    p, k = poly.shape[:2]
+    rows = np.arange(p)[:, None]
+    idx = np.arange(k)[None, :]
+    valid = idx < n[:, None]
+    prev = poly[rows, (idx - 1) % np.maximum(n, 1)[:, None]]
+
+    def side(pts):
+        ex, ey = (b - a)[:, 0:1], (b - a)[:, 1:2]
+        return (ex * (pts[:, :, 1] - a[:, 1:2]) - ey * (pts[:, :, 0] - a[:, 0:1])) * sign[:, None]
+
+    d_cur, d_prev = side(poly), side(prev)
+    in_cur, in_prev = d_cur >= 0, d_prev >= 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(in_cur != in_prev, d_prev / (d_prev - d_cur), 0.0)
+    cross_pt = prev + t[:, :, None] * (poly - prev)
+
+    # 每个输入顶点至多输出两个点：与边的交点、在内侧的当前顶点
+    out = np.stack([cross_pt, poly], axis=2).reshape(p, 2 * k, 2)
+    keep = np.stack([valid & (in_cur != in_prev), valid & in_cur], axis=2).reshape(p, 2 * k)
+    order = np.argsort(~keep, axis=1, kind='stable')
+    new_n = keep.sum(axis=1)
+    width = max(int(new_n.max()) if p else 0, 1)
+    return out[rows, order[:, :width]], new_n
+
+
+def _area(poly, n):
+    """顶点数可变的多边形面积；无效位置补第一个顶点，不影响鞋带公式"""
+    if poly.shape[1] == 0:
+        return np.zeros(len(poly))
+    valid = np.arange(poly.shape[1])[None, :] < n[:, None]
+    filled = np.where(valid[:, :, None], poly, poly[:, :1])
+    return geometry.polygon_area(filled)
+
+
+def polygon_intersection_area(p_verts, q_verts, q_counts=None):
+    """
+    逐对计算多边形 p 与凸多边形 q 的相交面积
+    :param p_verts, q_verts: 等长的 P×K×2 / P×L×2 顶点数组
+    """
+    m = len(p_verts)
+    if m == 0:
+        return np.zeros(0)
+    if q_counts is None:
+        q_counts = np.full(m, q_verts.shape[1])
+    sign = np.where(geometry.signed_area(q_verts) >= 0, 1.0, -1.0)
+    poly, n = p_verts.astype(np.float64), np.full(m, p_verts.shape[1])
+    for j in range(q_verts.shape[1]):
+        a = q_verts[:, j]
+        b = q_verts[np.arange(m), (j + 1) % q_counts]
+        active = j < q_counts
+        clipped, new_n = _clip_by_edge(poly, n, a, b, sign)
+        # 顶点数少于 j+1 的裁剪多边形没有第 j 条边，保持原样
+        width = max(poly.shape[1], clipped.shape[1])
+        poly = _pad(poly, width)
+        clipped = _pad(clipped, width)
+        poly = np.where(active[:, None, None], clipped, poly)
+        n = np.where(active, new_n, n)
+    return _area(poly, n)
+
+
+def _pad(poly, width):
+    if poly.shape[1] >= width:
+        return poly
+    pad = np.zeros((len(poly), width - poly.shape[1], 2))
+    return np.concatenate([poly, pad], axis=1)
+
+
+def obb_iou(p_verts, q_verts):
+    """逐对计算旋转框 (凸四边形) IoU；非凸的异常标注按裁剪结果近似"""
+    inter = polygon_intersection_area(p_verts, q_verts)
+    union = geometry.polygon_area(p_verts) + geometry.polygon_area(q_verts) - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+# ================= 匹配 =================
+def match(gt_geom, gt_labels, pred_geom, pred_labels, pred_scores=None,
+          iou_threshold=IOU_THRESHOLD, rotated=False, class_aware=True):
+    """
+    贪心匹配真值与预测
+    :param gt_geom, pred_geom: geometry.ObjectGeometry
+    :param gt_labels, pred_labels: 每个目标的类别名
+    :param rotated: 按多边形计算 IoU (DOTA OBB)，否则按外接矩形
+    :return: dict
+        pred_tp: 每个预测是否为 TP；pred_gt: 匹配到的真值下标 (-1 表示 FP)；pred_iou: 匹配的 IoU
+        gt_matched: 每个真值是否被匹配 (False 即 FN)
+    """
+    n_gt, n_pred = len(gt_geom), len(pred_geom)
+    result = {'pred_tp': np.zeros(n_pred, dtype=bool), 'pred_gt': np.full(n_pred, -1, dtype=np.int64),
+              'pred_iou': np.zeros(n_pred), 'gt_matched': np.zeros(n_gt, dtype=bool)}
+    if n_gt == 0 or n_pred == 0:
+        return result
+
+    pi, gi = spatial_index.GridIndex(gt_geom.envelopes).query_boxes(pred_geom.envelopes)
+    if class_aware:
+        same = np.asarray(gt_labels, dtype=object)[gi] == np.asarray(pred_labels, dtype=object)[pi]
+        pi, gi = pi[same], gi[same]
+    if rotated:
+        iou = obb_iou(pred_geom.verts[pi], gt_geom.verts[gi])
+    else:
+        iou = hbb_iou(pred_geom.envelopes[pi], gt_geom.envelopes[gi])
+    ok = iou >= iou_threshold
+    pi, gi, iou = pi[ok], gi[ok], iou[ok]
+
+    # 预测按置信度降序 (相同时保持文件顺序)，同一预测的候选按 IoU 降序
+    scores = np.ones(n_pred) if pred_scores is None else np.asarray(pred_scores, dtype=np.float64)
+    rank = np.empty(n_pred, dtype=np.int64)
+    rank[np.argsort(-scores, kind='stable')] = np.arange(n_pred)
+    order = np.lexsort((-iou, rank[pi]))
+    for p, g, v in zip(pi[order].tolist(), gi[order].tolist(), iou[order].tolist()):
+        if result['pred_tp'][p] or result['gt_matched'][g]:
+            continue
+        result['pred_tp'][p] = True
+        result['pred_gt'][p] = g
+        result['pred_iou'][p] = v
+        result['gt_matched'][g] = True
+    return result
+
+
+def counts(result):
+    """(tp, fp, fn)"""
+    tp = int(result['pred_tp'].sum())
+    return tp, len(result['pred_tp']) - tp, int((~result['gt_matched']).sum())
+
+
+def precision_recall(tp, fp, fn):
+    precision = tp / (tp + fp) if tp + fp else None
+    recall = tp / (tp + fn) if tp + fn else None
+    return precision, recall
+
+
+def column_labels(columns):
+    """每个目标的类别名数组"""
+    return np.array(columns['class_names'], dtype=object)[columns['class_ids']] \
+        if len(columns['class_ids']) else np.zeros(0, dtype=object)
+
+
+def match_columns(gt_columns, pred_columns, score_threshold=0.0, **kwargs):
+    """
+    对两份 parsers.parse_label_columns 的结果做匹配 (置信度低于 score_threshold 的预测先被丢弃)
+    真值或预测为多边形时按旋转框计算 IoU
+    """
+    keep = np.flatnonzero(pred_columns['score'] >= score_threshold)
+    pred_geom = geometry.ObjectGeometry.from_columns(pred_columns).take(keep)
+    gt_geom = geometry.ObjectGeometry.from_columns(gt_columns)
+    kwargs.setdefault('rotated', 'poly' in (gt_columns['type'], pred_columns['type']))
+    return match(gt_geom, column_labels(gt_columns), pred_geom, column_labels(pred_columns)[keep],
+                 pred_columns['score'][keep], **kwargs)
+
+
+# ================= 绘制 =================
+def draw_comparison(img, gt_objects, pred_objects, result, gt_visible=None,
+                    transform=None, show_labels=False, line_width=2, dota_mode='OBB', check=None):
+    """
+    在图片上原地绘制对比结果：TP / FP 画预测框，FN 画未被匹配的真值框，样式见 STYLES
+    :param gt_objects, pred_objects: annotations.AnnotationSet
+    :param result: match 的结果；含 'pred_index' 时 (只匹配了部分预测) 预测下标经它映射到 pred_objects
+    :param gt_visible: 真值的可见掩码，被隐藏的真值不画；为 None 时使用 gt_objects.visible (对象列表中的勾选状态)
+    :param check: 传给 drawer.draw_on_image 的中止检查回调
+    """
+    fn = ~result['gt_matched'] & np.asarray(gt_objects.visible if gt_visible is None else gt_visible, dtype=bool)
+    pred_index = result.get('pred_index')
+    tp, fp = np.flatnonzero(result['pred_tp']), np.flatnonzero(~result['pred_tp'])
+    if pred_index is not None:
+        tp, fp = pred_index[tp], pred_index[fp]
+    groups = [('fn', gt_objects, np.flatnonzero(fn)),
+              ('fp', pred_objects, fp),
+              ('tp', pred_objects, tp)]
+    for name, objects, idx in groups:
+        if len(idx):
+            drawer.draw_on_image(img, objects.take(idx), visible=np.ones(len(idx), dtype=bool),
+                                 transform=transform, inplace=True, show_labels=show_labels, line_width=line_width,
+                                 dota_mode=dota_mode, check=check, **STYLES[name])
+    return img
+
+
+# ================= 批量统计 =================
+def _empty_columns(kind):
+    """没有检测结果文件时使用的空列式结果 (kind 与真值相同)"""
+    return {'type': kind, 'coords': np.zeros((0, 4 if kind == 'box' else 8), dtype=np.float32),
+            'class_ids': np.zeros(0, dtype=np.int32), 'class_names': [], 'score': np.zeros(0, dtype=np.float32)}
+
+
+def _compare_batch(task):
+    gt_paths, pred_dir, image_dir, gt_dataset, pred_dataset, iou_threshold, score_threshold = task
+    rows = []
+    for gt_path in gt_paths:
+        name = os.path.basename(gt_path)
+        stem = os.path.splitext(name)[0]
+        row = {'image': stem, 'gt': 0, 'pred': 0, 'tp': 0, 'fp': 0, 'fn': 0,
+               'precision': None, 'recall': None, 'error': None}
+        try:
+            img_path = find_image(image_dir, stem)
+            # 找不到图片时按 stats.parse_size 处理：像素坐标用极大尺寸解析，比例坐标记为错误
+            size = image_source.image_size(img_path) if img_path else None
+            gt = parsers.parse_label_columns(gt_path, gt_dataset, parse_size(gt_path, gt_dataset, size))
+            pred_path = os.path.join(pred_dir, name)
+            if os.path.isfile(pred_path):
+                pred = parsers.parse_label_columns(pred_path, pred_dataset, parse_size(pred_path, pred_dataset, size))
+            else:
+                pred = _empty_columns(gt['type'])
+            result = match_columns(gt, pred, score_threshold, iou_threshold=iou_threshold)
+            tp, fp, fn = counts(result)
+            precision, recall = precision_recall(tp, fp, fn)
+            row.update(gt=len(result['gt_matched']), pred=len(result['pred_tp']), tp=tp, fp=fp, fn=fn,
+                       precision=precision, recall=recall)
+        except Exception as e:
+            row['error'] = str(e)
+        rows.append(row)
+    return rows
+
+
+def compare_dirs(gt_dir, pred_dir, gt_dataset, pred_dataset=None, image_dir=None,
+                 iou_threshold=IOU_THRESHOLD, score_threshold=0.0, workers=None, progress=None):
+    """
+    多进程逐图匹配整个目录 (预测文件与真值文件同名；缺少预测文件时视为没有检测结果)
+    :return: (每张图一行的列表, 汇总 dict)
+    """
+    workers = workers or os.cpu_count() or 1
+    pred_dataset = pred_dataset or gt_dataset
+    tasks = ((batch, pred_dir, image_dir, gt_dataset, pred_dataset, iou_threshold, score_threshold)
+             for batch in _batched(iter_label_files(gt_dir, gt_dataset), FILES_PER_TASK))
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in iter_bounded(pool, _compare_batch, tasks, workers * 2):
+            rows.extend(part)
+            if progress:
+                progress(len(rows))
+    rows.sort(key=lambda r: r['image'])
+
+    ok = [r for r in rows if r['error'] is None]
+    tp, fp, fn = (sum(r[k] for r in ok) for k in ('tp', 'fp', 'fn'))
+    precision, recall = precision_recall(tp, fp, fn)
+    summary = {'images': len(ok), 'failed_files': len(rows) - len(ok), 'iou_threshold': iou_threshold,
+               'score_threshold': score_threshold, 'tp': tp, 'fp': fp, 'fn': fn,
+               'precision': precision, 'recall': recall}
+    return rows, summary
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="真值与检测结果对比 (逐图 precision / recall)")
+    p.add_argument('--gt', required=True, help="真值标注目录")
+    p.add_argument('--pred', required=True, help="检测结果目录 (文件名与真值相同)")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="真值格式 (auto 为自动识别)")
+    p.add_argument('--pred-dataset', default=None, choices=parsers.format_names(auto=True),
+                   help="检测结果格式，默认与真值相同")
+    p.add_argument('--images', default=None, help="图片目录 (AI-TOD 越界检查需要图片尺寸，可选)")
+    p.add_argument('--iou', type=float, default=IOU_THRESHOLD, help="IoU 阈值")
+    p.add_argument('--score', type=float, default=0.0, help="置信度阈值")
+    p.add_argument('--json', default=None, help="输出 JSON 报告路径")
+    p.add_argument('--csv', default=None, help="输出逐图 CSV 路径")
+    p.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    args = p.parse_args(argv)
+
+    rows, summary = compare_dirs(args.gt, args.pred, args.dataset, args.pred_dataset, args.images,
+                                 args.iou, args.score, args.workers)
+    if args.csv and rows:
+        with open(args.csv, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'images': rows}, f, ensure_ascii=False, indent=2)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary['failed_files'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+# dataset_index.py
+"""
+数据集检索索引：扫描一次整个标注目录，把每张图片与每个目标的摘要 (类别、面积、尺寸、长宽比、外接矩形)
+写入 SQLite，之后按类别 / 尺寸 / 长宽比 / 每张图片的数量快速筛选图片，例如
+"含 50 个以上 People 的 VisDrone 图片" 或 "含 8px 以下 ship 的 AI-TOD 图片"。
+
+- 目标的 obj_index 是其在 parsers.parse_label_columns 结果中的行号，界面按它预先勾选命中的目标
+  (解析使用图片的实际尺寸，与界面加载时一致)
+- 增量更新：只重新解析 mtime / 文件大小变化了的标注文件，以及对应图片 (路径或 mtime) 变化了的文件，
+  已删除的文件从索引中移除
+- 标注文件按格式注册表的扩展名查找，每个文件对应一张同名图片；一个文件包含多张图片的 COCO JSON 不在索引范围内
+
+用法:
+    python dataset_index.py build --labels VisDrone/annotations --images VisDrone/images --dataset VisDrone2019
+    python dataset_index.py query --labels VisDrone/annotations --dataset VisDrone2019 --class People --min-count 51
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import image_source
+import parsers
+from batch_render import iter_bounded
+from stats import FILES_PER_TASK, _batched, find_image, iter_label_files, object_geometry, parse_size
+
+INDEX_VERSION = 2
+INDEX_DIR = os.environ.get('RS_VIEWER_INDEX', os.path.join(os.path.expanduser('~'), '.cache', 'rs_viewer', 'index'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    label_path TEXT UNIQUE NOT NULL,
+    image_path TEXT,
+    mtime_ns INTEGER,
+    file_size INTEGER,
+    image_mtime_ns INTEGER,
+    width INTEGER,
+    height INTEGER,
+    n_objects INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS objects (
+    image_id INTEGER NOT NULL,
+    obj_index INTEGER NOT NULL,
+    class_id INTEGER NOT NULL,
+    area REAL,
+    size REAL,
+    aspect REAL,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    PRIMARY KEY (image_id, obj_index)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS objects_by_class ON objects (class_id, size);
+CREATE TABLE IF NOT EXISTS image_classes (
+    class_id INTEGER NOT NULL,
+    image_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (class_id, image_id)
+) WITHOUT ROWID;
+"""
+
+
+def default_index_path(label_dir, dataset_type):
+    """索引文件位置：按标注目录与数据集类型区分，放在用户缓存目录中 (数据集目录可能只读)"""
+    raw = f"{os.path.abspath(label_dir)}|{dataset_type}|v{INDEX_VERSION}"
+    return os.path.join(INDEX_DIR, hashlib.sha1(raw.encode('utf-8')).hexdigest() + '.sqlite')
+
+
+# ================= 工作进程 =================
+def summarize_file(label_path, image_path, dataset_type):
+    """
+    解析一个标注文件，返回索引需要的摘要
+    :param image_path: 主进程扫描时找到的对应图片，没有图片时为 None
+    :return: dict (image_path / width / height / class_names / class_ids / area / aspect / hbb / error)
+    """
+    summary = {'label_path': label_path, 'image_path': image_path, 'width': None, 'height': None, 'error': None}
+    try:
+        size = image_source.image_size(image_path) if image_path else None
+        columns = parsers.parse_label_columns(label_path, dataset_type, parse_size(label_path, dataset_type, size),
+                                              os.path.basename(image_path) if image_path else None)
+    except Exception as e:
+        summary['error'] = str(e)
+        return summary
+    if size is not None:
+        summary['width'], summary['height'] = size
+    n = len(columns['coords'])
+    if n:
+        size_px, aspect, hbb = object_geometry(columns)
+    else:
+        size_px, aspect, hbb = np.zeros(0), np.zeros(0), np.zeros((0, 4))
+    summary.update(class_names=columns['class_names'], class_ids=columns['class_ids'],
+                   size=size_px, aspect=aspect, hbb=hbb)
+    return summary
+
+
+def _summarize_batch(task):
+    files, dataset_type = task
+    return [summarize_file(label_path, image_path, dataset_type) for label_path, image_path in files]
+
+
+def file_state(label_path, image_dir):
+    """
+    增量更新比较的文件状态：(标注 mtime, 标注大小, 图片路径, 图片 mtime)
+    图片被替换、新增或删除时状态随之变化，解析使用的图片尺寸可能已经不同
+    """
+    st = os.stat(label_path)
+    image_path = find_image(image_dir, os.path.splitext(os.path.basename(label_path))[0])
+    image_mtime = os.stat(image_path).st_mtime_ns if image_path else None
+    return st.st_mtime_ns, st.st_size, image_path, image_mtime
+
+
+# ================= 索引 =================
+class DatasetIndex:
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self._class_ids = dict(self.conn.execute("SELECT name, id FROM classes"))
+
+    def close(self):
+        self.conn.close()
+
+    def meta(self):
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def class_names(self):
+        """按目标数量从多到少排列的类别名"""
+        rows = self.conn.execute(
+            "SELECT c.name FROM classes c JOIN image_classes ic ON ic.class_id = c.id "
+            "GROUP BY c.id ORDER BY SUM(ic.count) DESC")
+        return [name for name, in rows]
+
+    def _class_id(self, name):
+        cid = self._class_ids.get(name)
+        if cid is None:
+            cid = self.conn.execute("INSERT INTO classes (name) VALUES (?)", (name,)).lastrowid
+            self._class_ids[name] = cid
+        return cid
+
+    def _write(self, summary, state):
+        """写入 (或替换) 一个标注文件的摘要，state 为 file_state 的结果，调用方负责事务"""
+        label_path = summary['label_path']
+        mtime, file_size, image_path, image_mtime = state
+        self._delete(label_path)
+        image_id = self.conn.execute(
+            "INSERT INTO images (label_path, image_path, mtime_ns, file_size, image_mtime_ns, width, height, "
+            "n_objects, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (label_path, image_path, mtime, file_size, image_mtime, summary['width'],
+             summary['height'], len(summary.get('size', ())), summary['error'])).lastrowid
+        if summary['error'] or not len(summary['size']):
+            return
+        lookup = np.array([self._class_id(name) for name in summary['class_names']], dtype=np.int64)
+        class_ids = lookup[summary['class_ids']]
+        size = summary['size'].astype(np.float64)
+        aspect = np.where(np.isfinite(summary['aspect']), summary['aspect'], None)
+        hbb = summary['hbb']
+        rows = zip([image_id] * len(size), range(len(size)), class_ids.tolist(), (size * size).tolist(),
+                   size.tolist(), aspect.tolist(), hbb[:, 0].tolist(), hbb[:, 1].tolist(),
+                   hbb[:, 2].tolist(), hbb[:, 3].tolist())
+        self.conn.executemany("INSERT INTO objects VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        ids, counts = np.unique(class_ids, return_counts=True)
+        self.conn.executemany("INSERT INTO image_classes VALUES (?, ?, ?)",
+                              [(int(c), image_id, int(k)) for c, k in zip(ids, counts)])
+
+    def _delete(self, label_path):
+        row = self.conn.execute("SELECT id FROM images WHERE label_path = ?", (label_path,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute("DELETE FROM objects WHERE image_id = ?", row)
+        self.conn.execute("DELETE FROM image_classes WHERE image_id = ?", row)
+        self.conn.execute("DELETE FROM images WHERE id = ?", row)
+
+    def update(self, label_dir, dataset_type, image_dir=None, workers=None, progress=None):
+        """
+        扫描标注目录并更新索引：新增与修改过的文件重新解析，已删除的文件移除
+        数据集类型或图片目录与上次不同时整个重建
+        :param progress: 可选回调 progress(已处理文件数, 需要处理的文件数)
+        :return: (重新解析的文件数, 移除的文件数)
+        """
+        label_dir = os.path.abspath(label_dir)
+        image_dir = os.path.abspath(image_dir) if image_dir else None
+        meta = {'version': str(INDEX_VERSION), 'label_dir': label_dir, 'image_dir': image_dir or '',
+                'dataset': dataset_type}
+        if self.meta() != meta:
+            with self.conn:
+                for table in ('objects', 'image_classes', 'images', 'classes', 'meta'):
+                    self.conn.execute(f"DELETE FROM {table}")
+                self.conn.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+            self._class_ids = {}
+
+        known = {row[0]: row[1:] for row in self.conn.execute(
+            "SELECT label_path, mtime_ns, file_size, image_path, image_mtime_ns FROM images")}
+        states = {}
+        for path in iter_label_files(label_dir, dataset_type):
+            state = file_state(path, image_dir)
+            if known.pop(path, None) != state:
+                states[path] = state
+        with self.conn:
+            for path in known:
+                self._delete(path)
+
+        total, done = len(states), 0
+        if progress:
+            progress(0, total)
+        if total:
+            workers = workers or os.cpu_count() or 1
+            files = ((path, state[2]) for path, state in states.items())
+            tasks = ((batch, dataset_type) for batch in _batched(files, FILES_PER_TASK))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for summaries in iter_bounded(pool, _summarize_batch, tasks, workers * 2):
+                    # 每批一个事务，中断后已完成的批次仍然有效
+                    with self.conn:
+                        for summary in summaries:
+                            self._write(summary, states[summary['label_path']])
+                    done += len(summaries)
+                    if progress:
+                        progress(done, total)
+        return total, len(known)
+
+    def query(self, classes=None, min_size=None, max_size=None, min_aspect=None, max_aspect=None,
+              min_count=1, max_count=None, limit=None):
+        """
+        筛选图片：目标满足 类别 ∈ classes、min_size <= 尺寸 (sqrt 面积) < max_size、长宽比范围，
+        且每张图片中满足条件的目标数量在 [min_count, max_count] 内
+        :return: [(image_path, label_path, 命中目标的 obj_index 数组)]，按命中数量从多到少排列
+        """
+        where, params = [], []
+        if classes:
+            ids = [self._class_ids[name] for name in classes if name in self._class_ids]
+            if not ids:
+                return []
+            where.append(f"o.class_id IN ({','.join('?' * len(ids))})")
+            params += ids
+        for column, op, value in (('size', '>=', min_size), ('size', '<', max_size),
+                                  ('aspect', '>=', min_aspect), ('aspect', '<', max_aspect)):
+            if value is not None:
+                where.append(f"o.{column} {op} ?")
+                params.append(value)
+        having = ["COUNT(*) >= ?"]
+        params_having = [max(1, min_count or 1)]
+        if max_count is not None:
+            having.append("COUNT(*) <= ?")
+            params_having.append(max_count)
+
+        sql = ("SELECT i.image_path, i.label_path, GROUP_CONCAT(o.obj_index) FROM objects o "
+               "JOIN images i ON i.id = o.image_id "
+               f"{'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"GROUP BY o.image_id HAVING {' AND '.join(having)} ORDER BY COUNT(*) DESC, i.label_path")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        results = []
+        for image_path, label_path, indices in self.conn.execute(sql, params + params_having):
+            results.append((image_path, label_path, np.array(sorted(map(int, indices.split(','))), dtype=np.int64)))
+        return results
+
+    def counts(self):
+        """(图片数, 目标数, 解析失败的文件数)"""
+        return self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(n_objects), 0), COUNT(error) FROM images").fetchone()
+
+
+def open_index(label_dir, dataset_type, path=None):
+    return DatasetIndex(path or default_index_path(label_dir, dataset_type))
+
+
+# ================= 命令行 =================
+def build_arg_parser():
+    p = argparse.ArgumentParser(description="数据集检索索引")
+    sub = p.add_subparsers(dest='command', required=True)
+
+    def common(sp):
+        sp.add_argument('--labels', required=True, help="标注目录")
+        sp.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                        help="数据集类型 (auto 为按文件内容自动识别)")
+        sp.add_argument('--db', default=None, help="索引文件路径，默认放在用户缓存目录")
+
+    b = sub.add_parser('build', help="建立或增量更新索引")
+    common(b)
+    b.add_argument('--images', default=None, help="图片目录 (用于记录图片路径与尺寸，可选)")
+    b.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+
+    q = sub.add_parser('query', help="按条件筛选图片")
+    common(q)
+    q.add_argument('--class', dest='classes', action='append', default=None, help="类别 (可重复)")
+    q.add_argument('--min-size', type=float, default=None, help="最小尺寸 sqrt(面积)，像素")
+    q.add_argument('--max-size', type=float, default=None, help="尺寸上限 (不含)，像素")
+    q.add_argument('--min-aspect', type=float, default=None, help="最小长宽比")
+    q.add_argument('--max-aspect', type=float, default=None, help="长宽比上限 (不含)")
+    q.add_argument('--min-count', type=int, default=1, help="每张图片至少命中的目标数")
+    q.add_argument('--max-count', type=int, default=None, help="每张图片至多命中的目标数")
+    q.add_argument('--limit', type=int, default=None, help="最多输出的图片数")
+    q.add_argument('--json', action='store_true', help="以 JSON Lines 输出 (含命中目标的行号)")
+    return p
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    index = open_index(args.labels, args.dataset, args.db)
+    try:
+        if args.command == 'build':
+            changed, removed = index.update(args.labels, args.dataset, args.images, args.workers)
+            n_images, n_objects, n_failed = index.counts()
+            print(f"重新解析 {changed} 个文件，移除 {removed} 个；索引共 {n_images} 张图片、{n_objects} 个目标，"
+                  f"解析失败 {n_failed} 个 ({index.path})")
+            return 0
+
+        if not index.meta():
+            print("索引不存在，请先运行 build", file=sys.stderr)
+            return 1
+        results = index.query(args.classes, args.min_size, args.max_size, args.min_aspect, args.max_aspect,
+                              args.min_count, args.max_count, args.limit)
+        for image_path, label_path, indices in results:
+            if args.json:
+                print(json.dumps({'image': image_path, 'label': label_path, 'objects': indices.tolist()},
+                                 ensure_ascii=False))
+            else:
+                print(f"{len(indices):6d}  {image_path or label_path}")
+        if not args.json:
+            print(f"共 {len(results)} 张图片", file=sys.stderr)
+        return 0
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
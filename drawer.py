@@ -1,7 +1,30 @@
 # drawer.py
 import math
 
-from PIL import ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImagePath
+
+import profiling
+from annotations import AnnotationSet
+from fonts import get_atlas
+
+# 虚线样式: (实线段长度, 间隔长度)
+DASH_PATTERNS = {
+    'dashed_loose': (15, 10),
+    'dashed_dense': (5, 5)
+}
+LINE_STYLE_NAMES = ['solid'] + list(DASH_PATTERNS.keys())
+
+# 批量光栅化时每批处理的采样点数，限制临时数组的内存
+RASTER_CHUNK = 1 << 21
+# 线条像素少于掩码面积的 1/5 时逐点写入比带掩码 paste 整个区域更快
+SPARSE_POINT_RATIO = 5
+# 传入 check 时每绘制这么多个目标调用一次 (后台渲染据此中止已被取代的任务)
+CHECK_EVERY = 2000
+# 光栅化取整时 .5 的容差，远大于坐标平移带来的浮点误差
+ROUND_EPS = 1e-6
+# 选择主方向时 |dx| 与 |dy| 的相对容差：接近 45° 的边在平移或裁剪后两者的大小关系可能翻转
+MAJOR_EPS = 1e-6
 
 
 def draw_dashed_line(draw, p1, p2, width=1, dash_len=10, gap_len=5, color='red'):
@@ -37,99 +60,296 @@ def draw_dashed_line(draw, p1, p2, width=1, dash_len=10, gap_len=5, color='red')
         current_dist += (dash_len + gap_len)
 
 
+def dash_segments(edges, dash_len, gap_len):
+    """
+    向量化地把所有边切分成虚线段，每条边从起点重新开始计算虚线节奏 (与 draw_dashed_line 一致)
+    :param edges: E×4 数组 [x1, y1, x2, y2]
+    :return: S×4 数组，每行是一段实线
+    """
+    edges = np.asarray(edges, dtype=np.float64).reshape(-1, 4)
+    delta = edges[:, 2:] - edges[:, :2]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+
+    period = dash_len + gap_len
+    counts = np.where(length > 0, np.ceil(length / period), 0).astype(np.int64)
+    idx = np.repeat(np.arange(len(edges)), counts)
+    k = np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    start = k * period
+    end = np.minimum(start + dash_len, length[idx])
+    unit = delta[idx] / length[idx, None]
+    origin = edges[idx, :2]
+    return np.hstack([origin + unit * start[:, None], origin + unit * end[:, None]])
+
+
+def clip_segments(segments, x_min, y_min, x_max, y_max):
+    """Liang-Barsky 算法批量裁剪线段，丢弃完全在矩形外的部分"""
+    seg = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    x0, y0 = seg[:, 0], seg[:, 1]
+    dx, dy = seg[:, 2] - x0, seg[:, 3] - y0
+
+    t0 = np.zeros(len(seg))
+    t1 = np.ones(len(seg))
+    keep = np.ones(len(seg), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in ((-dx, x0 - x_min), (dx, x_max - x0), (-dy, y0 - y_min), (dy, y_max - y0)):
+            keep &= ~((p == 0) & (q < 0))
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+
+    t0, t1 = t0[keep], t1[keep]
+    x0, y0, dx, dy = x0[keep], y0[keep], dx[keep], dy[keep]
+    return np.column_stack([x0 + t0 * dx, y0 + t0 * dy, x0 + t1 * dx, y0 + t1 * dy])
+
+
+def _round(values):
+    """
+    四舍五入到整数像素；恰好落在 .5 附近的值一律向上取整
+    平移整数像素后浮点误差可能让同一个 .5 落到两侧，np.rint 的结果随之不同，分块绘制时会出现错位的像素
+    """
+    return np.floor(values + (0.5 + ROUND_EPS))
+
+
+def _segment_raster_params(seg, width):
+    """
+    DDA 参数: 在主方向的每个整数像素位置采样一个点，再沿次方向扩展到线宽
+    采样位置只取决于线段所在直线而不取决于端点，因此裁剪或整数平移后结果不变 (分块绘制无接缝)
+    次方向上的像素数 = 线宽 / cos(θ)，使垂直于线段的宽度与 ImageDraw.line 一致
+    |dx| 与 |dy| 相差在 MAJOR_EPS 以内时一律以 x 为主方向，各图块对 45° 附近的边作出相同的选择
+    :return: (每段采样点数, 每段次方向像素数, 是否以 x 为主方向)
+    """
+    adx = np.abs(seg[:, 2] - seg[:, 0])
+    ady = np.abs(seg[:, 3] - seg[:, 1])
+    major = np.maximum(adx, ady)
+    x_major = adx >= ady * (1 - MAJOR_EPS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thick = np.where(major > 0, np.rint(width * np.hypot(adx, ady) / major), width)
+    thick = np.maximum(thick, 1).astype(np.int32)
+    a0 = np.where(x_major, seg[:, 0], seg[:, 1])
+    a1 = np.where(x_major, seg[:, 2], seg[:, 3])
+    steps = np.abs(_round(a1) - _round(a0)).astype(np.int64) + 1
+    return steps, thick, x_major
+
+
+def _segment_pixels(seg, width):
+    """分批产出线段覆盖的像素坐标 (xs, ys)，可能包含重复与越界的点"""
+    steps, thick, x_major = _segment_raster_params(seg, width)
+    csum = np.cumsum(steps)
+    cuts = np.searchsorted(csum, np.arange(RASTER_CHUNK, csum[-1], RASTER_CHUNK), side='right')
+    chunks = np.unique(np.concatenate([[0], cuts, [len(seg)]]))
+    for first, last in zip(chunks[:-1], chunks[1:]):
+        s, n = seg[first:last], steps[first:last]
+        xm_seg = x_major[first:last]
+        # 统一到 (主方向, 次方向) 坐标
+        a0 = np.where(xm_seg, s[:, 0], s[:, 1])
+        a1 = np.where(xm_seg, s[:, 2], s[:, 3])
+        b0 = np.where(xm_seg, s[:, 1], s[:, 0])
+        b1 = np.where(xm_seg, s[:, 3], s[:, 2])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = np.where(a1 != a0, (b1 - b0) / (a1 - a0), 0.0)
+        direction = np.where(a1 >= a0, 1, -1)
+
+        idx = np.repeat(np.arange(len(s), dtype=np.int32), n)
+        k = np.arange(len(idx), dtype=np.int32) - np.repeat((np.cumsum(n) - n).astype(np.int32), n)
+        major = _round(a0)[idx] + k * direction[idx]
+        minor = _round(b0[idx] + (major - a0[idx]) * slope[idx]).astype(np.int32)
+        major = major.astype(np.int32)
+        xm = xm_seg[idx]
+        px = np.where(xm, major, minor)
+        py = np.where(xm, minor, major)
+        th = thick[first:last][idx]
+        start = (th - 1) // 2
+        for o in range(int(th.max())):
+            sel = o < th
+            off = np.where(sel, o - start, 0)
+            yield np.where(xm, px, px + off), np.where(xm, py + off, py)
+
+
+def _visible_segments(size, segments, width):
+    img_w, img_h = size
+    pad = width  # 斜线在次方向上的扩展最多约为 1.42 倍线宽
+    return clip_segments(segments, -pad, -pad, img_w - 1 + pad, img_h - 1 + pad)
+
+
+def _rasterize_visible(size, seg, width):
+    """
+    将大量线段一次性光栅化为掩码，代替逐段调用 ImageDraw.line
+    :param size: 目标图片尺寸 (w, h)
+    :return: (mask, box)，mask 为 uint8 掩码数组，box 为其在目标图片中的位置；无可见线段时返回 None
+    """
+    img_w, img_h = size
+    if len(seg) == 0:
+        return None
+
+    # 只为线段覆盖的区域分配掩码
+    pad = width
+    bx0 = max(0, int(np.floor(min(seg[:, 0].min(), seg[:, 2].min()))) - pad)
+    by0 = max(0, int(np.floor(min(seg[:, 1].min(), seg[:, 3].min()))) - pad)
+    bx1 = min(img_w, int(np.ceil(max(seg[:, 0].max(), seg[:, 2].max()))) + pad + 1)
+    by1 = min(img_h, int(np.ceil(max(seg[:, 1].max(), seg[:, 3].max()))) + pad + 1)
+    if bx1 <= bx0 or by1 <= by0:
+        return None
+    mw, mh = bx1 - bx0, by1 - by0
+    mask = np.zeros((mh, mw), dtype=np.uint8)
+
+    for xs, ys in _segment_pixels(seg, width):
+        xs = xs - bx0
+        ys = ys - by0
+        ok = (xs >= 0) & (xs < mw) & (ys >= 0) & (ys < mh)
+        mask[ys[ok], xs[ok]] = 255
+
+    return mask, (bx0, by0, bx1, by1)
+
+
+def draw_dashed_edges(img, edges, dash_len, gap_len, width=1, color='red'):
+    """批量绘制虚线：一次向量化切分所有边，再以尽量少的绘制调用合成到图片上"""
+    if not len(edges):
+        return 0
+    segments = dash_segments(edges, dash_len, gap_len)
+    profiling.count('dash_segments', len(segments))
+    return draw_segments(img, segments, width, color)
+
+
+def draw_segments(img, segments, width=1, color='red'):
+    """批量绘制线段 (S×4 数组)，返回线段数量"""
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    seg = _visible_segments(img.size, segments, width)
+    if len(seg) == 0:
+        return len(segments)
+
+    steps, thick, _ = _segment_raster_params(seg, width)
+    img_w, img_h = img.size
+    if int((steps * thick).sum()) * SPARSE_POINT_RATIO < img_w * img_h:
+        # 线条稀疏: 直接把像素坐标交给 ImageDraw.point，每批一次调用
+        draw = ImageDraw.Draw(img)
+        for xs, ys in _segment_pixels(seg, width):
+            ok = (xs >= 0) & (xs < img_w) & (ys >= 0) & (ys < img_h)
+            # ImagePath.Path 直接读取 float32 缓冲区，避免构造 Python 列表
+            points = np.column_stack([xs[ok], ys[ok]]).astype(np.float32).ravel()
+            draw.point(ImagePath.Path(points), fill=color)
+    else:
+        # 线条密集: 先合成掩码，再以一次带掩码的 paste 写入
+        mask, box = _rasterize_visible(img.size, seg, width)
+        img.paste(color, box, Image.fromarray(mask, 'L'))
+    return len(segments)
+
+
+def font_size_for(image_width):
+    """类别文字字号随图片宽度增大"""
+    return max(10, int(image_width / 800 * 5))
+
+
 def draw_on_image(pil_image, objects,
+                  visible=None,
                   color_name='red',
                   show_labels=True,
                   dota_mode='OBB',
                   line_style='solid',
-                  line_width=2):
+                  line_width=2,
+                  transform=None,
+                  inplace=False,
+                  font_size=None,
+                  seamless=False,
+                  geometry=None,
+                  check=None):
     """
     在图片上绘制目标
+    :param objects: annotations.AnnotationSet (也接受旧版 list-of-dicts)
+    :param visible: 与 objects 等长的布尔掩码，只绘制为 True 的目标；为 None 时使用 objects.visible
     :param show_labels: 是否显示类别文字 (bool)
     :param dota_mode: DOTA数据集展示模式 'OBB' (旋转框) 或 'HBB' (水平外接框)
+    :param transform: (ratio, offset_x, offset_y)，将原图坐标映射到目标图片坐标 (视口渲染时使用)
+    :param inplace: 直接在传入的图片上绘制，不复制原图
+    :param font_size: 类别文字字号，默认按图片宽度计算 (分块导出时需传入整图对应的字号)
+    :param seamless: 实线也使用批量光栅化，结果与整数平移和裁剪无关，分块绘制时块与块之间没有错位
+    :param geometry: 与 objects 对应的 geometry.ObjectGeometry，为 None 时使用 objects.geometry
+    :param check: 无参回调，绘制过程中每 CHECK_EVERY 个目标调用一次，抛出异常即中止绘制
     """
-    img_copy = pil_image.copy()
+    img_copy = pil_image if inplace else pil_image.copy()
     draw = ImageDraw.Draw(img_copy)
 
     width, height = img_copy.size
     # line_width = max(2, int(width / 800))
-    font_size = max(10, int(width / 800 * 5))
+    if font_size is None:
+        font_size = font_size_for(width)
+    # 原图上边缘在目标图片中的位置，文字超出上边缘时改为写在框内
+    image_top = transform[2] if transform is not None else 0
 
-    font = None
-    if show_labels:
-        try:
-            font = ImageFont.truetype("arial.ttf", size=font_size)
-        except:
-            pass
+    # 类别文字从 fonts 的文字图集中取预渲染的掩码，每个类别名每个字号只光栅化一次
+    atlas = get_atlas(font_size) if show_labels else None
 
     # 设定虚线参数
-    dash_params = None
-    if line_style == 'dashed_loose':
-        dash_params = (15, 10)
-    elif line_style == 'dashed_dense':
-        dash_params = (5, 5)
-
-    draw_count = 0
-
-    for obj in objects:
-        if 'var' in obj and not obj['var'].get():
-            continue
-
-        draw_count += 1
-        coords = obj['coords']
-        label_text = f"{obj['class_name']}"
-
-        # === 绘制逻辑分支 ===
-        points_to_draw = []
-        # 1. 普通矩形框 (AI-TOD, VisDrone)
-        if obj['type'] == 'box':
-            # draw.rectangle(coords, outline=color_name, width=line_width)
-            x1, y1, x2, y2 = coords
-            points_to_draw = [(x1, y1), (x2, y1), (x2, y2), (x1, y2), (x1, y1)]
-            if show_labels:
-                text_x = coords[0]
-                text_y = coords[1] - font_size - 2
-                if text_y < 0: text_y = coords[1]
-                draw.text((text_x, text_y), label_text, fill=color_name, font=font)
-
-        # 2. 多边形框 (DOTA)
-        elif obj['type'] == 'poly':
-            # DOTA 数据通常是 [x1, y1, x2, y2, x3, y3, x4, y4]
-
-            # 如果用户选择 'HBB' (水平框)，则计算外接矩形
-            if dota_mode == 'HBB':
-                xs = coords[::2]
-                ys = coords[1::2]
-                min_x, max_x = min(xs), max(xs)
-                min_y, max_y = min(ys), max(ys)
-                points_to_draw = [(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y), (min_x, min_y)]
-
-                # draw.rectangle([min_x, min_y, max_x, max_y], outline=color_name, width=line_width)
-
-                if show_labels:
-                    draw.text((min_x, min_y - font_size - 2), label_text, fill=color_name, font=font)
-
-            # 否则默认为 'OBB' (旋转框/多边形)
-            else:
-                poly_points = list(zip(coords[::2], coords[1::2]))
-                if len(poly_points) >= 3:
-                    points_to_draw = poly_points + [poly_points[0]]  # 闭合
-                    # draw.line(poly_points_draw, fill=color_name, width=line_width)
-
-                    if show_labels:
-                        # 找最高点写字
-                        top_point = min(poly_points, key=lambda p: p[1])
-                        draw.text((top_point[0], top_point[1] - font_size - 2), label_text, fill=color_name, font=font)
-
-        if not points_to_draw:
-            continue
-
-        if line_style == 'solid':
-            draw.line(points_to_draw, fill=color_name, width=line_width)
-        else:
-            d_len, g_len = dash_params
-            for i in range(len(points_to_draw) - 1):
-                draw_dashed_line(draw, points_to_draw[i], points_to_draw[i + 1],
-                                 width=line_width, dash_len=d_len, gap_len=g_len, color=color_name)
-
-    return img_copy, draw_count
\ No newline at end of file
+    dash_params = DASH_PATTERNS.get(line_style)
+
+    if not isinstance(objects, AnnotationSet):
+        objects = AnnotationSet.from_objects(objects)
+    keep = np.flatnonzero(objects.visible if visible is None else visible)
+    geometry = (geometry if geometry is not None else objects.geometry).take(keep)
+
+    # === 绘制逻辑分支 ===
+    # 1. 普通矩形框 (AI-TOD, VisDrone) 画四个角点
+    # 2. 多边形框 (DOTA)：'HBB' (水平框) 画外接矩形，否则默认为 'OBB' (旋转框/多边形)
+    hbb = dota_mode == 'HBB'
+    verts = geometry.outlines(hbb)
+    anchors = geometry.label_anchors(hbb) if show_labels else None
+    if transform is not None:
+        ratio, off_x, off_y = transform
+        offset = np.array([off_x, off_y])
+        verts = verts * ratio + offset
+        if anchors is not None:
+            anchors = anchors * ratio + offset
+    counts = np.where(geometry.is_box | hbb, 4, geometry.counts)
+    drawable = geometry.is_box | hbb | (counts >= 3)
+    draw_count = len(keep)
+    profiling.count('objects_drawn', draw_count)
+
+    if show_labels:
+        # 文字写在锚点上方；矩形框的文字超出原图上边缘时改为写在框内
+        text_y = anchors[:, 1] - font_size - 2
+        inside = geometry.is_box & (text_y < image_top)
+        text_y[inside] = anchors[inside, 1]
+        names = objects.class_names
+        class_ids = objects.class_ids[keep]
+        ink = ImageColor.getcolor(color_name, img_copy.mode)
+        rows = np.flatnonzero(drawable)
+        with profiling.span('labels'):
+            for i, (cid, ax, ay) in enumerate(zip(class_ids[rows].tolist(), anchors[rows, 0].tolist(),
+                                                  text_y[rows].tolist())):
+                if check is not None and i % CHECK_EVERY == 0:
+                    check()
+                atlas.draw(img_copy, (ax, ay), names[cid], ink)
+        profiling.count('labels_drawn', len(rows))
+
+    if dash_params is None and not seamless:
+        # 每个目标一个扁平坐标列表 [x1, y1, ..., x1, y1]
+        closed = np.concatenate([verts, verts[:, :1]], axis=1).reshape(len(verts), -1).tolist()
+        uniform = bool((counts == verts.shape[1]).all())
+        for i, k in enumerate(np.flatnonzero(drawable)):
+            if check is not None and i % CHECK_EVERY == 0:
+                check()
+            points = closed[k] if uniform else closed[k][:2 * counts[k]] + closed[k][-2:]
+            draw.line(points, fill=color_name, width=line_width)
+        return img_copy, draw_count
+
+    # 虚线 (或 seamless) 模式下批量绘制所有边
+    nxt = np.roll(verts, -1, axis=1)
+    edges = np.concatenate([verts, nxt], axis=2)
+    k = np.arange(verts.shape[1])
+    edge_ok = drawable[:, None] & (k[None, :] < counts[:, None])
+    # 最后一个实际顶点连回第一个顶点
+    last = np.clip(counts - 1, 0, None)
+    rows = np.arange(len(verts))
+    edges[rows, last, 2:] = verts[:, 0]
+    dash_edges = edges[edge_ok]
+
+    if check is not None:
+        check()
+    if dash_params is not None:
+        d_len, g_len = dash_params
+        draw_dashed_edges(img_copy, dash_edges, d_len, g_len, width=line_width, color=color_name)
+    elif len(dash_edges):
+        draw_segments(img_copy, dash_edges, width=line_width, color=color_name)
+
+    return img_copy, draw_count
@@ -0,0 +1,345 @@
+# export.py
+"""
+分块流式导出：逐块读取原图、只绘制与该块相交的目标，并把结果直接写入分块 TIFF 或切片目录。
+峰值内存只与图块大小有关，与整图大小无关 (PNG、压缩 TIFF 等无法按窗口读取的格式除外)。
+
+用法示例:
+    python export.py --image P0001.tif --label P0001.txt --dataset DOTA --output P0001_vis.tif
+    python export.py --image P0001.tif --label P0001.txt --dataset DOTA --output chips/ --chips
+    python export.py --image P0001.tif --label P0001.txt --dataset DOTA --show-labels --verify
+"""
+import argparse
+import os
+import struct
+import sys
+
+import numpy as np
+from PIL import Image
+
+import drawer
+import fonts
+import image_source
+import parsers
+import spatial_index
+from annotations import AnnotationSet
+
+TILE_SIZE = 512
+BIGTIFF_THRESHOLD = (1 << 32) - (1 << 24)  # 预计超过 4GB 时改用 BigTIFF
+
+# TIFF 标签与字段类型
+_SHORT, _LONG, _LONG8 = 3, 4, 16
+_PHOTOMETRIC = {'L': 1, 'RGB': 2, 'RGBA': 2}
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+class TiledTiffWriter:
+    """
+    流式写入未压缩的分块 TIFF：图块数据按写入顺序追加，关闭时在文件末尾写入 IFD
+    输出可以被 image_source.TiffSource 按窗口读取
+    """
+
+    def __init__(self, path, size, mode, tile_size=TILE_SIZE):
+        if mode not in _PHOTOMETRIC:
+            raise ValueError(f"不支持的图像模式: {mode}")
+        self.path = path
+        self.size = size
+        self.mode = mode
+        self.tile_size = tile_size
+        self.bands = len(mode)
+        self.nx = (size[0] + tile_size - 1) // tile_size
+        self.ny = (size[1] + tile_size - 1) // tile_size
+        self.tile_bytes = tile_size * tile_size * self.bands
+        self.bigtiff = self.nx * self.ny * self.tile_bytes > BIGTIFF_THRESHOLD
+        self.offsets = [0] * (self.nx * self.ny)
+
+        self.f = open(path, 'wb')
+        if self.bigtiff:
+            self.f.write(b'II+\x00' + struct.pack('<HHQ', 8, 0, 0))
+        else:
+            self.f.write(b'II*\x00' + struct.pack('<I', 0))
+
+    def write_tile(self, tx, ty, tile):
+        """写入一个图块；右侧与底部不足一整块的部分补零"""
+        ts = self.tile_size
+        if tile.mode != self.mode:
+            tile = tile.convert(self.mode)
+        if tile.size != (ts, ts):
+            padded = Image.new(self.mode, (ts, ts))
+            padded.paste(tile, (0, 0))
+            tile = padded
+        self.offsets[ty * self.nx + tx] = self.f.tell()
+        self.f.write(tile.tobytes())
+
+    def _entry(self, tag, typ, values):
+        """返回 (IFD 条目中的值字段, 需要写在 IFD 之外的数据)"""
+        fmt = {_SHORT: 'H', _LONG: 'I', _LONG8: 'Q'}[typ]
+        data = struct.pack(f'<{len(values)}{fmt}', *values)
+        inline = 8 if self.bigtiff else 4
+        return tag, typ, len(values), data, len(data) <= inline
+
+    def close(self):
+        """写入 IFD 并关闭文件"""
+        if self.f is None:
+            return
+        ts = self.tile_size
+        offset_type = _LONG8 if self.bigtiff else _LONG
+        entries = [
+            self._entry(256, _LONG, [self.size[0]]),
+            self._entry(257, _LONG, [self.size[1]]),
+            self._entry(258, _SHORT, [8] * self.bands),
+            self._entry(259, _SHORT, [1]),
+            self._entry(262, _SHORT, [_PHOTOMETRIC[self.mode]]),
+            self._entry(277, _SHORT, [self.bands]),
+            self._entry(284, _SHORT, [1]),
+            self._entry(322, _SHORT, [ts]),
+            self._entry(323, _SHORT, [ts]),
+            self._entry(324, offset_type, self.offsets),
+            self._entry(325, offset_type, [self.tile_bytes] * len(self.offsets)),
+        ]
+        if self.mode == 'RGBA':
+            entries.append(self._entry(338, _SHORT, [2]))  # 非预乘的 alpha
+
+        # 先写放不进条目的数组，再写 IFD
+        f = self.f
+        external = {}
+        for tag, _, _, data, fits in entries:
+            if not fits:
+                if f.tell() % 2:
+                    f.write(b'\x00')
+                external[tag] = f.tell()
+                f.write(data)
+        if f.tell() % 2:
+            f.write(b'\x00')
+        ifd_offset = f.tell()
+
+        if self.bigtiff:
+            f.write(struct.pack('<Q', len(entries)))
+            for tag, typ, count, data, fits in entries:
+                value = data.ljust(8, b'\x00') if fits else struct.pack('<Q', external[tag])
+                f.write(struct.pack('<HHQ', tag, typ, count) + value)
+            f.write(struct.pack('<Q', 0))
+            f.seek(8)
+            f.write(struct.pack('<Q', ifd_offset))
+        else:
+            f.write(struct.pack('<H', len(entries)))
+            for tag, typ, count, data, fits in entries:
+                value = data.ljust(4, b'\x00') if fits else struct.pack('<I', external[tag])
+                f.write(struct.pack('<HHI', tag, typ, count) + value)
+            f.write(struct.pack('<I', 0))
+            f.seek(4)
+            f.write(struct.pack('<I', ifd_offset))
+        f.close()
+        self.f = None
+
+    def abort(self):
+        """放弃写入并删除半成品"""
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# ================= 分块渲染 =================
+def iter_tiles(size, tile_size=TILE_SIZE):
+    """按行优先顺序产出 (tx, ty, box)"""
+    w, h = size
+    for ty in range((h + tile_size - 1) // tile_size):
+        for tx in range((w + tile_size - 1) // tile_size):
+            yield tx, ty, (tx * tile_size, ty * tile_size,
+                           min((tx + 1) * tile_size, w), min((ty + 1) * tile_size, h))
+
+
+def _mask_extent(atlas, text):
+    """文字掩码相对绘制位置的范围 (left, top, right, bottom)"""
+    mask, (dx, dy) = atlas.get(text)
+    if mask is None:
+        return 0, 0, 0, 0
+    w, h = mask.size
+    return dx, dy, dx + w, dy + h
+
+
+class TileRenderer:
+    """
+    按图块绘制标注：目标外接矩形 (含线宽与类别文字所占范围) 登记在网格索引中，
+    每个图块只绘制与之相交的目标，坐标平移到图块内，超出图块的部分由 PIL 裁掉
+    """
+
+    def __init__(self, source, objects, visible=None, draw_options=None, geom=None):
+        """
+        :param objects: annotations.AnnotationSet
+        :param visible: 可见掩码，为 None 时使用 objects.visible
+        """
+        self.source = source
+        self.options = dict(draw_options or {})
+        self.font_size = drawer.font_size_for(source.size[0])
+
+        if geom is None:
+            geom = objects.geometry
+        keep = np.flatnonzero(objects.visible if visible is None else visible)
+        objects = objects.take(keep)
+        geom = geom.take(keep)
+        self.objects = objects
+        self.geometry = geom
+
+        boxes = geom.envelopes.copy()
+        pad = self.options.get('line_width', 2) + 1
+        boxes[:, :2] -= pad
+        boxes[:, 2:] += pad
+        if self.options.get('show_labels', True) and len(objects):
+            # 文字写在锚点 (与 drawer 相同：矩形与 HBB 取左上角，OBB 取最高顶点) 上方，矩形框靠近图片上边缘时写在框内；
+            # 按每个类别名掩码的实际范围计算文字矩形，与外接矩形合并
+            atlas = fonts.get_atlas(self.font_size)
+            extents = np.array([_mask_extent(atlas, name) for name in objects.class_names],
+                               dtype=np.float64).reshape(-1, 4)[objects.class_ids]
+            anchors = geom.label_anchors(self.options.get('dota_mode', 'OBB') == 'HBB')
+            ax, ay = np.floor(anchors[:, 0]), np.floor(anchors[:, 1])
+            above = np.floor(anchors[:, 1] - self.font_size - 2)
+            boxes[:, 0] = np.minimum(boxes[:, 0], ax + extents[:, 0] - 1)
+            boxes[:, 1] = np.minimum(boxes[:, 1], above + extents[:, 1] - 1)
+            boxes[:, 2] = np.maximum(boxes[:, 2], ax + extents[:, 2] + 1)
+            boxes[:, 3] = np.maximum(boxes[:, 3], ay + extents[:, 3] + 1)
+        self.index = spatial_index.GridIndex(boxes)
+
+    def render(self, box):
+        x0, y0, x1, y1 = box
+        tile = self.source.read_region(0, box)
+        if tile.mode == 'L':
+            tile = tile.convert('RGB')  # 彩色标注需要彩色图
+        hits = self.index.query_box(x0, y0, x1, y1)
+        if len(hits):
+            drawer.draw_on_image(tile, self.objects.take(hits), geometry=self.geometry.take(hits),
+                                 transform=(1.0, -x0, -y0), inplace=True,
+                                 font_size=self.font_size, seamless=True, **self.options)
+        return tile
+
+
+def verify_tiles(source, objects, visible=None, draw_options=None, geometry=None, tile_size=TILE_SIZE):
+    """
+    检查分块绘制与整图绘制的结果是否一致 (整图需能放进内存)
+    :return: 不一致的像素数
+    """
+    renderer = TileRenderer(source, objects, visible, draw_options, geometry)
+    whole, _ = drawer.draw_on_image(source.load(), objects, visible=visible, geometry=geometry, inplace=True,
+                                    font_size=renderer.font_size, seamless=True, **renderer.options)
+    if whole.mode == 'L':
+        whole = whole.convert('RGB')
+    mismatched = 0
+    for _, _, box in iter_tiles(source.size, tile_size):
+        diff = np.asarray(renderer.render(box)) != np.asarray(whole.crop(box))
+        mismatched += int(diff.reshape(diff.shape[0], diff.shape[1], -1).any(axis=2).sum())
+    return mismatched
+
+
+def _run(renderer, tile_size, write, progress, cancel):
+    tiles = list(iter_tiles(renderer.source.size, tile_size))
+    for done, (tx, ty, box) in enumerate(tiles, 1):
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+        write(tx, ty, box, renderer.render(box))
+        if progress:
+            progress(done, len(tiles))
+
+
+def export_tiff(source, objects, out_path, visible=None, draw_options=None, geometry=None,
+                tile_size=TILE_SIZE, progress=None, cancel=None):
+    """
+    导出为分块 TIFF (先写 .part 临时文件，完成后改名)
+    :param source: image_source.ImageSource
+    :param objects: annotations.AnnotationSet
+    :param geometry: 与 objects 对应的 geometry.ObjectGeometry，为 None 时使用 objects.geometry
+    :param progress: progress(已完成块数, 总块数)，在调用线程中执行
+    :param cancel: threading.Event，置位后抛出 ExportCancelled 并删除半成品
+    """
+    renderer = TileRenderer(source, objects, visible, draw_options, geometry)
+    mode = 'RGBA' if source.mode == 'RGBA' else 'RGB'
+    tmp_path = out_path + '.part'
+    writer = TiledTiffWriter(tmp_path, source.size, mode, tile_size)
+    try:
+        _run(renderer, tile_size, lambda tx, ty, box, tile: writer.write_tile(tx, ty, tile), progress, cancel)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    os.replace(tmp_path, out_path)
+
+
+def export_chips(source, objects, out_dir, visible=None, draw_options=None, geometry=None,
+                 tile_size=TILE_SIZE, ext='.png', prefix='chip', progress=None, cancel=None):
+    """
+    导出为切片目录，文件名为 {prefix}_{x0}_{y0}{ext} (x0, y0 为切片在原图中的左上角)
+    :return: 写入的切片数量
+    """
+    renderer = TileRenderer(source, objects, visible, draw_options, geometry)
+    os.makedirs(out_dir, exist_ok=True)
+    fmt = Image.registered_extensions().get(ext.lower())
+    written = []
+
+    def write(tx, ty, box, tile):
+        if fmt == 'JPEG' and tile.mode != 'RGB':
+            tile = tile.convert('RGB')
+        path = os.path.join(out_dir, f"{prefix}_{box[0]}_{box[1]}{ext}")
+        tile.save(path, format=fmt)
+        written.append(path)
+
+    try:
+        _run(renderer, tile_size, write, progress, cancel)
+    except ExportCancelled:
+        for path in written:
+            os.remove(path)
+        raise
+    return len(written)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="分块流式导出带标注的大图")
+    p.add_argument('--image', required=True, help="原图")
+    p.add_argument('--label', required=True, help="标注文件")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--output', help="输出 .tif 文件，或 --chips 时的输出目录")
+    p.add_argument('--chips', action='store_true', help="输出切片目录而不是单个分块 TIFF")
+    p.add_argument('--chip-ext', default='.png', help="切片扩展名")
+    p.add_argument('--tile-size', type=int, default=TILE_SIZE, help="图块边长")
+    p.add_argument('--color', default='red', help="边框颜色 (PIL 颜色名或 #RRGGBB)")
+    p.add_argument('--line-style', default='solid', choices=drawer.LINE_STYLE_NAMES, help="线型")
+    p.add_argument('--line-width', type=int, default=2, help="线宽")
+    p.add_argument('--dota-mode', default='OBB', choices=['OBB', 'HBB'], help="DOTA 框型")
+    p.add_argument('--show-labels', action='store_true', help="显示类别名")
+    p.add_argument('--verify', action='store_true',
+                   help="不导出，只检查分块绘制与整图绘制的结果是否一致 (整图需能放进内存)")
+    args = p.parse_args(argv)
+    if not args.output and not args.verify:
+        p.error("需要 --output (或使用 --verify 只做检查)")
+
+    source = image_source.open_source(args.image)
+    objects = AnnotationSet.from_columns(
+        parsers.parse_label_columns(args.label, args.dataset, source.size, os.path.basename(args.image)))
+    options = {'color_name': args.color, 'show_labels': args.show_labels, 'dota_mode': args.dota_mode,
+               'line_style': args.line_style, 'line_width': args.line_width}
+
+    if args.verify:
+        mismatched = verify_tiles(source, objects, draw_options=options, tile_size=args.tile_size)
+        print("分块与整图绘制结果一致" if not mismatched else f"分块与整图绘制结果有 {mismatched} 个像素不一致")
+        return 1 if mismatched else 0
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end='', file=sys.stderr)
+
+    if args.chips:
+        prefix = os.path.splitext(os.path.basename(args.image))[0]
+        count = export_chips(source, objects, args.output, draw_options=options, tile_size=args.tile_size,
+                             ext=args.chip_ext, prefix=prefix, progress=progress)
+        print(f"\n已导出 {count} 个切片到 {args.output}")
+    else:
+        export_tiff(source, objects, args.output, draw_options=options, tile_size=args.tile_size,
+                    progress=progress)
+        print(f"\n已导出 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# fonts.py
+"""
+类别文字的字体管理与文字图集 (label atlas)。
+
+- 字体只解析一次：按 FONT_CANDIDATES 依次尝试，都不可用时使用 Pillow 自带的可缩放默认字体，
+  每个字号的字体对象缓存复用
+- 每个 (字号, 文字) 只用 FreeType 排版、光栅化一次，得到一张灰度掩码；之后绘制该文字只是
+  一次带掩码的 paste，颜色在 paste 时填充，因此同一张掩码可用于任意颜色
+"""
+import functools
+import math
+import os
+import threading
+
+from PIL import Image, ImageDraw, ImageFont
+
+# 依次尝试的字体 (文件名由 FreeType 在系统字体目录中查找，也可以是绝对路径)
+FONT_CANDIDATES = [
+    "arial.ttf",
+    "Arial.ttf",
+    "DejaVuSans.ttf",
+    "LiberationSans-Regular.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+# 环境变量 RSVIS_FONT 指定的字体优先
+FONT_ENV = "RSVIS_FONT"
+# 每个字号的图集最多缓存的文字数，超过后清空重建 (类别名通常只有几十个)
+ATLAS_MAX_ENTRIES = 4096
+
+
+@functools.lru_cache(maxsize=1)
+def resolve_font_path():
+    """
+    返回第一个可以加载的字体文件，没有时返回 None (使用 Pillow 默认字体)
+    结果缓存，整个进程只查找一次
+    """
+    candidates = list(FONT_CANDIDATES)
+    if os.environ.get(FONT_ENV):
+        candidates.insert(0, os.environ[FONT_ENV])
+    for path in candidates:
+        try:
+            ImageFont.truetype(path, size=10)
+        except OSError:
+            continue
+        return path
+    return None
+
+
+@functools.lru_cache(maxsize=32)
+def load_font(font_size):
+    """指定字号的字体 (缓存)；没有可用的 TrueType 字体时使用 Pillow 自带的可缩放默认字体"""
+    path = resolve_font_path()
+    if path is not None:
+        return ImageFont.truetype(path, size=font_size)
+    try:
+        return ImageFont.load_default(size=font_size)
+    except TypeError:
+        # Pillow < 10.1 的默认字体不支持字号
+        return ImageFont.load_default()
+
+
+class LabelAtlas:
+    """
+    一个字号下所有文字的预渲染掩码
+    draw() 的结果与 ImageDraw.text 在整数坐标处绘制相同
+    """
+
+    def __init__(self, font_size):
+        self.font_size = font_size
+        self.font = load_font(font_size)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, text):
+        """
+        文字的 (掩码, 相对文字原点的偏移)；第一次请求时光栅化
+        空白文字返回 (None, 偏移)
+        """
+        entry = self.entries.get(text)
+        if entry is not None:
+            return entry
+        left, top, right, bottom = self.font.getbbox(text)
+        if right <= left or bottom <= top:
+            entry = (None, (0, 0))
+        else:
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=self.font)
+            entry = (mask, (left, top))
+        with self.lock:
+            if len(self.entries) >= ATLAS_MAX_ENTRIES:
+                self.entries.clear()
+            self.entries[text] = entry
+        return entry
+
+    def width(self, text):
+        """文字绘制宽度 (像素)"""
+        return self.font.getlength(text)
+
+    def draw(self, img, xy, text, color):
+        """
+        在 img 上绘制文字，位置向下取整到像素 (平移整数像素后位置不变，分块绘制无错位)
+        超出图片的部分由 paste 裁剪
+        """
+        mask, (dx, dy) = self.get(text)
+        if mask is None:
+            return
+        x = math.floor(xy[0]) + dx
+        y = math.floor(xy[1]) + dy
+        w, h = mask.size
+        if x >= img.size[0] or y >= img.size[1] or x + w <= 0 or y + h <= 0:
+            return
+        img.paste(color, (x, y, x + w, y + h), mask)
+
+
+@functools.lru_cache(maxsize=32)
+def get_atlas(font_size):
+    """指定字号的文字图集 (进程内共享)"""
+    return LabelAtlas(font_size)
@@ -0,0 +1,274 @@
+# geometry.py
+"""
+目标几何量的向量化计算：外接矩形 (HBB)、面积、质心、方向角、类别文字锚点与批量点在多边形内判断。
+所有目标统一表示为 N×K×2 的顶点数组 (矩形展开为 4 个角点，顶点数不足 K 的多边形重复最后一个顶点补齐，
+重复顶点形成零长度的边，不影响面积、外接矩形与点在多边形内的判断)。
+
+每次加载标注时计算一次 ObjectGeometry，由绘图、点击命中测试与统计共用。
+"""
+import numpy as np
+
+
+# ================= 数组运算 =================
+def box_vertices(coords):
+    """N×4 矩形 [x1, y1, x2, y2] -> N×4×2 角点 (x1,y1) (x2,y1) (x2,y2) (x1,y2)"""
+    c = np.asarray(coords, dtype=np.float64).reshape(-1, 4)
+    xs = c[:, [0, 2, 2, 0]]
+    ys = c[:, [1, 1, 3, 3]]
+    return np.stack([xs, ys], axis=2)
+
+
+def poly_vertices(coords):
+    """N×2K 多边形坐标 [x1, y1, ..., xk, yk] -> N×K×2"""
+    c = np.asarray(coords, dtype=np.float64)
+    return c.reshape(len(c), c.shape[1] // 2 if c.ndim == 2 else 0, 2)
+
+
+def vertices_from_columns(columns):
+    """parsers.parse_label_columns 的列式结果 -> N×K×2 顶点数组"""
+    if columns['type'] == 'box':
+        return box_vertices(columns['coords'])
+    return poly_vertices(columns['coords'])
+
+
+def vertices_from_objects(objects):
+    """
+    目标列表 -> (N×K×2 顶点数组, 每个目标的实际顶点数)
+    box 与 poly 可以混合，顶点数不同的多边形按上面的规则补齐
+    """
+    n = len(objects)
+    if n == 0:
+        return np.zeros((0, 4, 2), dtype=np.float64), np.zeros(0, dtype=np.int64)
+
+    kinds = [obj['type'] for obj in objects]
+    lengths = [len(obj['coords']) for obj in objects]
+    if all(k == kinds[0] for k in kinds) and all(v == lengths[0] for v in lengths):
+        coords = np.array([obj['coords'] for obj in objects], dtype=np.float64)
+        verts = box_vertices(coords) if kinds[0] == 'box' else poly_vertices(coords)
+        counts = np.full(n, verts.shape[1], dtype=np.int64)
+        if 0 < verts.shape[1] < 4:
+            # 至少保留 4 个顶点的位置，HBB 模式下可以放下外接矩形
+            verts = np.concatenate([verts, np.repeat(verts[:, -1:], 4 - verts.shape[1], axis=1)], axis=1)
+        return verts, counts
+
+    counts = np.array([4 if k == 'box' else v // 2 for k, v in zip(kinds, lengths)], dtype=np.int64)
+    verts = np.zeros((n, max(4, int(counts.max())), 2), dtype=np.float64)
+    for i, obj in enumerate(objects):
+        if obj['type'] == 'box':
+            pts = box_vertices(obj['coords'])[0]
+        else:
+            pts = poly_vertices([obj['coords']])[0]
+        if len(pts) == 0:
+            continue
+        verts[i, :len(pts)] = pts
+        verts[i, len(pts):] = pts[-1]
+    return verts, counts
+
+
+def envelopes(verts):
+    """外接矩形 N×4 [x_min, y_min, x_max, y_max]"""
+    if len(verts) == 0:
+        return np.zeros((0, 4), dtype=np.float64)
+    return np.concatenate([verts.min(axis=1), verts.max(axis=1)], axis=1)
+
+
+def signed_area(verts):
+    """鞋带公式；图像坐标系 (y 向下) 中顺时针为正"""
+    xs, ys = verts[:, :, 0], verts[:, :, 1]
+    return 0.5 * np.sum(xs * np.roll(ys, -1, axis=1) - np.roll(xs, -1, axis=1) * ys, axis=1)
+
+
+def polygon_area(verts):
+    return np.abs(signed_area(verts))
+
+
+def centroids(verts):
+    """面积质心 N×2；面积为零的退化目标取外接矩形中心"""
+    xs, ys = verts[:, :, 0], verts[:, :, 1]
+    nx, ny = np.roll(xs, -1, axis=1), np.roll(ys, -1, axis=1)
+    cross = xs * ny - nx * ys
+    a = 0.5 * cross.sum(axis=1)
+    env = envelopes(verts)
+    out = np.column_stack([(env[:, 0] + env[:, 2]) * 0.5, (env[:, 1] + env[:, 3]) * 0.5])
+    ok = np.abs(a) > 1e-9
+    if ok.any():
+        cx = ((xs + nx) * cross).sum(axis=1)
+        cy = ((ys + ny) * cross).sum(axis=1)
+        out[ok, 0] = cx[ok] / (6 * a[ok])
+        out[ok, 1] = cy[ok] / (6 * a[ok])
+    return out
+
+
+def side_lengths(verts):
+    """前两条边的长度 (对矩形与 DOTA 四边形即两条邻边)，返回 (长边, 短边)"""
+    e1 = np.hypot(verts[:, 1, 0] - verts[:, 0, 0], verts[:, 1, 1] - verts[:, 0, 1])
+    e2 = np.hypot(verts[:, 2, 0] - verts[:, 1, 0], verts[:, 2, 1] - verts[:, 1, 1])
+    return np.maximum(e1, e2), np.minimum(e1, e2)
+
+
+def orientations(verts):
+    """长边方向角 (度，[0, 180))，水平框为 0 或 90"""
+    d1 = verts[:, 1] - verts[:, 0]
+    d2 = verts[:, 2] - verts[:, 1]
+    use_first = np.hypot(d1[:, 0], d1[:, 1]) >= np.hypot(d2[:, 0], d2[:, 1])
+    d = np.where(use_first[:, None], d1, d2)
+    return np.degrees(np.arctan2(d[:, 1], d[:, 0])) % 180.0
+
+
+def top_vertices(verts):
+    """最高 (y 最小) 的顶点 N×2；并列时取靠前的顶点，与 min(points, key=y) 一致"""
+    k = np.argmin(verts[:, :, 1], axis=1)
+    return verts[np.arange(len(verts)), k]
+
+
+def points_in_polygons(verts, x, y):
+    """
+    射线法批量判断点是否在多边形内 (边界上的点按半开规则归属)
+    :param x, y: 标量 (同一个点对所有多边形) 或与多边形等长的数组
+    :return: 长度为 N 的布尔数组
+    """
+    x = np.asarray(x, dtype=np.float64).reshape(-1, 1)
+    y = np.asarray(y, dtype=np.float64).reshape(-1, 1)
+    x1, y1 = verts[:, :, 0], verts[:, :, 1]
+    x2, y2 = np.roll(x1, -1, axis=1), np.roll(y1, -1, axis=1)
+    straddle = (y1 > y) != (y2 > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossings = straddle & (x < x_cross)
+    return np.count_nonzero(crossings, axis=1) % 2 == 1
+
+
+def self_intersecting(verts):
+    """
+    多边形是否自相交 (例如顶点顺序错误的 DOTA 四边形画成 "8" 字形)
+    检查所有不相邻的边对是否严格相交；只在端点接触或共线重叠的情况不算
+    :return: 长度为 N 的布尔数组
+    """
+    n, k = verts.shape[:2]
+    out = np.zeros(n, dtype=bool)
+    if k < 4 or n == 0:
+        return out
+    p1, p2 = verts, np.roll(verts, -1, axis=1)
+
+    def cross(o, a, b):
+        return (a[..., 0] - o[..., 0]) * (b[..., 1] - o[..., 1]) - (a[..., 1] - o[..., 1]) * (b[..., 0] - o[..., 0])
+
+    for i in range(k - 2):
+        for j in range(i + 2, k if i > 0 else k - 1):
+            a, b, c, d = p1[:, i], p2[:, i], p1[:, j], p2[:, j]
+            d1, d2 = cross(a, b, c), cross(a, b, d)
+            d3, d4 = cross(c, d, a), cross(c, d, b)
+            out |= (d1 * d2 < 0) & (d3 * d4 < 0)
+    return out
+
+
+def points_in_boxes(boxes, x, y):
+    """点是否在外接矩形内 (含边界)"""
+    return (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+
+
+# ================= 每次加载计算一次的几何缓存 =================
+class ObjectGeometry:
+    """
+    一组目标的几何量，下标与目标列表一一对应
+    外接矩形与类别锚点在构造时计算，面积等统计量在第一次访问时计算
+    """
+
+    def __init__(self, verts, is_box, counts=None):
+        self.verts = verts
+        self.is_box = is_box
+        self.counts = counts if counts is not None else np.full(len(verts), verts.shape[1], dtype=np.int64)
+        self.envelopes = envelopes(verts)
+        self.top = top_vertices(verts) if len(verts) else np.zeros((0, 2), dtype=np.float64)
+        self._area = None
+        self._centroids = None
+        self._orientations = None
+
+    @classmethod
+    def from_objects(cls, objects):
+        verts, counts = vertices_from_objects(objects)
+        is_box = np.array([obj['type'] == 'box' for obj in objects], dtype=bool)
+        return cls(verts, is_box, counts)
+
+    @classmethod
+    def from_columns(cls, columns):
+        verts = vertices_from_columns(columns)
+        return cls(verts, np.full(len(verts), columns['type'] == 'box'))
+
+    def __len__(self):
+        return len(self.verts)
+
+    def take(self, indices):
+        """取出部分目标的几何量 (与 [objects[i] for i in indices] 对应)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        sub = ObjectGeometry.__new__(ObjectGeometry)
+        sub.verts = self.verts[indices]
+        sub.is_box = self.is_box[indices]
+        sub.counts = self.counts[indices]
+        sub.envelopes = self.envelopes[indices]
+        sub.top = self.top[indices]
+        sub._area = None if self._area is None else self._area[indices]
+        sub._centroids = None if self._centroids is None else self._centroids[indices]
+        sub._orientations = None if self._orientations is None else self._orientations[indices]
+        return sub
+
+    @property
+    def area(self):
+        if self._area is None:
+            self._area = polygon_area(self.verts)
+        return self._area
+
+    @property
+    def centroids(self):
+        if self._centroids is None:
+            self._centroids = centroids(self.verts)
+        return self._centroids
+
+    @property
+    def orientations(self):
+        if self._orientations is None:
+            self._orientations = orientations(self.verts)
+        return self._orientations
+
+    def outlines(self, hbb):
+        """
+        绘制用的顶点数组：多边形在 HBB 模式下替换为外接矩形的四个角点
+        :param hbb: 是否把多边形画成外接矩形
+        """
+        if not hbb or self.is_box.all():
+            return self.verts
+        out = self.verts.copy()
+        poly = ~self.is_box
+        corners = box_vertices(self.envelopes[poly])
+        out[poly, :4] = corners
+        out[poly, 4:] = corners[:, 3:4]
+        return out
+
+    def label_anchors(self, hbb):
+        """
+        类别文字锚点 N×2 (文字写在锚点上方)：矩形与 HBB 模式取左上角 (矩形为标注中的 x1, y1)，
+        OBB 模式取最高的顶点
+        """
+        anchors = self.top.copy()
+        corner = self.is_box | hbb
+        anchors[corner] = self.envelopes[corner, :2]
+        anchors[self.is_box] = self.verts[self.is_box, 0]
+        return anchors
+
+    def hit_test(self, x, y, candidates=None, hbb=False):
+        """
+        点选命中测试
+        :param candidates: 候选目标下标 (通常来自 spatial_index 的外接矩形查询)，None 表示全部
+        :param hbb: 多边形是否按外接矩形判断 (DOTA 的 HBB 显示模式)
+        :return: 命中的目标下标
+        """
+        if candidates is None:
+            candidates = np.arange(len(self))
+        candidates = np.asarray(candidates, dtype=np.int64)
+        if len(candidates) == 0:
+            return candidates
+        inside = points_in_boxes(self.envelopes[candidates], x, y)
+        exact = inside & ~(self.is_box[candidates] | hbb)
+        if exact.any():
+            inside[exact] = points_in_polygons(self.verts[candidates[exact]], x, y)
+        return candidates[inside]
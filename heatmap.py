@@ -0,0 +1,267 @@
+# heatmap.py
+"""
+密度图 (热力图) 渲染：把目标累加到显示分辨率的网格上，再经色表映射后半透明叠加到图片上。
+目标密集时 (AI-TOD / VisDrone) 代替逐个画框，图片不会被框线遮住。
+
+- 累加全部向量化：中心点模式用 np.bincount，面积模式用二维差分数组 + 累加和 (每个目标只写 4 个角)，
+  耗时与目标数量呈线性且常数很小；着色与混合只与网格大小有关
+- 可以按类别分别累加 (C×gh×gw)
+- 同一套引擎也用于整个数据集的分布图：每张图片的坐标按图片尺寸归一化后累加到同一个网格上
+
+整个数据集的分布图:
+    python heatmap.py --labels VisDrone/annotations --images VisDrone/images --dataset VisDrone2019 --output heat.png
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import geometry
+import image_source
+import parsers
+from batch_render import iter_bounded
+from stats import FILES_PER_TASK, _batched, find_image, iter_label_files
+
+CELL_PX = 8  # 画布上网格的边长 (像素)
+ALPHA = 0.6  # 最大不透明度
+MODES = ('center', 'area')
+# 色表锚点 (位置, RGB)，近似 inferno：低密度偏暗紫，高密度偏亮黄
+COLORMAP_STOPS = [(0.0, (0, 0, 4)), (0.25, (87, 16, 110)), (0.5, (188, 55, 84)),
+                  (0.75, (249, 142, 9)), (1.0, (252, 255, 164))]
+
+
+# ================= 累加 =================
+def bin_points(xs, ys, shape, weights=None, class_ids=None, n_classes=1):
+    """
+    点累加到网格 (坐标单位为网格)
+    :param shape: (gh, gw)
+    :param class_ids: 给出时按类别分别累加，返回 n_classes×gh×gw；否则返回 gh×gw
+    """
+    gh, gw = shape
+    gx = np.floor(np.asarray(xs, dtype=np.float64)).astype(np.int64)
+    gy = np.floor(np.asarray(ys, dtype=np.float64)).astype(np.int64)
+    ok = (gx >= 0) & (gx < gw) & (gy >= 0) & (gy < gh)
+    flat = gy[ok] * gw + gx[ok]
+    layers = 1
+    if class_ids is not None:
+        flat = flat + np.asarray(class_ids, dtype=np.int64)[ok] * (gh * gw)
+        layers = n_classes
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)[ok]
+    grid = np.bincount(flat, weights=w, minlength=layers * gh * gw).astype(np.float64)
+    return grid.reshape(layers, gh, gw) if class_ids is not None else grid.reshape(gh, gw)
+
+
+def splat_boxes(boxes, shape, class_ids=None, n_classes=1):
+    """
+    矩形覆盖累加 (坐标单位为网格)：每个网格的值为覆盖它的目标数量
+    差分数组上每个目标只在 4 个角加减一次，最后沿两个方向做累加和
+    """
+    gh, gw = shape
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x0 = np.clip(np.floor(b[:, 0]), 0, gw).astype(np.int64)
+    y0 = np.clip(np.floor(b[:, 1]), 0, gh).astype(np.int64)
+    x1 = np.clip(np.floor(b[:, 2]) + 1, 0, gw).astype(np.int64)
+    y1 = np.clip(np.floor(b[:, 3]) + 1, 0, gh).astype(np.int64)
+    ok = (x1 > x0) & (y1 > y0)
+    x0, y0, x1, y1 = x0[ok], y0[ok], x1[ok], y1[ok]
+    layers = n_classes if class_ids is not None else 1
+    layer = np.asarray(class_ids, dtype=np.int64)[ok] if class_ids is not None else np.zeros(len(x0), np.int64)
+
+    size = layers * (gh + 1) * (gw + 1)
+    base = layer * ((gh + 1) * (gw + 1))
+    diff = (np.bincount(base + y0 * (gw + 1) + x0, minlength=size)
+            - np.bincount(base + y0 * (gw + 1) + x1, minlength=size)
+            - np.bincount(base + y1 * (gw + 1) + x0, minlength=size)
+            + np.bincount(base + y1 * (gw + 1) + x1, minlength=size))
+    grid = diff.reshape(layers, gh + 1, gw + 1).cumsum(axis=1).cumsum(axis=2)[:, :gh, :gw].astype(np.float64)
+    return grid if class_ids is not None else grid[0]
+
+
+def accumulate(boxes, shape, mode='center', scale=(1.0, 1.0), offset=(0.0, 0.0), class_ids=None, n_classes=1):
+    """
+    外接矩形 (原图坐标) 变换到网格坐标后累加
+    :param boxes: N×4 [x_min, y_min, x_max, y_max]
+    :param scale, offset: 网格坐标 = 原图坐标 * scale + offset
+    :param mode: 'center' 按中心点计数，'area' 按覆盖面积计数
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的密度图模式: {mode}")
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    sx, sy = scale
+    ox, oy = offset
+    g = b * (sx, sy, sx, sy) + (ox, oy, ox, oy)
+    if mode == 'area':
+        return splat_boxes(g, shape, class_ids, n_classes)
+    return bin_points((g[:, 0] + g[:, 2]) * 0.5, (g[:, 1] + g[:, 3]) * 0.5, shape,
+                      class_ids=class_ids, n_classes=n_classes)
+
+
+# ================= 着色 =================
+def colormap_lut(stops=None):
+    """256×3 uint8 色表，锚点之间线性插值"""
+    stops = stops or COLORMAP_STOPS
+    pos = np.array([p for p, _ in stops])
+    rgb = np.array([c for _, c in stops], dtype=np.float64)
+    t = np.linspace(0.0, 1.0, 256)
+    return np.stack([np.interp(t, pos, rgb[:, k]) for k in range(3)], axis=1).astype(np.uint8)
+
+
+LUT = colormap_lut()
+
+
+def normalize(grid, log=True, vmax=None):
+    """网格值映射到 [0, 1]；默认按对数缩放，少量极密的网格不会让其余部分看不见"""
+    grid = np.asarray(grid, dtype=np.float64)
+    vmax = float(grid.max()) if vmax is None else float(vmax)
+    if vmax <= 0:
+        return np.zeros_like(grid)
+    if log:
+        return np.log1p(np.clip(grid, 0, None)) / np.log1p(vmax)
+    return np.clip(grid / vmax, 0.0, 1.0)
+
+
+def colorize(grid, log=True, alpha=ALPHA, lut=LUT):
+    """
+    网格 -> RGBA 图片 (每个网格一个像素)
+    没有目标的网格完全透明，其余不透明度随密度从 alpha/3 增长到 alpha
+    """
+    level = normalize(grid, log)
+    rgba = np.empty(level.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = lut[np.rint(level * 255).astype(np.int64)]
+    rgba[..., 3] = np.where(grid > 0, np.rint(255 * alpha * (1 + 2 * level) / 3), 0).astype(np.uint8)
+    return Image.fromarray(rgba, 'RGBA')
+
+
+def blend(img, grid, cell=CELL_PX, log=True, alpha=ALPHA, smooth=False):
+    """
+    把画布网格着色后叠加到 img 上 (原地修改)
+    :param smooth: 放大时使用双线性插值而不是块状的最近邻
+    """
+    heat = colorize(grid, log, alpha)
+    resample = Image.Resampling.BILINEAR if smooth else Image.Resampling.NEAREST
+    heat = heat.resize((heat.size[0] * cell, heat.size[1] * cell), resample).crop((0, 0) + img.size)
+    if img.mode == 'RGBA':
+        img.alpha_composite(heat)
+    else:
+        img.paste(heat.convert('RGB'), (0, 0), heat.getchannel('A'))
+    return img
+
+
+def draw_view(img, boxes, transform, visible=None, mode='center', cell=CELL_PX, log=True, alpha=ALPHA):
+    """
+    视口密度图：以 cell 像素的网格累加可见目标并叠加到视口图片上
+    :param boxes: N×4 外接矩形 (原图坐标)，通常为 objects.geometry.envelopes
+    :param transform: (ratio, offset_x, offset_y)
+    :return: (img, 网格)
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if visible is not None:
+        boxes = boxes[np.asarray(visible, dtype=bool)]
+    w, h = img.size
+    shape = ((h + cell - 1) // cell, (w + cell - 1) // cell)
+    ratio, off_x, off_y = transform
+    grid = accumulate(boxes, shape, mode, scale=(ratio / cell, ratio / cell), offset=(off_x / cell, off_y / cell))
+    if grid.any():
+        blend(img, grid, cell, log, alpha)
+    return img, grid
+
+
+# ================= 数据集分布图 =================
+def _heatmap_batch(task):
+    """工作进程：一批标注文件累加到归一化网格，返回 (类别名 -> 网格, 图片数, 跳过的文件数)"""
+    label_paths, image_dir, dataset_type, shape, mode = task
+    gh, gw = shape
+    grids = {}
+    n_images = n_skipped = 0
+    for label_path in label_paths:
+        img_path = find_image(image_dir, os.path.splitext(os.path.basename(label_path))[0])
+        try:
+            # 坐标需要按图片尺寸归一化，找不到图片的标注跳过
+            size = image_source.image_size(img_path) if img_path else None
+            if size is None:
+                n_skipped += 1
+                continue
+            columns = parsers.parse_label_columns(label_path, dataset_type, size, os.path.basename(img_path))
+        except Exception:
+            n_skipped += 1
+            continue
+        n_images += 1
+        if not len(columns['coords']):
+            continue
+        boxes = geometry.envelopes(geometry.vertices_from_columns(columns))
+        per_class = accumulate(boxes, shape, mode, scale=(gw / size[0], gh / size[1]),
+                               class_ids=columns['class_ids'], n_classes=len(columns['class_names']))
+        for cid, name in enumerate(columns['class_names']):
+            if name in grids:
+                grids[name] += per_class[cid]
+            else:
+                grids[name] = per_class[cid]
+    return grids, n_images, n_skipped
+
+
+def dataset_heatmap(label_dir, dataset_type, image_dir, shape=(256, 256), mode='center', workers=None,
+                    progress=None):
+    """
+    整个数据集的目标位置分布 (按图片尺寸归一化)
+    :return: ({类别名: gh×gw 网格}, 图片数, 跳过的文件数)
+    """
+    workers = workers or os.cpu_count() or 1
+    total, n_images, n_skipped = {}, 0, 0
+    tasks = ((batch, image_dir, dataset_type, shape, mode)
+             for batch in _batched(iter_label_files(label_dir, dataset_type), FILES_PER_TASK))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for grids, images, skipped in iter_bounded(pool, _heatmap_batch, tasks, workers * 2):
+            for name, grid in grids.items():
+                if name in total:
+                    total[name] += grid
+                else:
+                    total[name] = grid
+            n_images += images
+            n_skipped += skipped
+            if progress:
+                progress(n_images + n_skipped)
+    return total, n_images, n_skipped
+
+
+def render_grid(grid, size=None, log=True):
+    """数据集分布图输出为不透明的 RGB 图片 (没有目标的位置为色表最低端)"""
+    level = normalize(grid, log)
+    img = Image.fromarray(LUT[np.rint(level * 255).astype(np.int64)], 'RGB')
+    return img.resize(size, Image.Resampling.BILINEAR) if size else img
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="数据集目标位置分布图")
+    p.add_argument('--labels', required=True, help="标注目录")
+    p.add_argument('--images', required=True, help="图片目录 (用于按图片尺寸归一化坐标)")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--output', required=True, help="输出图片路径 (例如 heat.png)")
+    p.add_argument('--grid', type=int, default=256, help="网格边长 (归一化后的分辨率)")
+    p.add_argument('--mode', default='center', choices=MODES, help="按中心点或覆盖面积累加")
+    p.add_argument('--size', type=int, default=512, help="输出图片边长")
+    p.add_argument('--linear', action='store_true', help="线性着色 (默认对数)")
+    p.add_argument('--per-class', action='store_true', help="每个类别另外输出一张 (文件名加类别后缀)")
+    p.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    args = p.parse_args(argv)
+
+    shape = (args.grid, args.grid)
+    grids, n_images, n_skipped = dataset_heatmap(args.labels, args.dataset, args.images, shape, args.mode,
+                                                 args.workers)
+    total = sum(grids.values()) if grids else np.zeros(shape)
+    out_size = (args.size, args.size)
+    render_grid(total, out_size, not args.linear).save(args.output)
+    if args.per_class:
+        stem, ext = os.path.splitext(args.output)
+        for name, grid in grids.items():
+            safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+            render_grid(grid, out_size, not args.linear).save(f"{stem}_{safe}{ext}")
+    print(f"图片 {n_images} 张，跳过 {n_skipped} 个标注文件 -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+# image_source.py
+"""
+图像数据源：按窗口读取原图任意区域的任意降采样层级，避免把整张大图解码进内存。
+
+- 未压缩的条带/分块 TIFF：只读取与窗口相交的行或图块，按图块描述以 Image.frombytes 解码，
+  文件内带有降采样层 (overview，例如 GDAL 生成的金字塔) 时直接读取对应层
+- JPEG：降采样层级使用 draft 模式，直接以 1/2、1/4、1/8 分辨率解码
+- 其它格式 (PNG、压缩 TIFF 等)：第一次需要时完整解码一次并保留，之后按窗口读取
+
+层级约定与 tiles.ImagePyramid 相同：level k 为原图的 1/2^k，尺寸向上取整。
+
+遥感影像常有数亿像素，超过 PIL 的解压炸弹阈值；本模块只在自己打开、解码与裁剪图片期间取消该阈值 (见 _no_pixel_limit)。
+"""
+import contextlib
+import threading
+
+from PIL import Image, TiffImagePlugin
+
+DISPLAY_MODES = ('RGB', 'RGBA', 'L')
+BAND_PIXELS = 1 << 22  # 从精细层级降采样大窗口时按条带读取，每条约 4M 像素
+MAX_DRAFT_LEVEL = 3  # JPEG 的 DCT 缩放最多支持 1/8
+
+
+_limit_lock = threading.Lock()
+_limit_users = 0
+_saved_limit = None
+
+
+@contextlib.contextmanager
+def _no_pixel_limit():
+    """
+    在 with 块内取消 Image.MAX_IMAGE_PIXELS 的限制，退出后恢复原值
+    PIL 只提供全局阈值，这里按引用计数管理：多个线程同时读取时不互相阻塞，最后一个退出时恢复
+    (期间进程中其它线程的 Image.open 同样不受限制)
+    """
+    global _limit_users, _saved_limit
+    with _limit_lock:
+        if _limit_users == 0:
+            _saved_limit = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+        _limit_users += 1
+    try:
+        yield
+    finally:
+        with _limit_lock:
+            _limit_users -= 1
+            if _limit_users == 0:
+                Image.MAX_IMAGE_PIXELS = _saved_limit
+
+
+def level_size(size, level):
+    """level 层的尺寸 (与连续 reduce(2) 的结果一致)"""
+    w, h = size
+    f = 1 << level
+    return (w + f - 1) // f, (h + f - 1) // f
+
+
+def display_mode(mode, bands):
+    if mode in DISPLAY_MODES:
+        return mode
+    return 'RGBA' if 'A' in bands else 'RGB'
+
+
+def image_size(path):
+    """只读取文件头获取图片尺寸，不解码像素"""
+    with _no_pixel_limit(), Image.open(path) as im:
+        return im.size
+
+
+def decode(path, mode, page=0, draft_size=None):
+    """
+    完整解码一页并转换为显示模式
+    通过文件对象打开：文件关闭后像素数据仍然有效 (with Image.open 退出时会连同像素一起释放)
+    """
+    with _no_pixel_limit(), open(path, 'rb') as f:
+        im = Image.open(f)
+        if page:
+            im.seek(page)
+        if draft_size:
+            im.draft(im.mode, draft_size)
+        im.load()
+    return im if im.mode == mode else im.convert(mode)
+
+
+def _bits_per_pixel(im):
+    bps = im.tag_v2.get(TiffImagePlugin.BITSPERSAMPLE, (1,))
+    if isinstance(bps, int):
+        bps = (bps,)
+    spp = im.tag_v2.get(TiffImagePlugin.SAMPLESPERPIXEL, len(bps))
+    return sum(bps) if len(bps) == spp else bps[0] * spp
+
+
+def _decode_piece(f, mode, piece):
+    """
+    解码一个窗口片段 (codec, extents, chunks, args)：依次读取 chunks 中的 (偏移, 字节数) 拼接后交给 PIL 的解码器，
+    args 与 PIL 图块描述中的解码参数相同
+    """
+    codec, (x0, y0, x1, y1), chunks, args = piece
+    data = bytearray()
+    for offset, n in chunks:
+        f.seek(offset)
+        data += f.read(n)
+    return Image.frombytes(mode, (x1 - x0, y1 - y0), bytes(data), codec, *args)
+
+
+class ImageSource:
+    """
+    数据源基类
+    子类提供 native_levels (可以直接读取的层级，至少包含 0)，并实现 _decoded 或 _read 之一
+    """
+
+    def __init__(self, size, mode):
+        self.size = size
+        self.mode = mode  # 显示模式，read_region 返回的图片均为该模式
+        self.native_levels = [0]
+        self._lock = threading.Lock()
+
+    def _convert(self, image):
+        return image if image.mode == self.mode else image.convert(self.mode)
+
+    def _decoded(self, level):
+        """已完整解码在内存中的 level 层图片 (显示模式)，不支持时返回 None"""
+        return None
+
+    def _read(self, level, box):
+        """从文件中读取 level 层上的矩形区域"""
+        raise NotImplementedError
+
+    def _read_banded(self, level, box, factor):
+        """按条带读取 level 层上的大窗口并缩小 factor 倍，峰值内存只有一个条带"""
+        x0, y0, x1, y1 = box
+        rows = max(factor, BAND_PIXELS // max(1, x1 - x0) // factor * factor)
+        out = Image.new(self.mode, ((x1 - x0 + factor - 1) // factor, (y1 - y0 + factor - 1) // factor))
+        for y in range(y0, y1, rows):
+            band = self._convert(self._read(level, (x0, y, x1, min(y + rows, y1))))
+            out.paste(band.reduce(factor), (0, (y - y0) // factor))
+        return out
+
+    def read_region(self, level, box):
+        """
+        读取 level 层上的矩形区域
+        :param box: level 层上的整数像素坐标 (x0, y0, x1, y1)，已裁剪到该层范围内
+        :return: 显示模式的 PIL 图片
+        """
+        base = max(lv for lv in self.native_levels if lv <= level)
+        factor = 1 << (level - base)
+        bw, bh = level_size(self.size, base)
+        src_box = (box[0] * factor, box[1] * factor, min(box[2] * factor, bw), min(box[3] * factor, bh))
+
+        image = self._decoded(base)
+        if image is not None:
+            if factor == 1:
+                with _no_pixel_limit():
+                    return image.crop(src_box)
+            return image.reduce(factor, box=src_box)
+        if factor == 1:
+            return self._convert(self._read(base, src_box))
+        return self._read_banded(base, src_box, factor)
+
+    def load(self):
+        """完整解码原图 (显示模式)，返回新的图片，调用方可以直接在上面绘制"""
+        image = self._decoded(0)
+        if image is not None:
+            return image.copy()
+        return self._convert(self._read(0, (0, 0) + tuple(self.size)))
+
+    def close(self):
+        """释放已解码的数据；之后再次读取时会重新解码"""
+
+    def decoded_bytes(self):
+        """当前保留在内存中的已解码数据大小 (字节，按每个波段 1 字节估算)"""
+        return 0
+
+
+def _image_bytes(image):
+    return 0 if image is None else image.width * image.height * len(image.getbands())
+
+
+class MemorySource(ImageSource):
+    """已在内存中的 PIL 图片"""
+
+    def __init__(self, pil_image):
+        bands = pil_image.getbands()
+        super().__init__(pil_image.size, display_mode(pil_image.mode, bands))
+        self._image = pil_image if pil_image.mode == self.mode else pil_image.convert(self.mode)
+
+    def _decoded(self, level):
+        return self._image if level == 0 else None
+
+    def decoded_bytes(self):
+        return _image_bytes(self._image)
+
+
+class DecodedSource(ImageSource):
+    """不支持窗口读取的格式：第一次读取时完整解码一次"""
+
+    def __init__(self, path):
+        self.path = path
+        with _no_pixel_limit(), Image.open(path) as im:
+            super().__init__(im.size, display_mode(im.mode, im.getbands()))
+        self._image = None
+
+    def _decoded(self, level):
+        if level != 0:
+            return None
+        with self._lock:
+            if self._image is None:
+                self._image = decode(self.path, self.mode)
+            return self._image
+
+    def load(self):
+        return decode(self.path, self.mode)
+
+    def close(self):
+        with self._lock:
+            self._image = None
+
+    def decoded_bytes(self):
+        return _image_bytes(self._image)
+
+
+class JpegSource(DecodedSource):
+    """JPEG：1/2 ~ 1/8 层级使用 draft 模式以缩小的分辨率直接解码，原分辨率按需完整解码"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.native_levels = list(range(MAX_DRAFT_LEVEL + 1))
+        self._drafts = {}
+
+    def _decoded(self, level):
+        if level == 0:
+            return super()._decoded(0)
+        with self._lock:
+            image = self._drafts.get(level)
+            if image is None:
+                target = level_size(self.size, level)
+                image = decode(self.path, self.mode, draft_size=target)
+                # DCT 缩放的结果尺寸按向上取整计算，与层级尺寸一致；个别编码器不一致时补齐
+                if image.size != target:
+                    image = image.resize(target, Image.Resampling.BILINEAR)
+                self._drafts[level] = image
+            return image
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._drafts.clear()
+
+    def decoded_bytes(self):
+        return super().decoded_bytes() + sum(map(_image_bytes, list(self._drafts.values())))
+
+
+class TiffSource(DecodedSource):
+    """
+    TIFF：未压缩的条带/分块数据按窗口读取，只读取与窗口相交的部分；
+    压缩数据 (由 libtiff 整页解码) 退化为按需完整解码该页
+    文件中尺寸恰好为 1/2^k 的后续页面被视为降采样层
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._pages = {0: 0}  # level -> 页面序号
+        self._windowed = {}  # level -> 是否支持窗口读取
+        self._page_images = {}
+        with _no_pixel_limit(), Image.open(path) as im:
+            self._windowed[0] = self._is_windowed(im)
+            for page in range(1, getattr(im, 'n_frames', 1)):
+                im.seek(page)
+                for lv in range(1, 32):
+                    lsize = level_size(self.size, lv)
+                    if im.size == lsize and lv not in self._pages:
+                        self._pages[lv] = page
+                        self._windowed[lv] = self._is_windowed(im)
+                    if max(lsize) <= 1:
+                        break
+        self.native_levels = sorted(self._pages)
+
+    @staticmethod
+    def _is_windowed(im):
+        return (bool(im.tile) and all(t[0] == 'raw' for t in im.tile)
+                and im.tag_v2.get(TiffImagePlugin.PLANAR_CONFIGURATION, 1) == 1)
+
+    def _decoded(self, level):
+        if self._windowed[level]:
+            return None
+        with self._lock:
+            image = self._page_images.get(level)
+            if image is None:
+                image = decode(self.path, self.mode, page=self._pages[level])
+                self._page_images[level] = image
+            return image
+
+    def _read(self, level, box):
+        """只读取并解码与窗口相交的图块或行，拼接到窗口大小的图片上"""
+        x0, y0, x1, y1 = box
+        with _no_pixel_limit(), Image.open(self.path) as im:
+            im.seek(self._pages[level])
+            mode = im.mode
+            # 不能用 getpalette：它会完整解码整页
+            palette = im.palette if mode == 'P' else None
+            if TiffImagePlugin.TILEOFFSETS in im.tag_v2:
+                pieces = self._tile_window(im, box)
+            else:
+                pieces = self._strip_window(im, box)
+        with open(self.path, 'rb') as f:
+            if len(pieces) == 1 and tuple(pieces[0][1]) == tuple(box):
+                out = _decode_piece(f, mode, pieces[0])
+            else:
+                out = Image.new(mode, (x1 - x0, y1 - y0))
+                for piece in pieces:
+                    out.paste(_decode_piece(f, mode, piece), (piece[1][0] - x0, piece[1][1] - y0))
+        if palette is not None:
+            out.putpalette(palette.palette, palette.rawmode or palette.mode)
+        return out
+
+    @staticmethod
+    def _tile_window(im, box):
+        """与窗口相交的图块；图块数据按行存放，行距为 args 中的 stride (为 0 时等于图块宽度)"""
+        x0, y0, x1, y1 = box
+        bits = _bits_per_pixel(im)
+        pieces = []
+        for codec, (tx0, ty0, tx1, ty1), offset, args in im.tile:
+            if tx0 < x1 and tx1 > x0 and ty0 < y1 and ty1 > y0:
+                packed = ((tx1 - tx0) * bits + 7) // 8
+                stride = args[1] or packed
+                pieces.append((codec, (tx0, ty0, tx1, ty1), [(offset, stride * (ty1 - ty0 - 1) + packed)], args))
+        return pieces
+
+    @staticmethod
+    def _strip_window(im, box):
+        """
+        未压缩条带按行切分：只取 y0 ~ y1 行，文件中连续的行合并为一次读取；
+        窗口明显窄于图片时改为逐行只读取 x0 ~ x1 列，拼接成一个窗口宽度的片段
+        """
+        x0, y0, x1, y1 = box
+        width = im.size[0]
+        bits = _bits_per_pixel(im)
+        row_bytes = (width * bits + 7) // 8
+        by_columns = bits % 8 == 0 and (x1 - x0) * 2 < width
+
+        pieces = []
+        for codec, (_, sy0, _, sy1), offset, args in sorted(im.tile, key=lambda t: t[1][1]):
+            a, b = max(y0, sy0), min(y1, sy1)
+            if a >= b:
+                continue
+            start = offset + (a - sy0) * row_bytes
+            if by_columns:
+                col, n = x0 * bits // 8, (x1 - x0) * bits // 8
+                chunks = [(start + (y - a) * row_bytes + col, n) for y in range(a, b)]
+                pieces.append((codec, (x0, a, x1, b), chunks, (args[0], 0) + tuple(args[2:])))
+                continue
+            if pieces:
+                last_codec, (_, ly0, _, ly1), last_chunks, last_args = pieces[-1]
+                last_offset, last_n = last_chunks[0]
+                if last_offset + last_n == start and last_args == args:
+                    pieces[-1] = (codec, (0, ly0, width, b), [(last_offset, last_n + (b - a) * row_bytes)], args)
+                    continue
+            pieces.append((codec, (0, a, width, b), [(start, (b - a) * row_bytes)], args))
+        return pieces
+
+    def load(self):
+        if not self._windowed[0]:
+            return super().load()
+        return self._convert(self._read(0, (0, 0) + tuple(self.size)))
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._page_images.clear()
+
+    def decoded_bytes(self):
+        return super().decoded_bytes() + sum(map(_image_bytes, list(self._page_images.values())))
+
+
+def open_source(path):
+    """根据文件格式选择数据源 (只读取文件头)"""
+    with _no_pixel_limit(), Image.open(path) as im:
+        fmt = im.format
+    if fmt == 'TIFF':
+        return TiffSource(path)
+    if fmt == 'JPEG':
+        return JpegSource(path)
+    return DecodedSource(path)
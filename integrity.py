@@ -0,0 +1,314 @@
+# integrity.py
+"""
+数据集完整性检查：配对整个图片目录与标注目录，只读取图片文件头获取尺寸 (不解码像素)，
+在进程池中逐个解析标注，报告以下问题：
+
+- orphan_image / orphan_label: 只有图片没有标注 / 只有标注没有图片
+- unreadable_image / unreadable_label: 图片文件头或标注文件无法读取
+- unparsable_line: 解析时被跳过的行 (字段不足、含非数值坐标等)
+- out_of_bounds: 外接矩形超出图片范围 (严格检查，可用 --tolerance 放宽)
+- degenerate: 坐标非法 (inf / nan)、x2 < x1 或 y2 < y1、面积为零或短边小于 --min-side
+- self_intersecting: 自相交的多边形 (顶点顺序错误的 DOTA 四边形)
+
+问题逐条写入 JSON Lines 报告，汇总 (各类问题数量与示例) 写入 JSON。
+
+用法:
+    python integrity.py --images DOTA/images --labels DOTA/labelTxt --dataset DOTA --report issues.jsonl --json summary.json
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import geometry
+import image_source
+import parsers
+from batch_render import IMAGE_EXTS, iter_bounded
+from stats import _batched
+
+FILES_PER_TASK = 64
+UNBOUNDED = (1 << 30, 1 << 30)  # 解析时使用的极大尺寸，使 AI-TOD 的越界过滤不丢弃目标，越界由这里统一检查
+MAX_EXAMPLES = 20  # 汇总中每类问题保留的示例数
+ISSUE_TYPES = ('orphan_image', 'orphan_label', 'unreadable_image', 'unreadable_label', 'unparsable_line',
+               'out_of_bounds', 'degenerate', 'self_intersecting')
+
+
+def _issue(kind, label_path=None, image_path=None, **fields):
+    issue = {'type': kind, 'label': label_path, 'image': image_path}
+    issue.update(fields)
+    return issue
+
+
+def scan_dir(path, exts):
+    """{文件名 (不含扩展名): 路径}；同名不同扩展名的文件只取先遇到的一个"""
+    files = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in exts and stem not in files and entry.is_file():
+                files[stem] = entry.path
+    return files
+
+
+def unparsed_lines(text, kept_lines, is_header=None):
+    """
+    解析时被丢弃的行
+    :param kept_lines: 解析结果的 raw_lines (按文件顺序，是非空行的子序列)
+    :return: [(行号 (从 1 开始), 行内容)]
+    """
+    dropped = []
+    k = 0
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if k < len(kept_lines) and line == kept_lines[k]:
+            k += 1
+            continue
+        if is_header is not None and is_header(line.split(None, 1)[0].lower()):
+            continue
+        dropped.append((lineno, line))
+    return dropped
+
+
+def object_problems(geom, img_size, tolerance=0.0, min_side=1.0):
+    """
+    逐目标检查
+    :param img_size: 图片尺寸，None 时不做越界检查
+    :return: dict {问题类型: (下标数组, 说明列表)}
+    """
+    verts = geom.verts
+    env = geom.envelopes
+    problems = {}
+
+    finite = np.isfinite(verts).all(axis=(1, 2))
+    # 自相交多边形的鞋带面积没有意义，不再参与面积与短边检查
+    crossed = finite & ~geom.is_box & geometry.self_intersecting(verts)
+    inverted = np.zeros(len(geom), dtype=bool)
+    if geom.is_box.any():
+        # 矩形展开后的角点为 (x1,y1) (x2,y1) (x2,y2) (x1,y2)，x2 < x1 或 y2 < y1 时顺序颠倒
+        b = geom.is_box
+        inverted[b] = (verts[b, 2, 0] < verts[b, 0, 0]) | (verts[b, 2, 1] < verts[b, 0, 1])
+    with np.errstate(invalid='ignore'):
+        area = geom.area
+        short_side = np.minimum(env[:, 2] - env[:, 0], env[:, 3] - env[:, 1])
+        if not geom.is_box.all():
+            # 旋转目标按两条邻边的短边计算
+            short_side = np.where(geom.is_box, short_side, geometry.side_lengths(verts)[1])
+        regular = finite & ~inverted & ~crossed
+        zero = regular & (area <= 0)
+        thin = regular & ~zero & (short_side < min_side)
+    reasons = np.full(len(geom), '', dtype=object)
+    reasons[thin] = 'thin'
+    reasons[zero] = 'zero_area'
+    reasons[inverted] = 'inverted'
+    reasons[~finite] = 'non_finite'
+    bad = np.flatnonzero(reasons != '')
+    if len(bad):
+        problems['degenerate'] = (bad, reasons[bad].tolist())
+
+    crossed = np.flatnonzero(crossed)
+    if len(crossed):
+        problems['self_intersecting'] = (crossed, ['bowtie'] * len(crossed))
+
+    if img_size is not None:
+        w, h = img_size
+        with np.errstate(invalid='ignore'):
+            outside = (env[:, 0] < -tolerance) | (env[:, 1] < -tolerance) | \
+                      (env[:, 2] > w + tolerance) | (env[:, 3] > h + tolerance)
+            # 与图片完全没有重叠的目标单独标记
+            disjoint = (env[:, 2] <= 0) | (env[:, 3] <= 0) | (env[:, 0] >= w) | (env[:, 1] >= h)
+        oob = np.flatnonzero(finite & outside)
+        if len(oob):
+            problems['out_of_bounds'] = (oob, np.where(disjoint[oob], 'outside', 'partial').tolist())
+    return problems
+
+
+def check_pair(label_path, image_path, dataset_type, tolerance=0.0, min_side=1.0):
+    """
+    检查一个标注文件 (image_path 为 None 时不做越界检查)
+    :return: (问题列表, 目标数量)
+    """
+    issues = []
+    size = None
+    text = None
+    if image_path:
+        try:
+            size = image_source.image_size(image_path)
+        except Exception as e:
+            issues.append(_issue('unreadable_image', label_path, image_path, detail=str(e)))
+
+    try:
+        fmt = parsers.FORMATS[parsers.resolve_format(label_path, dataset_type)]
+        # 比例坐标的格式只能按真实尺寸换算；没有图片时保持比例 (按 1×1 检查越界，不检查短边)
+        if fmt.normalized:
+            if size is None:
+                min_side = 0.0
+            size = size or (1, 1)
+            parse_size = size
+        else:
+            parse_size = UNBOUNDED
+        image_name = os.path.basename(image_path) if image_path else None
+        columns = parsers.parse_label_columns(label_path, fmt.name, parse_size, image_name)
+        if fmt.read is None:
+            with open(label_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            for lineno, line in unparsed_lines(text, columns['raw_lines'], fmt.is_header):
+                issues.append(_issue('unparsable_line', label_path, image_path, line=lineno, text=line))
+    except Exception as e:
+        issues.append(_issue('unreadable_label', label_path, image_path, detail=str(e)))
+        return issues, 0
+
+    n = len(columns['coords'])
+    if n == 0:
+        return issues, 0
+    geom = geometry.ObjectGeometry.from_columns(columns)
+    # 行号只在逐行文本格式中有意义
+    linenos = {}
+    if text is not None:
+        for lineno, line in enumerate(text.splitlines(), 1):
+            linenos.setdefault(line.strip(), lineno)
+    names = columns['class_names']
+    class_ids = columns['class_ids']
+    for kind, (indices, reasons) in object_problems(geom, size, tolerance, min_side).items():
+        coords = np.round(columns['coords'][indices].astype(np.float64), 3).tolist()
+        for i, cid, reason, c in zip(indices.tolist(), class_ids[indices].tolist(), reasons, coords):
+            issues.append(_issue(kind, label_path, image_path, line=linenos.get(columns['raw_lines'][i]),
+                                 object_id=i + 1, class_name=names[cid], reason=reason, coords=c))
+    return issues, n
+
+
+class IntegrityReport:
+    """可合并的汇总：各类问题数量与示例"""
+
+    def __init__(self):
+        self.n_images = 0
+        self.n_labels = 0
+        self.n_objects = 0
+        self.n_files_with_issues = 0
+        self.counts = Counter()
+        self.examples = {}
+
+    def add_issues(self, issues):
+        for issue in issues:
+            self.counts[issue['type']] += 1
+            examples = self.examples.setdefault(issue['type'], [])
+            if len(examples) < MAX_EXAMPLES:
+                examples.append(issue)
+
+    def merge(self, other):
+        self.n_images += other.n_images
+        self.n_labels += other.n_labels
+        self.n_objects += other.n_objects
+        self.n_files_with_issues += other.n_files_with_issues
+        self.counts.update(other.counts)
+        for kind, examples in other.examples.items():
+            mine = self.examples.setdefault(kind, [])
+            mine.extend(examples[:MAX_EXAMPLES - len(mine)])
+
+    @property
+    def n_issues(self):
+        return sum(self.counts.values())
+
+    def to_dict(self):
+        return {
+            'images': self.n_images,
+            'labels': self.n_labels,
+            'objects': self.n_objects,
+            'files_with_issues': self.n_files_with_issues,
+            'issues': {kind: self.counts.get(kind, 0) for kind in ISSUE_TYPES},
+            'examples': {kind: self.examples[kind] for kind in ISSUE_TYPES if kind in self.examples}
+        }
+
+
+# ================= 并行检查 =================
+def _check_batch(task):
+    pairs, dataset_type, tolerance, min_side = task
+    report = IntegrityReport()
+    issues = []
+    for label_path, image_path in pairs:
+        file_issues, n = check_pair(label_path, image_path, dataset_type, tolerance, min_side)
+        report.n_labels += 1
+        report.n_objects += n
+        if file_issues:
+            report.n_files_with_issues += 1
+            issues.extend(file_issues)
+    report.add_issues(issues)
+    return report, issues
+
+
+def scan_dataset(image_dir, label_dir, dataset_type, tolerance=0.0, min_side=1.0, workers=None,
+                 on_issues=None, progress=None):
+    """
+    :param image_dir: 图片目录，None 时只检查标注 (不做越界与孤立文件检查)
+    :param on_issues: 可选回调 on_issues(问题列表)，按完成顺序逐批调用，报告不在内存中累积
+    :param progress: 可选回调 progress(已检查的标注文件数)
+    :return: IntegrityReport
+    """
+    images = scan_dir(image_dir, IMAGE_EXTS) if image_dir else {}
+    labels = scan_dir(label_dir, parsers.label_extensions(dataset_type))
+    report = IntegrityReport()
+    report.n_images = len(images)
+
+    orphans = []
+    if image_dir:
+        orphans += [_issue('orphan_image', None, path) for stem, path in sorted(images.items()) if stem not in labels]
+        orphans += [_issue('orphan_label', path, None) for stem, path in sorted(labels.items()) if stem not in images]
+    report.add_issues(orphans)
+    if orphans and on_issues:
+        on_issues(orphans)
+
+    workers = workers or os.cpu_count() or 1
+    pairs = ((path, images.get(stem)) for stem, path in labels.items())
+    tasks = ((batch, dataset_type, tolerance, min_side) for batch in _batched(pairs, FILES_PER_TASK))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial, issues in iter_bounded(pool, _check_batch, tasks, workers * 2):
+            report.merge(partial)
+            if issues and on_issues:
+                on_issues(issues)
+            if progress:
+                progress(report.n_labels)
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="数据集完整性检查")
+    p.add_argument('--labels', required=True, help="标注目录")
+    p.add_argument('--images', default=None, help="图片目录 (用于越界与孤立文件检查，可选)")
+    p.add_argument('--dataset', required=True,
+                   choices=[n for n in parsers.format_names(auto=True) if n == parsers.AUTO or
+                            parsers.FORMATS[n].read is None],
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--report', default=None, help="逐条问题的 JSON Lines 输出路径")
+    p.add_argument('--json', default=None, help="汇总 JSON 输出路径")
+    p.add_argument('--tolerance', type=float, default=0.0, help="越界容差 (像素)")
+    p.add_argument('--min-side', type=float, default=1.0, help="短边小于该值 (像素) 的目标视为退化")
+    p.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    args = p.parse_args(argv)
+
+    out = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        def write(issues):
+            out.writelines(json.dumps(issue, ensure_ascii=False) + '\n' for issue in issues)
+
+        report = scan_dataset(args.images, args.labels, args.dataset, args.tolerance, args.min_side,
+                              args.workers, on_issues=write if out else None)
+    finally:
+        if out:
+            out.close()
+
+    summary = report.to_dict()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if report.n_issues == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# label_cache.py
+"""
+解析结果缓存：内存 LRU + 磁盘 .npz 两级缓存。
+缓存键由文件绝对路径、mtime、文件大小、数据集类型与图片尺寸组成 (COCO 等多图片文件另加图片文件名，
+YOLO 另加类别名文件的路径、mtime 与大小)，文件被修改后自动失效。数据集类型为 auto 时先识别出实际格式再生成缓存键。
+磁盘缓存总大小超过 DISK_LIMIT 时按最近使用时间淘汰。
+
+预热整个数据集:
+    python label_cache.py --images DOTA/images --labels DOTA/labelTxt --dataset DOTA
+"""
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import parsers
+from annotations import AnnotationSet
+
+CACHE_VERSION = 1
+CACHE_DIR = os.environ.get('RS_VIEWER_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'rs_viewer', 'labels'))
+MEMORY_ITEMS = 256
+DISK_LIMIT = int(os.environ.get('RS_VIEWER_CACHE_BYTES', 2 << 30))  # 磁盘缓存上限 (字节)
+TRIM_EVERY = 256  # 每写入这么多个缓存文件检查一次磁盘缓存的总大小
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()  # 预取线程与主线程会同时访问
+_writes = 0  # 上次检查磁盘缓存大小之后写入的文件数
+
+
+def cache_key(file_path, dataset_type, img_size, image_name=None):
+    """
+    :param dataset_type: 已识别出的格式名称
+    :param image_name: 图片文件名，只有一个文件包含多张图片的格式 (COCO 等) 才计入缓存键
+    """
+    st = os.stat(file_path)
+    raw = f"{os.path.abspath(file_path)}|{st.st_mtime_ns}|{st.st_size}|{dataset_type}|" \
+          f"{img_size[0]}x{img_size[1]}|v{CACHE_VERSION}"
+    fmt = parsers.FORMATS.get(dataset_type)
+    if image_name is not None and fmt is not None and fmt.read is not None:
+        raw += f"|{image_name}"
+    if fmt is not None and fmt.class_names_file is not None:
+        # 类别名来自单独的文件 (YOLO 的 classes.txt / data.yaml)，文件新增、修改或删除都使缓存失效
+        names_path = fmt.class_names_file(file_path)
+        if names_path is not None:
+            nst = os.stat(names_path)
+            raw += f"|{names_path}|{nst.st_mtime_ns}|{nst.st_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], key + '.npz')
+
+
+def _remember(key, columns):
+    with _memory_lock:
+        _memory[key] = columns
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ITEMS:
+            _memory.popitem(last=False)
+
+
+def save_columns(path, columns):
+    """以未压缩 .npz 保存列式解析结果 (先写临时文件再改名，避免并发读到半个文件)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            type=np.array(columns['type']),
+            coords=columns['coords'],
+            class_ids=columns['class_ids'],
+            class_names=np.array(columns['class_names'], dtype=str),
+            difficulty=columns['difficulty'],
+            score=columns['score'],
+            raw_text=np.array('\n'.join(columns['raw_lines'])),
+            is_bounds_error=np.array(columns['is_bounds_error'])
+        )
+    os.replace(tmp_path, path)
+
+
+def load_columns(path):
+    with np.load(path, allow_pickle=False) as data:
+        raw_text = str(data['raw_text'])
+        return {
+            'type': str(data['type']),
+            'coords': data['coords'],
+            'class_ids': data['class_ids'],
+            'class_names': [str(n) for n in data['class_names']],
+            'difficulty': data['difficulty'],
+            'score': data['score'],
+            'raw_lines': raw_text.split('\n') if raw_text else [],
+            'is_bounds_error': bool(data['is_bounds_error'])
+        }
+
+
+def trim_disk_cache(cache_dir=CACHE_DIR, max_bytes=DISK_LIMIT):
+    """
+    磁盘缓存超过 max_bytes 时按最近使用时间 (mtime，命中时更新) 从旧到新删除，直到低于上限的 90%
+    :return: 删除的文件数
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    files, total = [], 0
+    with os.scandir(cache_dir) as subdirs:
+        for sub in subdirs:
+            if not sub.is_dir():
+                continue
+            with os.scandir(sub.path) as it:
+                for entry in it:
+                    if entry.name.endswith('.npz'):
+                        st = entry.stat()
+                        files.append((st.st_mtime_ns, st.st_size, entry.path))
+                        total += st.st_size
+    if total <= max_bytes:
+        return 0
+    files.sort()
+    target, removed = max_bytes * 0.9, 0
+    for _, size, path in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue  # 其它进程已删除或正在使用
+        total -= size
+        removed += 1
+    return removed
+
+
+def _count_write():
+    """记录一次磁盘写入，每 TRIM_EVERY 次返回 True"""
+    global _writes
+    with _memory_lock:
+        _writes += 1
+        if _writes < TRIM_EVERY:
+            return False
+        _writes = 0
+        return True
+
+
+def load_label_columns(file_path, dataset_type, img_size, cache_dir=CACHE_DIR, image_name=None,
+                       on_cache_error=None):
+    """
+    带缓存的 parsers.parse_label_columns
+    返回的数组在缓存间共享，调用方不应原地修改
+    :param on_cache_error: 写入或清理磁盘缓存失败时调用 on_cache_error(exc)；解析结果照常返回
+    """
+    dataset_type = parsers.resolve_format(file_path, dataset_type)
+    key = cache_key(file_path, dataset_type, img_size, image_name)
+    with _memory_lock:
+        columns = _memory.get(key)
+        if columns is not None:
+            _memory.move_to_end(key)
+            return columns
+
+    path = _cache_path(key, cache_dir) if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            columns = load_columns(path)
+            os.utime(path)  # 记录使用时间，淘汰时按它排序
+        except Exception:
+            columns = None  # 缓存损坏时重新解析并覆盖
+
+    if columns is None:
+        columns = parsers.parse_label_columns(file_path, dataset_type, img_size, image_name)
+        if path:
+            try:
+                save_columns(path, columns)
+                if _count_write():
+                    trim_disk_cache(cache_dir)
+            except OSError as e:
+                if on_cache_error is not None:
+                    on_cache_error(e)
+
+    _remember(key, columns)
+    return columns
+
+
+def load_annotations(file_path, dataset_type, img_size, image_name=None, cache_dir=CACHE_DIR, on_cache_error=None):
+    """
+    带缓存的解析，返回 (annotations.AnnotationSet, is_bounds_error)
+    集合中的数组与缓存共用，勾选状态 visible 为每次新建
+    :param on_cache_error: 见 load_label_columns
+    """
+    columns = load_label_columns(file_path, dataset_type, img_size, cache_dir, image_name, on_cache_error)
+    return AnnotationSet.from_columns(columns), columns['is_bounds_error']
+
+
+def clear_memory():
+    with _memory_lock:
+        _memory.clear()
+
+
+# ================= 批量预热 =================
+def _warm_one(task):
+    image_path, label_path, dataset_type, cache_dir = task
+    from image_source import image_size
+    try:
+        size = image_size(image_path)
+        dataset_type = parsers.resolve_format(label_path, dataset_type)
+        # 与查看器的调用方式一致：总是带上图片文件名
+        image_name = os.path.basename(image_path)
+        key = cache_key(label_path, dataset_type, size, image_name)
+        if not os.path.exists(_cache_path(key, cache_dir)):
+            save_columns(_cache_path(key, cache_dir),
+                         parsers.parse_label_columns(label_path, dataset_type, size, image_name))
+        return label_path, None
+    except Exception as e:
+        return label_path, str(e)
+
+
+def prewarm(pairs, dataset_type, cache_dir=CACHE_DIR, workers=None):
+    """
+    多进程预先解析并写入磁盘缓存，完成后按 DISK_LIMIT 淘汰旧的缓存文件
+    :param pairs: 可迭代的 (image_path, label_path)
+    :return: (成功数量, 失败数量)
+    """
+    from batch_render import iter_bounded
+
+    done, failed = 0, 0
+    tasks = ((img, lbl, dataset_type, cache_dir) for img, lbl in pairs)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for label_path, error in iter_bounded(pool, _warm_one, tasks, workers * 4):
+            if error:
+                failed += 1
+                print(f"[失败] {label_path}: {error}", file=sys.stderr)
+            else:
+                done += 1
+    trim_disk_cache(cache_dir)
+    return done, failed
+
+
+def main(argv=None):
+    from batch_render import iter_pairs
+
+    p = argparse.ArgumentParser(description="预热标注解析缓存")
+    p.add_argument('--images', required=True, help="图片目录")
+    p.add_argument('--labels', required=True, help="标注目录")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--cache-dir', default=CACHE_DIR, help="缓存目录")
+    p.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    args = p.parse_args(argv)
+
+    done, failed = prewarm(iter_pairs(args.images, args.labels, args.dataset), args.dataset, args.cache_dir, args.workers)
+    print(f"已缓存 {done} 个标注文件，失败 {failed} 个")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# lod.py
+"""
+细节层次 (LOD) 视口渲染：按当前显示比例 render_params['ratio'] 决定每个目标的画法，
+使每帧耗时取决于屏幕上能看清的内容，而不是目标总数。
+
+- 视口外的目标通过空间索引直接剔除
+- 显示尺寸小于 DETAIL_MIN_PX 的目标不再画边框：数量不多时画成点标记，很多时合并为密度网格
+- 类别文字只在目标足够大、且不与已放置的文字重叠时绘制；被隐藏的文字不做任何排版
+"""
+import numpy as np
+from PIL import Image
+
+import drawer
+import fonts
+import heatmap
+import profiling
+
+DETAIL_MIN_PX = 4  # 显示尺寸 (外接矩形长边) 小于该值的目标按小目标处理
+POINT_LIMIT = 5000  # 小目标超过该数量时改画密度网格
+POINT_SIZE = 3
+CELL_PX = 8  # 密度网格边长 (屏幕像素)
+MAX_LABELS = 400
+
+
+def viewport_box(transform, canvas_size):
+    """画布可见范围对应的原图矩形"""
+    ratio, off_x, off_y = transform
+    cw, ch = canvas_size
+    return -off_x / ratio, -off_y / ratio, (cw - off_x) / ratio, (ch - off_y) / ratio
+
+
+def plan_view(boxes, transform, canvas_size, visible=None, index=None):
+    """
+    把目标分为需要完整绘制的与需要聚合的两组
+    :param boxes: N×4 外接矩形 (原图坐标)
+    :param index: 可选的 spatial_index.GridIndex (与 boxes 对应)，用于快速剔除视口外目标
+    :return: (detail, tiny) 两个目标序号数组
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    vx0, vy0, vx1, vy1 = viewport_box(transform, canvas_size)
+    if index is not None:
+        cand = index.query_box(vx0, vy0, vx1, vy1)
+    else:
+        inside = (boxes[:, 0] <= vx1) & (boxes[:, 2] >= vx0) & (boxes[:, 1] <= vy1) & (boxes[:, 3] >= vy0)
+        cand = np.flatnonzero(inside)
+    if visible is not None:
+        cand = cand[np.asarray(visible, dtype=bool)[cand]]
+
+    b = boxes[cand]
+    size = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]) * transform[0]
+    small = size < DETAIL_MIN_PX
+    return cand[~small], cand[small]
+
+
+def _centers(boxes, transform):
+    ratio, off_x, off_y = transform
+    xs = (boxes[:, 0] + boxes[:, 2]) * 0.5 * ratio + off_x
+    ys = (boxes[:, 1] + boxes[:, 3]) * 0.5 * ratio + off_y
+    return xs, ys
+
+
+def draw_points(img, xs, ys, color, size=POINT_SIZE):
+    """每个小目标画一个 size×size 的方点，所有点合成一张掩码后一次 paste"""
+    w, h = img.size
+    mask = np.zeros((h, w), dtype=np.uint8)
+    xs = np.rint(xs).astype(np.int64) - size // 2
+    ys = np.rint(ys).astype(np.int64) - size // 2
+    for dy in range(size):
+        for dx in range(size):
+            px, py = xs + dx, ys + dy
+            ok = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+            mask[py[ok], px[ok]] = 255
+    img.paste(color, (0, 0), Image.fromarray(mask, 'L'))
+
+
+def density_grid(xs, ys, canvas_size, cell=CELL_PX):
+    """按屏幕网格统计目标数量，返回 gh×gw 的计数数组"""
+    w, h = canvas_size
+    shape = ((h + cell - 1) // cell, (w + cell - 1) // cell)
+    return heatmap.bin_points(np.asarray(xs) / cell, np.asarray(ys) / cell, shape).astype(np.int64)
+
+
+def draw_density(img, xs, ys, color, cell=CELL_PX):
+    """以半透明网格表示小目标的密度，不透明度随数量对数增长"""
+    counts = density_grid(xs, ys, img.size, cell)
+    if not counts.any():
+        return
+    alpha = np.where(counts > 0, 60 + 180 * np.log1p(counts) / np.log1p(counts.max()), 0)
+    mask = Image.fromarray(alpha.astype(np.uint8), 'L')
+    mask = mask.resize((mask.size[0] * cell, mask.size[1] * cell), Image.Resampling.NEAREST)
+    img.paste(color, (0, 0), mask.crop((0, 0) + img.size))
+
+
+def choose_labels(objects, detail, geom, transform, canvas_size, font_size, dota_mode):
+    """
+    挑选要写类别文字的目标：目标显示尺寸不小于字号，且文字不与先放置的文字重叠
+    按目标从大到小贪心放置，最多 MAX_LABELS 个
+    :param objects: annotations.AnnotationSet
+    :param geom: 与 objects 对应的 geometry.ObjectGeometry
+    :return: 与 detail 等长的布尔数组
+    """
+    chosen = np.zeros(len(detail), dtype=bool)
+    if not len(detail):
+        return chosen
+    b = geom.envelopes[detail]
+    size = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1]) * transform[0]
+    order = np.argsort(-size, kind='stable')
+    order = order[size[order] >= font_size]
+    # 文字左上角 (不含字号偏移) 的屏幕坐标，与 drawer.draw_on_image 的放置规则一致
+    ratio, off_x, off_y = transform
+    anchors = geom.take(detail[order]).label_anchors(dota_mode == 'HBB') * ratio + (off_x, off_y)
+
+    cw, ch = canvas_size
+    cell = max(font_size, 4)
+    occupied = np.zeros((ch // cell + 2, cw // cell + 2), dtype=bool)
+    atlas = fonts.get_atlas(font_size)
+    widths = {}
+    placed = 0
+    class_ids = objects.class_ids[detail[order]].tolist()
+    for k, cid, (ax, ay) in zip(order, class_ids, anchors.tolist()):
+        if cid not in widths:
+            widths[cid] = atlas.width(objects.class_names[cid])
+        x0, y0, x1, y1 = ax, ay - font_size - 2, ax + widths[cid], ay
+        if x1 < 0 or y1 < 0 or x0 >= cw or y0 >= ch:
+            continue
+        cx0, cy0 = max(0, int(x0 // cell)), max(0, int(y0 // cell))
+        cx1, cy1 = min(occupied.shape[1] - 1, int(x1 // cell)), min(occupied.shape[0] - 1, int(y1 // cell))
+        if occupied[cy0:cy1 + 1, cx0:cx1 + 1].any():
+            continue
+        occupied[cy0:cy1 + 1, cx0:cx1 + 1] = True
+        chosen[k] = True
+        placed += 1
+        if placed >= MAX_LABELS:
+            break
+    return chosen
+
+
+def draw_view(img, objects, transform, visible=None, index=None, geometry=None, **options):
+    """
+    以 LOD 方式在视口图片上绘制标注 (参数与 drawer.draw_on_image 相同)
+    :param objects: annotations.AnnotationSet
+    :param visible: 可见掩码，为 None 时使用 objects.visible
+    :param index: spatial_index.GridIndex，为 None 时逐个检查外接矩形
+    :param geometry: 与 objects 对应的 geometry.ObjectGeometry，为 None 时使用 objects.geometry
+    :return: (img, 统计信息 dict)
+    """
+    geom = geometry if geometry is not None else objects.geometry
+    if visible is None:
+        visible = objects.visible
+    boxes = geom.envelopes
+    detail, tiny = plan_view(boxes, transform, img.size, visible, index)
+    color = options.get('color_name', 'red')
+    info = {'detail': len(detail), 'tiny': len(tiny), 'labels': 0, 'density': False}
+    profiling.count('lod_tiny', len(tiny))
+
+    if len(tiny):
+        xs, ys = _centers(boxes[tiny], transform)
+        if len(tiny) > POINT_LIMIT:
+            draw_density(img, xs, ys, color)
+            info['density'] = True
+        else:
+            draw_points(img, xs, ys, color)
+
+    show_labels = options.pop('show_labels', True)
+    font_size = options.pop('font_size', None) or drawer.font_size_for(img.size[0])
+    labeled = np.zeros(len(detail), dtype=bool)
+    if show_labels:
+        labeled = choose_labels(objects, detail, geom, transform, img.size, font_size,
+                                options.get('dota_mode', 'OBB'))
+        info['labels'] = int(labeled.sum())
+
+    for flag in (False, True):
+        subset = detail[labeled == flag]
+        if len(subset):
+            drawer.draw_on_image(img, objects.take(subset), visible=np.ones(len(subset), dtype=bool),
+                                 geometry=geom.take(subset), transform=transform,
+                                 inplace=True, show_labels=flag, font_size=font_size, **options)
+    return img, info
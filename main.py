@@ -1,16 +1,39 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
+import queue
+import threading
+
+import numpy as np
 
 # 导入自定义模块
 import parsers
 import drawer
+import label_cache
+import tiles
+import prefetch
+import image_source
+import stats
+import export
+import spatial_index
+import compare
+import dataset_index
+import profiling
+import render_worker
+from annotations import AnnotationSet
+from object_list import VirtualCheckList
+from overlay import CanvasOverlay
 
 # 配置
 COLORS = ['red', 'limegreen', 'lightblue', 'darkblue', 'orange', 'purple', 'gray', 'yellow']
 LINE_STYLES = {'实线（Solid）': 'solid', '虚线（Loose）': 'dashed_loose', '点线（Dense）': 'dashed_dense'}
-DATASETS = list(parsers.DATASET_PARSERS.keys())
+DATASETS = parsers.format_names(auto=True)
+DATASET_TEXT = {parsers.AUTO: '自动识别'}
+LABEL_FILETYPES = [("Labels", "*.txt;*.json"), ("Text", "*.txt"), ("COCO JSON", "*.json")]
+HEATMAP_MODES = {'关闭': None, '中心点': 'center', '覆盖面积': 'area'}
+ZOOM_STEP = 1.25
+MAX_ZOOM = 32.0
 
 
 class RSImageViewer:
@@ -25,15 +48,43 @@ class RSImageViewer:
         # === 数据状态 ===
         self.current_image_path = None
         self.current_label_path = None
-        self.pil_image_original = None
+        self.source = None
         self.pil_image_display = None
         self.tk_image = None
-        self.objects = []
-
-        # 渲染参数
+        self.objects = AnnotationSet.empty()  # 勾选状态即 self.objects.visible，列表、点选与绘图共用
+        self.pyramid = None
+        self.hit_index = None  # 目标外接矩形的空间索引，随标注解析重建
+        # 对比模式: 检测结果 (预测) 与匹配结果
+        self.pred_objects = None
+        self.compare_result = None
+        self._compare_key = None
+
+        # 渲染参数 (画布坐标 = 原图坐标 * ratio + offset)
         self.render_params = {'ratio': 1.0, 'offset_x': 0, 'offset_y': 0}
+        self.fit_view = True  # True 时视口随画布大小自适应；缩放/平移后为 False
+        self.show_annotations = False
+        self._pan_anchor = None
+        self._base_key = None  # 增量模式下最近一次提交的底图对应的视口，视口不变时不重新缩放底图
+        self._shown_key = None  # 画布上当前底图对应的视口，视口变化时才先显示低画质预览
+        self._scene = None  # 最近一次提交给后台渲染的参数快照
+        self._owns_pyramid = False  # 预取得到的金字塔由预取器释放
+
+        # 数据集目录浏览
+        self.nav_images = []
+        self.nav_label_dir = None
+        self.nav_index = -1
+        self._nav_ctx = {}  # 工作线程只读取这里的普通值，不访问 Tk 变量
+        self.nav_selection = {}  # 检索结果浏览时: 图片路径 -> 需要预先勾选的目标行号
+        self._cache_warned = False  # 标注缓存写入失败只提示一次
 
         self.setup_ui()
+        self.prefetcher = prefetch.Prefetcher(self.root)
+        self.renderer = render_worker.RenderWorker(self.root, self._on_rendered, self._on_render_error)
+        self.root.bind("<Right>", lambda e: self.navigate(1))
+        self.root.bind("<Left>", lambda e: self.navigate(-1))
+        self.root.bind("<Next>", lambda e: self.navigate(1))
+        self.root.bind("<Prior>", lambda e: self.navigate(-1))
+        profiling.PROFILER.on_frame = self._on_profile_frame
 
     def setup_ui(self):
         # ============================================
@@ -48,7 +99,7 @@ class RSImageViewer:
 
         self.dataset_var = tk.StringVar(value=DATASETS[0])
         for ds in DATASETS:
-            ttk.Radiobutton(lbl_group1, text=ds, variable=self.dataset_var, value=ds,
+            ttk.Radiobutton(lbl_group1, text=DATASET_TEXT.get(ds, ds), variable=self.dataset_var, value=ds,
                             command=self.on_dataset_switch).pack(anchor='w', pady=1)
 
         # -- 文件加载 --
@@ -63,6 +114,28 @@ class RSImageViewer:
         self.ent_label_name = ttk.Entry(lbl_group2, state="readonly")
         self.ent_label_name.pack(fill=tk.X)
 
+        ttk.Button(lbl_group2, text="🎯 预测", command=self.load_pred_dialog).pack(fill=tk.X, pady=(10, 2))
+        self.ent_pred_name = ttk.Entry(lbl_group2, state="readonly")
+        self.ent_pred_name.pack(fill=tk.X)
+
+        # -- 数据集目录浏览 (← → 或 PageUp/PageDown 切换) --
+        ttk.Button(lbl_group2, text="📁 目录", command=self.open_dataset_dialog).pack(fill=tk.X, pady=(15, 2))
+        nav_row = ttk.Frame(lbl_group2)
+        nav_row.pack(fill=tk.X)
+        ttk.Button(nav_row, text="◀", width=3, command=lambda: self.navigate(-1)).pack(side=tk.LEFT)
+        ttk.Button(nav_row, text="▶", width=3, command=lambda: self.navigate(1)).pack(side=tk.RIGHT)
+        self.nav_label = ttk.Label(nav_row, text="0 / 0", anchor=tk.CENTER)
+        self.nav_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        # -- 工具 --
+        lbl_group3 = ttk.LabelFrame(self.left_frame, text="工具", padding=10)
+        lbl_group3.pack(fill=tk.X, pady=5)
+        ttk.Button(lbl_group3, text="📊 数据集统计", command=self.show_stats_dialog).pack(fill=tk.X, pady=2)
+        ttk.Button(lbl_group3, text="🧩 导出切片", command=self.export_chips_dialog).pack(fill=tk.X, pady=2)
+        ttk.Button(lbl_group3, text="🔎 数据集检索", command=self.show_query_dialog).pack(fill=tk.X, pady=2)
+        self.btn_trace = ttk.Button(lbl_group3, text="⏱ 记录性能跟踪", command=self.toggle_trace)
+        self.btn_trace.pack(fill=tk.X, pady=2)
+
         # ============================================
         # 2. 右侧栏 (目标列表与绘图选项)
         # ============================================
@@ -95,6 +168,39 @@ class RSImageViewer:
         # 类别显示
         self.show_label_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(opt_group, text="显示类别名", variable=self.show_label_var).pack(anchor='w', pady=2)
+        # 增量渲染: 标注作为画布图元叠加在底图上，勾选单个目标时只增删该目标
+        self.incremental_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opt_group, text="增量渲染", variable=self.incremental_var,
+                        command=self.redraw).pack(anchor='w', pady=2)
+        # 细节层次: 缩小时小目标画成点或密度网格，类别文字只画放得下的
+        self.lod_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(opt_group, text="细节层次 (LOD)", variable=self.lod_var,
+                        command=self.redraw).pack(anchor='w', pady=2)
+        # 密度图: 标注密集时以热力图代替逐个画框 (只统计勾选的目标)
+        row_heat = ttk.Frame(opt_group)
+        row_heat.pack(fill=tk.X, pady=2)
+        ttk.Label(row_heat, text="密度图:").pack(side=tk.LEFT)
+        self.heatmap_var = tk.StringVar(value='关闭')
+        heat_box = ttk.Combobox(row_heat, textvariable=self.heatmap_var, values=list(HEATMAP_MODES.keys()),
+                                state="readonly", width=8)
+        heat_box.pack(side=tk.LEFT, padx=5)
+        heat_box.bind("<<ComboboxSelected>>", lambda e: self.redraw())
+        # 性能 HUD: 在画布左上角显示最近一帧各阶段的耗时与计数
+        self.hud_var = tk.BooleanVar(value=profiling.PROFILER.enabled)
+        ttk.Checkbutton(opt_group, text="性能 HUD", variable=self.hud_var,
+                        command=self.on_hud_toggle).pack(anchor='w', pady=2)
+        # 对比模式: TP / FP 画预测框，FN 画漏检的真值框
+        self.compare_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opt_group, text="对比 (真值/预测)", variable=self.compare_var,
+                        command=self.redraw).pack(anchor='w', pady=2)
+        row4 = ttk.Frame(opt_group)
+        row4.pack(fill=tk.X)
+        ttk.Label(row4, text="置信度≥").pack(side=tk.LEFT)
+        self.score_thr_var = tk.DoubleVar(value=0.0)
+        ttk.Spinbox(row4, from_=0.0, to=1.0, increment=0.05, textvariable=self.score_thr_var, width=6,
+                    command=self.redraw).pack(side=tk.LEFT, padx=5)
+        self.compare_info = ttk.Label(opt_group, text="", justify=tk.LEFT)
+        self.compare_info.pack(anchor='w')
         # DOTA 框型
         self.dota_mode_frame = ttk.Frame(opt_group)
         self.dota_mode_frame.pack(fill=tk.X, pady=5)
@@ -114,25 +220,11 @@ class RSImageViewer:
         ttk.Button(ctrl_frame, text="全选", command=self.select_all, width=5).pack(side=tk.LEFT)
         ttk.Button(ctrl_frame, text="清空", command=self.deselect_all, width=5).pack(side=tk.RIGHT)
 
-        list_container = ttk.Frame(list_group)
-        list_container.pack(fill=tk.BOTH, expand=True, pady=5)
-
-        self.obj_canvas = tk.Canvas(list_container, bg="white", width=160, height=300, highlightthickness=0)
-        scrollbar = ttk.Scrollbar(list_container, orient="vertical", command=self.obj_canvas.yview)
-
-        self.scrollable_frame = ttk.Frame(self.obj_canvas)
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.obj_canvas.configure(scrollregion=self.obj_canvas.bbox("all"))
-        )
-
-        self.obj_canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.obj_canvas.configure(yscrollcommand=scrollbar.set)
+        # 虚拟化列表: 只为可见行创建控件，勾选状态保存在 obj_list.mask (即 self.objects.visible) 中
+        self.obj_list = VirtualCheckList(list_group, on_toggle=self.on_object_toggled)
+        self.obj_list.pack(fill=tk.BOTH, expand=True, pady=5)
 
-        self.obj_canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-
-        self.obj_canvas.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.obj_list.bind_all("<MouseWheel>", self._on_mousewheel)
 
         # ============================================
         # 3. 中间区域
@@ -145,8 +237,15 @@ class RSImageViewer:
 
         self.canvas = tk.Canvas(self.canvas_frame, bg="#333333", highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.overlay = CanvasOverlay(self.canvas)
         # 绑定鼠标左键交互
         self.canvas.bind("<Button-1>", self.on_canvas_click)
+        # 右键拖动平移，双击右键恢复适应窗口；滚轮缩放 (Linux 下为 Button-4/5)
+        self.canvas.bind("<ButtonPress-3>", self.on_pan_start)
+        self.canvas.bind("<B3-Motion>", self.on_pan_move)
+        self.canvas.bind("<Double-Button-3>", lambda e: self.reset_view())
+        self.canvas.bind("<Button-4>", lambda e: self.zoom_at(e.x, e.y, ZOOM_STEP))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom_at(e.x, e.y, 1 / ZOOM_STEP))
 
         self.bottom_bar = ttk.Frame(self.center_frame, padding=10)
         self.bottom_bar.pack(side=tk.BOTTOM, fill=tk.X)
@@ -165,7 +264,7 @@ class RSImageViewer:
     # ================= 逻辑处理 =================
     def on_canvas_click(self, event):
         """处理画布点击事件，实现点选物体"""
-        if not self.objects or not self.pil_image_display:
+        if not self.objects or not self.pil_image_display or self.hit_index is None:
             return
 
         # 1. 获取点击坐标
@@ -179,50 +278,36 @@ class RSImageViewer:
             return
         img_x = (cx - off_x) / ratio
         img_y = (cy - off_y) / ratio
-        # 3. 检测点击位置是否在某个目标内
-        changed = False
-        dota_hbb = (self.dota_style_var.get() == 'HBB' and self.dataset_var.get() == 'DOTA')
-        for obj in self.objects:
-            if self.is_point_in_object(img_x, img_y, obj, dota_hbb):
-                current_val = obj['var'].get()
-                obj['var'].set(not current_val)
-                changed = True
-        if changed:
-            self.show_visualization()
-
-    def is_point_in_object(self, x, y, obj, force_hbb=False):
-        """碰撞检测算法"""
-        corrds = obj['coords']
-        if obj['type'] == 'box' or force_hbb:
-            if obj['type'] == 'box':
-                x1, y1, x2, y2 = corrds
+        # 3. 通过空间索引取出外接矩形包含该点的候选目标，再批量做精确检测
+        dota_hbb = self.dota_style_var.get() == 'HBB'  # 只影响多边形目标
+        visible = self.objects.visible
+        changed = self.objects.geometry.hit_test(img_x, img_y, self.hit_index.query_point(img_x, img_y), dota_hbb)
+        visible[changed] = ~visible[changed]
+        if len(changed):
+            self.obj_list.refresh()
+            if self.incremental_active():
+                for idx in changed:
+                    self.on_object_toggled(int(idx))
             else:
-                xs = corrds[::2]
-                ys = corrds[1::2]
-                x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
-            return x1 <= x <= x2 and y1 <= y <= y2
-        elif obj['type'] == 'poly':
-            poly_points = list(zip(corrds[::2], corrds[1::2]))
-            return self.point_in_polygon(x, y, poly_points)
-
-    def point_in_polygon(self, x, y, polygon):
-        """射线法检测点在多边形内"""
-        n = len(polygon)
-        inside = False
-
-        p1x, p1y = polygon[0]
-        for i in range(n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-
-        return inside
+                self.show_visualization()
+
+    def incremental_active(self):
+        """增量叠加层是否生效 (对比模式下标注总是画进底图)"""
+        return (self.incremental_var.get() and self.show_annotations and not self.comparing()
+                and not self.heatmap_mode())
+
+    def heatmap_mode(self):
+        return HEATMAP_MODES.get(self.heatmap_var.get())
+
+    def on_object_toggled(self, index):
+        """增量模式下只增删该目标的图元"""
+        if self.incremental_active():
+            self.overlay.set_visible(index, bool(self.objects.visible[index]))
+
+    def refresh_overlay(self):
+        if self.incremental_active():
+            self.overlay.sync(self.objects.visible, self.get_draw_options())
+
     # ==========通用功能==========
     def set_entry_text(self, entry, text):
         entry.config(state='normal')
@@ -233,8 +318,45 @@ class RSImageViewer:
     def _on_mousewheel(self, event):
         x, y = self.root.winfo_pointerxy()
         widget = self.root.winfo_containing(x, y)
-        if str(self.obj_canvas) in str(widget) or str(self.scrollable_frame) in str(widget):
-            self.obj_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        if str(self.obj_list) in str(widget):
+            self.obj_list.yview_scroll(int(-1 * (event.delta / 120)), "units")
+        elif widget == self.canvas:
+            factor = ZOOM_STEP if event.delta > 0 else 1 / ZOOM_STEP
+            self.zoom_at(x - self.canvas.winfo_rootx(), y - self.canvas.winfo_rooty(), factor)
+
+    # ==========缩放与平移==========
+    def zoom_at(self, cx, cy, factor):
+        """以画布上的 (cx, cy) 为中心缩放"""
+        if not self.pyramid: return
+        ratio = self.render_params['ratio']
+        fit_ratio = self.compute_fit()['ratio']
+        new_ratio = min(max(ratio * factor, fit_ratio / 2), MAX_ZOOM)
+        if new_ratio == ratio: return
+
+        # 保持鼠标下的原图点不动
+        img_x = (cx - self.render_params['offset_x']) / ratio
+        img_y = (cy - self.render_params['offset_y']) / ratio
+        self.render_params = {'ratio': new_ratio,
+                              'offset_x': cx - img_x * new_ratio,
+                              'offset_y': cy - img_y * new_ratio}
+        self.fit_view = False
+        self.redraw()
+
+    def on_pan_start(self, event):
+        self._pan_anchor = (event.x, event.y)
+
+    def on_pan_move(self, event):
+        if not self.pyramid or not self._pan_anchor: return
+        ax, ay = self._pan_anchor
+        self._pan_anchor = (event.x, event.y)
+        self.render_params['offset_x'] += event.x - ax
+        self.render_params['offset_y'] += event.y - ay
+        self.fit_view = False
+        self.redraw()
+
+    def reset_view(self):
+        self.fit_view = True
+        self.redraw()
 
     def on_dataset_switch(self):
         """核心修改：切换数据集时重新解析，但重置图片显示，不自动绘制"""
@@ -245,12 +367,13 @@ class RSImageViewer:
             self.process_labels()
 
             # 无论解析成功与否，都显示干净的原图，等待用户手动点击“展示”
-            if self.pil_image_original:
-                self.display_image(self.pil_image_original)
+            if self.source:
+                self.display_image()
 
     def update_ui_controls(self):
         ds = self.dataset_var.get()
-        if ds == 'DOTA':
+        # 旋转/水平切换只对多边形格式有效；自动识别时无法预知格式，保持可用
+        if ds == parsers.AUTO or parsers.FORMATS[ds].kind == 'poly':
             for child in self.dota_mode_frame.winfo_children():
                 child.configure(state='normal')
         else:
@@ -264,149 +387,702 @@ class RSImageViewer:
 
     def load_image(self, path):
         try:
-            self.pil_image_original = Image.open(path)
-            self.current_image_path = path
+            source = image_source.open_source(path)
+            pyramid = tiles.ImagePyramid(source)
+            self.set_image(path, source, pyramid, owns_pyramid=True)
+            self.display_image()
+        except Exception as e:
+            messagebox.showerror("错误", f"加载图片失败: {e}")
 
-            self.set_entry_text(self.ent_img_name, os.path.basename(path))
+    def set_image(self, path, source, pyramid, owns_pyramid):
+        self.renderer.cancel()
+        if self.pyramid and self._owns_pyramid:
+            self.pyramid.close()
+        self.source = source
+        self.pyramid = pyramid
+        self._owns_pyramid = owns_pyramid
+        self.current_image_path = path
+        self.fit_view = True
+        self._base_key = None
+        self._shown_key = None
 
-            self.current_label_path = None
-            self.set_entry_text(self.ent_label_name, "未选择")
-            self.clear_objects_ui()
+        self.set_entry_text(self.ent_img_name, os.path.basename(path))
 
-            self.display_image(self.pil_image_original)
-        except Exception as e:
-            messagebox.showerror("错误", f"加载图片失败: {e}")
+        self.current_label_path = None
+        self.set_entry_text(self.ent_label_name, "未选择")
+        self.clear_objects_ui()
+        self.clear_predictions()
+
+    # ==========数据集目录浏览==========
+    def open_dataset_dialog(self):
+        image_dir = filedialog.askdirectory(title="选择图片目录")
+        if not image_dir: return
+        images = prefetch.list_images(image_dir)
+        if not images:
+            messagebox.showwarning("提示", "目录中没有图片！")
+            return
+        label_dir = filedialog.askdirectory(title="选择标注目录 (可取消)") or None
+
+        self.browse(images, label_dir)
+
+    def browse(self, images, label_dir, selection=None, start=0):
+        """
+        按列表逐张浏览图片
+        :param selection: {图片路径: 目标行号数组}，加载该图片时预先勾选这些目标并显示标注
+        """
+        self.nav_images = images
+        self.nav_label_dir = label_dir
+        self.nav_selection = selection or {}
+        self.nav_index = -1
+        # 加载函数绑定本次的列表与标注目录：上一次浏览中仍在运行的预取不会读到新列表
+        self.prefetcher.reset(lambda index: self._load_nav_entry(images, label_dir, index))
+        self.go_to(start)
+
+    def _load_nav_entry(self, images, label_dir, index):
+        """在预取线程中执行，只读取参数与 _nav_ctx 中的普通值"""
+        path = images[index]
+        ctx = self._nav_ctx
+        label_path = prefetch.label_for(path, label_dir, ctx['dataset'])
+        return prefetch.load_entry(path, label_path, ctx['dataset'], ctx['canvas_size'])
+
+    def navigate(self, step):
+        if not self.nav_images: return
+        if isinstance(self.root.focus_get(), (tk.Entry, ttk.Entry, ttk.Spinbox, ttk.Combobox)): return
+        self.go_to(min(max(self.nav_index + step, 0), len(self.nav_images) - 1))
+
+    def go_to(self, index):
+        if index == self.nav_index and self.current_image_path == self.nav_images[index]: return
+        self.nav_index = index
+        self.nav_label.config(text=f"{index + 1} / {len(self.nav_images)}")
+        self._nav_ctx = {'dataset': self.dataset_var.get(), 'canvas_size': self.canvas_size()}
+
+        self.set_entry_text(self.ent_img_name, "加载中...")
+        self.prefetcher.request(index, self._on_nav_loaded)
+        self.prefetcher.prefetch_around(index, len(self.nav_images))
+
+    def _on_nav_loaded(self, result):
+        """在主线程中应用预取结果"""
+        if not self.nav_images or result['image_path'] != self.nav_images[self.nav_index]:
+            return
+        if result['error']:
+            messagebox.showerror("错误", result['error'])
+            return
+
+        self.set_image(result['image_path'], result['source'], result['pyramid'], owns_pyramid=False)
+        if result.get('cache_error'):
+            self._warn_cache_error(result['cache_error'])
+        label_path = result['label_path']
+        if label_path:
+            self.current_label_path = label_path
+            self.set_entry_text(self.ent_label_name, os.path.basename(label_path))
+            if result.get('label_error') and result['dataset'] == self.dataset_var.get():
+                self.clear_objects_ui()
+                messagebox.showerror("解析错误", f"无法使用 {result['dataset']} 格式解析当前文件。\n"
+                                              f"错误详情: {result['label_error']}")
+            elif result['objects'] is not None and result['dataset'] == self.dataset_var.get():
+                with profiling.frame('load'):
+                    self.apply_labels(result['objects'], result['is_bounds_error'])
+            else:
+                self.process_labels()
+        if self.current_image_path in self.nav_selection and self.objects:
+            self.show_visualization()
+        else:
+            self.display_image()
+
+    def _warn_cache_error(self, error):
+        """写入标注缓存失败不影响显示，每次运行只提示一次"""
+        if self._cache_warned:
+            return
+        self._cache_warned = True
+        messagebox.showwarning("提示", f"写入标注缓存失败，之后加载同一文件时需要重新解析。\n错误详情: {error}")
 
     def load_label_dialog(self):
         if not self.current_image_path:
             messagebox.showwarning("提示", "请先加载图片！")
             return
-        path = filedialog.askopenfilename(filetypes=[("Text", "*.txt")])
+        path = filedialog.askopenfilename(filetypes=LABEL_FILETYPES)
         if path:
             self.current_label_path = path
             self.set_entry_text(self.ent_label_name, os.path.basename(path))
             self.process_labels()
 
+    def load_pred_dialog(self):
+        """加载检测结果文件 (按当前选择的格式解析或自动识别，例如带置信度的 VisDrone / YOLO 结果)，进入对比模式"""
+        if not self.source:
+            messagebox.showwarning("提示", "请先加载图片！")
+            return
+        path = filedialog.askopenfilename(filetypes=LABEL_FILETYPES)
+        if not path: return
+        try:
+            columns = label_cache.load_label_columns(path, self.dataset_var.get(), self.source.size,
+                                                     image_name=os.path.basename(self.current_image_path),
+                                                     on_cache_error=self._warn_cache_error)
+        except Exception as e:
+            messagebox.showerror("解析错误", f"无法解析检测结果文件。\n错误详情: {e}")
+            return
+        self.pred_objects = AnnotationSet.from_columns(columns)
+        self._compare_key = None
+        self.set_entry_text(self.ent_pred_name, os.path.basename(path))
+        self.compare_var.set(True)
+        self.show_visualization()
+
+    def clear_predictions(self):
+        self.pred_objects = None
+        self.compare_result = None
+        self._compare_key = None
+        self.set_entry_text(self.ent_pred_name, "未选择")
+        self.compare_info.config(text="")
+
+    def comparing(self):
+        # hit_index 随标注加载建立，可区分 "未加载标注" 与 "标注为空"
+        return self.compare_var.get() and self.pred_objects is not None and self.hit_index is not None
+
+    def update_comparison(self):
+        """真值、预测、置信度阈值或框型变化时重新匹配，结果缓存到下次变化"""
+        try:
+            score_thr = float(self.score_thr_var.get())
+        except (tk.TclError, ValueError):
+            score_thr = 0.0
+        gt, pred = self.objects, self.pred_objects
+        rotated = self.dota_style_var.get() == 'OBB' and not (gt.geometry.is_box.all() and
+                                                               pred.geometry.is_box.all())
+        key = (id(gt), id(pred), score_thr, rotated)
+        if key == self._compare_key:
+            return
+        keep = np.flatnonzero(pred.score >= score_thr)
+        self.compare_result = compare.match(
+            gt.geometry, gt.labels, pred.geometry.take(keep), pred.labels[keep], pred.score[keep], rotated=rotated)
+        self.compare_result['pred_index'] = keep
+        self._compare_key = key
+
+        tp, fp, fn = compare.counts(self.compare_result)
+        precision, recall = compare.precision_recall(tp, fp, fn)
+        fmt = lambda v: '-' if v is None else f"{v:.3f}"
+        self.compare_info.config(text=f"TP {tp}  FP {fp}  FN {fn}\nP {fmt(precision)}  R {fmt(recall)}")
+
     def process_labels(self):
-        if not self.pil_image_original: return
+        if not self.source: return
+        with profiling.frame('load'):
+            self._process_labels()
 
+    def _process_labels(self):
         dataset = self.dataset_var.get()
-        img_size = self.pil_image_original.size
+        img_size = self.source.size
 
         self.clear_objects_ui()
 
         try:
-            objects, is_bounds_error = parsers.parse_label_file(
-                self.current_label_path, dataset, img_size
-            )
-            if is_bounds_error:
-                if not messagebox.askyesno("警告", "部分坐标越界，可能文件不匹配或解析格式错误。\n是否继续加载？"):
-                    self.objects = []
-                    return
-
-            self.objects = objects
-            self.populate_list()
+            with profiling.span('parse'):
+                objects, is_bounds_error = label_cache.load_annotations(
+                    self.current_label_path, dataset, img_size, os.path.basename(self.current_image_path),
+                    on_cache_error=self._warn_cache_error
+                )
+            self.apply_labels(objects, is_bounds_error)
             # 这里不需要 display_image，由调用方(load_label 或 switch)决定
 
         except Exception as e:
             messagebox.showerror("解析错误", f"无法使用 {dataset} 格式解析当前文件。\n错误详情: {e}")
-            self.objects = []
+            self.objects = AnnotationSet.empty()
+
+    def apply_labels(self, objects, is_bounds_error):
+        """
+        :param objects: annotations.AnnotationSet (几何量可能已在预取线程中算好)
+        """
+        self.clear_objects_ui()
+        if is_bounds_error:
+            if not messagebox.askyesno("警告", "部分坐标越界，可能文件不匹配或解析格式错误。\n是否继续加载？"):
+                return
+
+        objects.visible[:] = False  # 加载后默认全部不勾选
+        selected = self.nav_selection.get(self.current_image_path)
+        if selected is not None:
+            objects.visible[selected[selected < len(objects)]] = True
+        self.objects = objects
+        with profiling.span('geometry'):
+            self.overlay.set_objects(objects)
+            # 外接矩形对 OBB/HBB 两种模式通用，切换 DOTA 框型时无需重建
+            self.hit_index = spatial_index.GridIndex(objects.geometry.envelopes)
+        profiling.count('objects_loaded', len(objects))
+        with profiling.span('populate_list'):
+            self.populate_list()
 
     def clear_objects_ui(self):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        self.objects = []
-        self.obj_canvas.yview_moveto(0)
+        self.objects = AnnotationSet.empty()
+        self._compare_key = None
+        self.overlay.set_objects(self.objects)
+        self.hit_index = None
+        self.obj_list.clear()
 
     def populate_list(self):
-        if not self.objects:
-            ttk.Label(self.scrollable_frame, text="无目标").pack()
-            return
-
-        for obj in self.objects:
-            var = tk.BooleanVar(value=False)
-            obj['var'] = var
+        # 行文字按需生成，勾选状态直接使用 self.objects.visible
+        self.obj_list.set_items(self.objects.item_texts(), self.objects.visible)
 
-            cls_name = obj['class_name']
-            if len(cls_name) > 10: cls_name = cls_name[:8] + ".."
-
-            text = f"#{obj['id']} {cls_name}"
-            cb = tk.Checkbutton(self.scrollable_frame, text=text, variable=var, anchor='w', bg="white")
-            cb.pack(fill=tk.X, pady=1, padx=2)
+    def compute_fit(self):
+        """计算让整张图片居中适应画布的渲染参数"""
+        cw, ch = self.canvas_size()
+        iw, ih = self.pyramid.size
+        ratio = min(cw / iw, ch / ih)
+        return {'ratio': ratio,
+                'offset_x': (cw - int(iw * ratio)) // 2,
+                'offset_y': (ch - int(ih * ratio)) // 2}
 
-    def display_image(self, pil_img):
-        if not pil_img: return
+    def canvas_size(self):
         cw = self.canvas.winfo_width()
         ch = self.canvas.winfo_height()
         if cw < 10: cw, ch = 800, 600
+        return cw, ch
 
-        iw, ih = pil_img.size
-        ratio = min(cw / iw, ch / ih)
-        new_size = (int(iw * ratio), int(ih * ratio))
-
-        offset_x = (cw - new_size[0]) // 2
-        offset_y = (ch - new_size[1]) // 2
-
-        self.render_params = {'ratio': ratio, 'offset_x': offset_x, 'offset_y': offset_y}
+    def display_image(self):
+        """显示不带标注的原图"""
+        self.show_annotations = False
+        self.redraw()
 
-        self.pil_image_display = pil_img.resize(new_size, Image.Resampling.LANCZOS)
-        self.tk_image = ImageTk.PhotoImage(self.pil_image_display)
+    def show_visualization(self):
+        """显示带标注的图片"""
+        self.show_annotations = True
+        self.redraw()
+
+    def redraw(self):
+        """
+        提交视口渲染：只解码与视口相交的图块并在视口分辨率上绘制标注
+        缩放与绘制在后台线程中进行，新的请求会取代尚未完成的旧请求，只有最新的结果显示到画布上
+        """
+        if not self.pyramid: return
+        if self.fit_view:
+            self.render_params = self.compute_fit()
 
-        self.canvas.delete("all")
-        self.canvas.create_image(cw // 2, ch // 2, anchor=tk.CENTER, image=self.tk_image)
+        ratio = self.render_params['ratio']
+        off_x = self.render_params['offset_x']
+        off_y = self.render_params['offset_y']
+        transform = (ratio, off_x, off_y)
+        comparing = self.show_annotations and self.comparing()
+        heat_mode = self.heatmap_mode() if self.show_annotations and not comparing else None
+        incremental = self.incremental_var.get() and not comparing and not heat_mode
+
+        base_key = (transform, self.canvas_size())
+        if incremental and base_key == self._base_key:
+            # 增量模式下视口未变，底图无需重新渲染，只同步叠加层
+            self.sync_overlay(transform, incremental)
+            return
 
-    def show_visualization(self):
-        if not self.pil_image_original: return
+        # 非增量模式: 标注直接画进底图 (匹配会更新界面上的统计文字，在主线程中完成)
+        if comparing:
+            with profiling.span('compare'):
+                self.update_comparison()
+        mode = None
+        if comparing:
+            mode = 'compare'
+        elif heat_mode and self.objects:
+            mode = 'heatmap'
+        elif self.show_annotations and self.objects and not incremental:
+            mode = 'lod' if self.lod_var.get() else 'draw'
+
+        # 后台线程只读取这份快照，勾选状态复制一份，之后在界面上的修改不影响正在进行的渲染
+        self._scene = {
+            'pyramid': self.pyramid, 'transform': transform, 'canvas_size': self.canvas_size(),
+            'key': base_key, 'mode': mode, 'incremental': incremental, 'preview': base_key != self._shown_key,
+            'objects': self.objects, 'visible': self.objects.visible.copy(), 'hit_index': self.hit_index,
+            'pred_objects': self.pred_objects, 'compare_result': self.compare_result, 'heat_mode': heat_mode,
+            'options': self.get_draw_options(),
+        }
+        self._base_key = base_key if incremental else None
+        self.renderer.submit(render_worker.render_job(self._scene))
+
+    def _on_rendered(self, view, final):
+        """
+        主线程：把后台渲染的结果显示到画布上 (只会收到最新一次请求的结果)
+        :param final: False 表示低画质预览，叠加层等完整结果到达后再同步
+        """
+        scene = self._scene
+        with profiling.frame('present'):
+            self.pil_image_display = view
+            with profiling.span('photoimage'):
+                if self.tk_image is not None and (self.tk_image.width(), self.tk_image.height()) == view.size:
+                    # 尺寸不变时直接写入已有的 PhotoImage，画布图元无需重建
+                    self.tk_image.paste(view)
+                else:
+                    self.tk_image = ImageTk.PhotoImage(view)
+                    with profiling.span('canvas'):
+                        self.canvas.delete("base")
+                        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.tk_image, tags="base")
+                        self.canvas.tag_lower("base")
+            self._shown_key = scene['key']
+            if final:
+                self.sync_overlay(scene['transform'], scene['incremental'])
+
+    def _on_render_error(self, error):
+        messagebox.showerror("错误", f"渲染失败: {error}")
+
+    def sync_overlay(self, transform, incremental):
+        """增量模式: 标注为独立的画布图元，只同步发生变化的目标"""
+        with profiling.span('overlay'):
+            if incremental and self.show_annotations:
+                self.overlay.set_transform(transform)
+                self.overlay.sync(self.objects.visible, self.get_draw_options())
+            else:
+                self.overlay.clear()
+
+    # ==========性能统计==========
+    def _on_profile_frame(self, record):
+        # Tk 只能在主线程中调用；后台渲染线程的帧在结果显示 (present 帧结束) 时一并刷新
+        if threading.current_thread() is threading.main_thread():
+            self.update_hud()
+
+    def on_hud_toggle(self):
+        profiling.PROFILER.enable(self.hud_var.get())
+        if not self.hud_var.get():
+            profiling.PROFILER.clear_frames()
+        self.update_hud()
+        self.redraw()
+
+    def update_hud(self):
+        """在画布左上角显示各类帧 (重绘 / 标注加载) 最近一次的分阶段耗时与计数"""
+        self.canvas.delete("hud")
+        frames = profiling.PROFILER.frames()
+        if not self.hud_var.get() or not frames:
+            return
+        text = "\n".join(record.summary() for record in frames)
+        item = self.canvas.create_text(8, 8, anchor=tk.NW, text=text, fill="#7CFC00",
+                                       font=("Courier", 9), tags="hud")
+        x0, y0, x1, y1 = self.canvas.bbox(item)
+        back = self.canvas.create_rectangle(x0 - 4, y0 - 4, x1 + 4, y1 + 4, fill="black", outline="",
+                                            stipple="gray50", tags="hud")
+        self.canvas.tag_lower(back, item)
+        self.canvas.tag_raise("hud")
+
+    def toggle_trace(self):
+        """开始 / 结束把各阶段的计时写入跟踪文件 (Chrome Trace Event 格式)"""
+        if profiling.PROFILER.tracing:
+            path = profiling.PROFILER.stop_trace()
+            profiling.PROFILER.enable(self.hud_var.get())
+            self.btn_trace.config(text="⏱ 记录性能跟踪")
+            messagebox.showinfo("完成", f"性能跟踪已保存到\n{path}\n可在 chrome://tracing 或 ui.perfetto.dev 中打开")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Trace JSON", "*.json")])
+        if not path: return
+        try:
+            profiling.PROFILER.start_trace(path)
+        except OSError as e:
+            messagebox.showerror("错误", f"无法写入跟踪文件: {e}")
+            return
+        self.btn_trace.config(text="⏹ 停止记录跟踪")
 
-        color = self.color_var.get()
-        show_lbl = self.show_label_var.get()
-        dota_mode = self.dota_style_var.get()
+    def get_draw_options(self):
+        """从界面控件读取绘图参数"""
         line_style_name = self.line_style_var.get()
-        line_style = LINE_STYLES.get(line_style_name, 'solid')
-        line_width = self.line_width_var.get()
-
-        img_drawn, count = drawer.draw_on_image(
-            self.pil_image_original,
-            self.objects,
-            color_name=color,
-            show_labels=show_lbl,
-            dota_mode=dota_mode,
-            line_style=line_style,
-            line_width=line_width
-        )
-        self.display_image(img_drawn)
+        return {
+            'color_name': self.color_var.get(),
+            'show_labels': self.show_label_var.get(),
+            'dota_mode': self.dota_style_var.get(),
+            'line_style': LINE_STYLES.get(line_style_name, 'solid'),
+            'line_width': self.line_width_var.get()
+        }
 
     def save_image_dialog(self):
-        if not self.pil_image_original: return
-        path = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[("JPG", "*.jpg"), ("PNG", "*.png")])
-        if path:
-            color = self.color_var.get()
-            show_lbl = self.show_label_var.get()
-            dota_mode = self.dota_style_var.get()
-            line_style_name = self.line_style_var.get()
-            line_style = LINE_STYLES.get(line_style_name, 'solid')
-            line_width = self.line_width_var.get()
-
-            img_to_save, _ = drawer.draw_on_image(
-                self.pil_image_original,
-                self.objects,
-                color_name=color,
-                show_labels=show_lbl,
-                dota_mode=dota_mode,
-                line_style=line_style,
-                line_width=line_width
-            )
-            try:
+        if not self.source: return
+        path = filedialog.asksaveasfilename(defaultextension=".jpg", filetypes=[
+            ("JPG", "*.jpg"), ("PNG", "*.png"), ("TIFF (分块流式，适合超大图)", "*.tif")])
+        if not path: return
+
+        # 在后台线程中使用的状态快照
+        source, objects = self.source, self.objects
+        visible, options = objects.visible.copy(), self.get_draw_options()
+
+        if path.lower().endswith(('.tif', '.tiff')):
+            def job(progress, cancel):
+                export.export_tiff(source, objects, path, visible, options, progress=progress, cancel=cancel)
+                return f"保存成功: {path}"
+        else:
+            def job(progress, cancel):
+                # 整图输出无法分块：数据源返回新解码的原图，直接在上面绘制，不再额外复制
+                img_to_save, _ = drawer.draw_on_image(source.load(), objects, visible=visible, inplace=True, **options)
+                if cancel.is_set():
+                    raise export.ExportCancelled()
+                if path.lower().endswith(('.jpg', '.jpeg')) and img_to_save.mode not in ('RGB', 'L'):
+                    img_to_save = img_to_save.convert('RGB')
                 img_to_save.save(path)
-                messagebox.showinfo("成功", f"保存成功: {path}")
+                return f"保存成功: {path}"
+        self.run_export_job("保存图片", job)
+
+    def export_chips_dialog(self):
+        if not self.source: return
+        out_dir = filedialog.askdirectory(title="选择切片输出目录")
+        if not out_dir: return
+        source, objects = self.source, self.objects
+        visible, options = objects.visible.copy(), self.get_draw_options()
+        prefix = os.path.splitext(os.path.basename(self.current_image_path))[0]
+
+        def job(progress, cancel):
+            count = export.export_chips(source, objects, out_dir, visible, options, prefix=prefix,
+                                        progress=progress, cancel=cancel)
+            return f"已导出 {count} 个切片到: {out_dir}"
+        self.run_export_job("导出切片", job)
+
+    def run_export_job(self, title, job):
+        """
+        在后台线程中执行导出，显示进度并支持取消
+        :param job: job(progress, cancel) -> 完成提示文字；progress(已完成, 总数) 可在工作线程中调用
+        """
+        win = tk.Toplevel(self.root)
+        win.title(title)
+        win.transient(self.root)
+        win.resizable(False, False)
+        status = ttk.Label(win, text="准备中...", padding=(10, 10, 10, 0))
+        status.pack(fill=tk.X)
+        bar = ttk.Progressbar(win, length=320, maximum=1)
+        bar.pack(padx=10, pady=10)
+
+        cancel = threading.Event()
+        results = queue.Queue()
+        cancel_btn = ttk.Button(win, text="取消", command=cancel.set)
+        cancel_btn.pack(pady=(0, 10))
+        win.protocol("WM_DELETE_WINDOW", cancel.set)
+
+        def worker():
+            try:
+                results.put(('done', job(lambda done, total: results.put(('progress', (done, total))), cancel)))
+            except export.ExportCancelled:
+                results.put(('cancelled', None))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            try:
+                while True:
+                    kind, value = results.get_nowait()
+                    if kind == 'progress':
+                        done, total = value
+                        bar.config(maximum=total, value=done)
+                        status.config(text=f"{done} / {total}")
+                        continue
+                    win.destroy()
+                    if kind == 'done':
+                        messagebox.showinfo("成功", value)
+                    elif kind == 'error':
+                        messagebox.showerror("失败", str(value))
+                    return
+            except queue.Empty:
+                pass
+            if cancel.is_set():
+                status.config(text="正在取消...")
+                cancel_btn.config(state='disabled')
+            win.after(100, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
+    # ==========数据集统计==========
+    def show_stats_dialog(self):
+        label_dir = self.nav_label_dir or filedialog.askdirectory(title="选择标注目录")
+        if not label_dir: return
+        if self.nav_images:
+            image_dir = os.path.dirname(self.nav_images[0])
+        else:
+            image_dir = filedialog.askdirectory(title="选择图片目录 (用于越界检查，可取消)") or None
+        dataset = self.dataset_var.get()
+
+        win = tk.Toplevel(self.root)
+        win.title(f"数据集统计 - {dataset}")
+        win.geometry("640x480")
+        status = ttk.Label(win, text="统计中...", padding=5)
+        status.pack(fill=tk.X)
+
+        columns = ('class', 'count', 'p50', 'very_tiny', 'tiny', 'small')
+        headings = ('类别', '数量', '尺寸中位数', '<8px', '8-16px', '16-32px')
+        tree = ttk.Treeview(win, columns=columns, show='headings')
+        for col, text in zip(columns, headings):
+            tree.heading(col, text=text)
+            tree.column(col, width=90, anchor=tk.CENTER)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+        btn_row = ttk.Frame(win, padding=5)
+        btn_row.pack(fill=tk.X)
+
+        # 统计在后台线程中运行 (内部再使用进程池)，结果通过队列交回主线程
+        results = queue.Queue()
+
+        def worker():
+            try:
+                results.put(('progress', 0))
+                result = stats.compute_stats(label_dir, dataset, image_dir,
+                                             progress=lambda n: results.put(('progress', n)))
+                results.put(('done', result))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            if not win.winfo_exists(): return
+            try:
+                while True:
+                    kind, value = results.get_nowait()
+                    if kind == 'progress':
+                        status.config(text=f"统计中... 已处理 {value} 个文件")
+                    elif kind == 'error':
+                        status.config(text=f"统计失败: {value}")
+                        return
+                    else:
+                        self._fill_stats(value, status, tree, btn_row)
+                        return
+            except queue.Empty:
+                pass
+            win.after(100, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
+    def _fill_stats(self, result, status, tree, btn_row):
+        size = result.size.summary()
+        p50 = f"{size['p50']:.1f}" if size['p50'] is not None else "-"
+        status.config(text=f"图片 {result.n_images} 张 | 目标 {result.n_objects} 个 | "
+                           f"越界 {result.n_out_of_bounds} 个 | 解析失败 {result.n_failed} 个 | 尺寸中位数 {p50}px")
+        for row in result.class_rows():
+            tree.insert('', tk.END, values=(row['class'], row['count'], f"{row['size_p50']:.1f}",
+                                            f"{row['very_tiny_ratio']:.1%}", f"{row['tiny_ratio']:.1%}",
+                                            f"{row['small_ratio']:.1%}"))
+
+        def export(kind):
+            path = filedialog.asksaveasfilename(defaultextension=f".{kind}", filetypes=[(kind.upper(), f"*.{kind}")])
+            if not path: return
+            try:
+                (stats.write_json if kind == 'json' else stats.write_csv)(result, path)
+                messagebox.showinfo("成功", f"已导出: {path}")
             except Exception as e:
                 messagebox.showerror("失败", str(e))
 
+        ttk.Button(btn_row, text="导出 JSON", command=lambda: export('json')).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_row, text="导出 CSV", command=lambda: export('csv')).pack(side=tk.LEFT, padx=5)
+
+    # ==========数据集检索==========
+    def show_query_dialog(self):
+        label_dir = self.nav_label_dir or filedialog.askdirectory(title="选择标注目录")
+        if not label_dir: return
+        if self.nav_images:
+            image_dir = os.path.dirname(self.nav_images[0])
+        else:
+            image_dir = filedialog.askdirectory(title="选择图片目录")
+            if not image_dir: return
+        dataset = self.dataset_var.get()
+
+        win = tk.Toplevel(self.root)
+        win.title(f"数据集检索 - {dataset}")
+        win.geometry("560x520")
+        status = ttk.Label(win, text="正在更新索引...", padding=5)
+        status.pack(fill=tk.X)
+
+        form = ttk.Frame(win, padding=5)
+        form.pack(fill=tk.X)
+        class_var = tk.StringVar(value="(全部)")
+        class_box = ttk.Combobox(form, textvariable=class_var, values=["(全部)"], width=18)
+        fields = {key: tk.StringVar() for key in ('min_size', 'max_size', 'min_aspect', 'max_aspect', 'max_count')}
+        fields['min_count'] = tk.StringVar(value="1")
+        ttk.Label(form, text="类别:").grid(row=0, column=0, sticky='w')
+        class_box.grid(row=0, column=1, columnspan=3, sticky='w', pady=2)
+        for row, (text, lo, hi) in enumerate((("尺寸 (px) ≥", 'min_size', 'max_size'),
+                                              ("长宽比 ≥", 'min_aspect', 'max_aspect'),
+                                              ("每张数量 ≥", 'min_count', 'max_count')), start=1):
+            ttk.Label(form, text=text).grid(row=row, column=0, sticky='w')
+            ttk.Entry(form, textvariable=fields[lo], width=8).grid(row=row, column=1, pady=2)
+            ttk.Label(form, text="≤" if hi == 'max_count' else "<").grid(row=row, column=2, padx=4)
+            ttk.Entry(form, textvariable=fields[hi], width=8).grid(row=row, column=3, pady=2)
+
+        tree = ttk.Treeview(win, columns=('image', 'count'), show='headings')
+        tree.heading('image', text="图片")
+        tree.heading('count', text="命中目标")
+        tree.column('image', width=380)
+        tree.column('count', width=90, anchor=tk.CENTER)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5)
+        btn_row = ttk.Frame(win, padding=5)
+        btn_row.pack(fill=tk.X)
+
+        state = {'index': None, 'results': []}
+
+        def run_query():
+            def number(key, cast=float):
+                text = fields[key].get().strip()
+                return cast(text) if text else None
+            try:
+                params = {key: number(key) for key in ('min_size', 'max_size', 'min_aspect', 'max_aspect')}
+                params.update(min_count=number('min_count', int) or 1, max_count=number('max_count', int))
+            except ValueError:
+                messagebox.showwarning("提示", "请输入数字", parent=win)
+                return
+            name = class_var.get()
+            classes = None if name in ("", "(全部)") else [name]
+            results = [r for r in state['index'].query(classes, **params) if r[0]]
+            state['results'] = results
+            tree.delete(*tree.get_children())
+            for i, (image_path, _, indices) in enumerate(results):
+                tree.insert('', tk.END, iid=str(i), values=(os.path.basename(image_path), len(indices)))
+            status.config(text=f"共 {len(results)} 张图片、{sum(len(r[2]) for r in results)} 个目标符合条件")
+
+        def open_results(start=0):
+            results = state['results']
+            if not results: return
+            if self.dataset_var.get() != dataset:
+                self.dataset_var.set(dataset)
+                self.update_ui_controls()
+            # 结果按命中数量排序，浏览时保持这个顺序
+            self.browse([r[0] for r in results], label_dir, {r[0]: r[2] for r in results}, start)
+
+        def on_double_click(event):
+            row = tree.identify_row(event.y)
+            if row:
+                open_results(int(row))
+
+        tree.bind("<Double-1>", on_double_click)
+        btn_query = ttk.Button(btn_row, text="查询", command=run_query, state='disabled')
+        btn_query.pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_row, text="浏览结果", command=open_results).pack(side=tk.LEFT, padx=5)
+
+        # 索引在后台线程中增量更新 (内部再使用进程池)；SQLite 连接不能跨线程，查询在主线程重新打开
+        results = queue.Queue()
+        index_path = dataset_index.default_index_path(label_dir, dataset)
+
+        def worker():
+            try:
+                index = dataset_index.DatasetIndex(index_path)
+                try:
+                    index.update(label_dir, dataset, image_dir,
+                                 progress=lambda done, total: results.put(('progress', (done, total))))
+                finally:
+                    index.close()
+                results.put(('done', None))
+            except Exception as e:
+                results.put(('error', e))
+
+        def poll():
+            if not win.winfo_exists(): return
+            try:
+                while True:
+                    kind, value = results.get_nowait()
+                    if kind == 'progress':
+                        status.config(text=f"正在更新索引... {value[0]} / {value[1]} 个文件")
+                    elif kind == 'error':
+                        status.config(text=f"索引失败: {value}")
+                        return
+                    else:
+                        index = dataset_index.DatasetIndex(index_path)
+                        state['index'] = index
+                        win.bind("<Destroy>", lambda e: index.close() if e.widget is win else None)
+                        class_box.config(values=["(全部)"] + index.class_names())
+                        n_images, n_objects, n_failed = index.counts()
+                        status.config(text=f"索引: 图片 {n_images} 张 | 目标 {n_objects} 个 | 解析失败 {n_failed} 个")
+                        btn_query.config(state='normal')
+                        return
+            except queue.Empty:
+                pass
+            win.after(100, poll)
+
+        threading.Thread(target=worker, daemon=True).start()
+        poll()
+
     def select_all(self):
-        for obj in self.objects: obj['var'].set(True)
+        self.obj_list.set_all(True)
+        self.refresh_overlay()
 
     def deselect_all(self):
-        for obj in self.objects: obj['var'].set(False)
+        self.obj_list.set_all(False)
+        self.refresh_overlay()
 
 
 if __name__ == "__main__":
@@ -414,10 +1090,10 @@ if __name__ == "__main__":
     app = RSImageViewer(root)
 
     def on_resize(event):
+        # 渲染在后台进行且新请求会取代旧请求，无需等待拖动停止；同一轮事件只提交一次
         if event.widget == app.canvas_frame:
             if hasattr(app, '_resize_job'): root.after_cancel(app._resize_job)
-            app._resize_job = root.after(100, lambda: app.show_visualization() if app.objects else app.display_image(
-                app.pil_image_original))
+            app._resize_job = root.after_idle(app.redraw)
 
 
     root.bind("<Configure>", on_resize)
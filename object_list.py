@@ -0,0 +1,125 @@
+# object_list.py
+"""
+虚拟化目标列表：只为可见行创建 Checkbutton，勾选状态保存在 NumPy 布尔掩码中。
+无论目标数量多少，控件数量只取决于列表高度。
+"""
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+ROW_HEIGHT = 22
+
+
+class VirtualCheckList(ttk.Frame):
+    def __init__(self, master, on_toggle=None, row_height=ROW_HEIGHT, **kwargs):
+        """
+        :param on_toggle: 勾选状态改变时回调 on_toggle(index)
+        """
+        super().__init__(master, **kwargs)
+        self.on_toggle = on_toggle
+        self.row_height = row_height
+
+        self.texts = []
+        self.mask = np.zeros(0, dtype=bool)
+        self.top = 0  # 列表顶部对应的像素位置
+
+        self.viewport = tk.Frame(self, bg="white", width=160, height=300)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.viewport.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.empty_label = tk.Label(self.viewport, text="无目标", bg="white")
+        self._rows = []  # 复用的 (Checkbutton, BooleanVar) 池
+        self.viewport.bind("<Configure>", lambda e: self.refresh())
+        self._bind_wheel(self.viewport)
+
+    def _bind_wheel(self, widget):
+        # Linux 下滚轮为 Button-4/5，Windows/macOS 的 <MouseWheel> 由主窗口统一转发
+        widget.bind("<Button-4>", lambda e: self.yview_scroll(-1, "units"))
+        widget.bind("<Button-5>", lambda e: self.yview_scroll(1, "units"))
+
+    # ---------- 数据 ----------
+    def set_items(self, texts, mask=None):
+        self.texts = texts
+        self.mask = mask if mask is not None else np.zeros(len(texts), dtype=bool)
+        self.top = 0
+        self.refresh()
+
+    def clear(self):
+        self.set_items([])
+
+    def set_all(self, value):
+        self.mask[:] = value
+        self.refresh()
+
+    # ---------- 滚动 ----------
+    def _content_height(self):
+        return len(self.texts) * self.row_height
+
+    def _max_top(self):
+        return max(0, self._content_height() - self.viewport.winfo_height())
+
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.top = float(args[1]) * self._content_height()
+        elif args[0] == 'scroll':
+            step = self.row_height if args[2] == 'units' else self.viewport.winfo_height()
+            self.top += int(args[1]) * step
+        self.refresh()
+
+    def yview_scroll(self, number, what):
+        self.yview('scroll', number, what)
+
+    # ---------- 渲染 ----------
+    def _ensure_rows(self, count):
+        while len(self._rows) < count:
+            var = tk.BooleanVar(value=False)
+            slot = len(self._rows)
+            cb = tk.Checkbutton(self.viewport, variable=var, anchor='w', bg="white",
+                                command=lambda s=slot: self._on_row_click(s))
+            self._bind_wheel(cb)
+            self._rows.append((cb, var))
+
+    def _on_row_click(self, slot):
+        index = self._row_index(slot)
+        if index is None: return
+        self.mask[index] = self._rows[slot][1].get()
+        if self.on_toggle:
+            self.on_toggle(index)
+
+    def _row_index(self, slot):
+        index = int(self.top // self.row_height) + slot
+        return index if index < len(self.texts) else None
+
+    def refresh(self):
+        height = max(self.viewport.winfo_height(), self.row_height)
+        self.top = min(max(0, self.top), self._max_top())
+
+        total = self._content_height()
+        if total > 0:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + height) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+        if not self.texts:
+            for cb, _ in self._rows: cb.place_forget()
+            self.empty_label.place(x=2, y=2)
+            return
+        self.empty_label.place_forget()
+
+        visible_count = height // self.row_height + 2
+        self._ensure_rows(visible_count)
+
+        first = int(self.top // self.row_height)
+        shift = -(self.top % self.row_height)
+        for slot, (cb, var) in enumerate(self._rows):
+            index = first + slot
+            if slot >= visible_count or index >= len(self.texts):
+                cb.place_forget()
+                continue
+            cb.configure(text=self.texts[index])
+            var.set(bool(self.mask[index]))
+            cb.place(x=2, y=shift + slot * self.row_height, relwidth=1.0, width=-4, height=self.row_height)
@@ -0,0 +1,108 @@
+# overlay.py
+"""
+增量叠加层渲染：每个目标对应一组 Tk Canvas 图元，与底图分离。
+勾选/取消某个目标时只增删该目标的图元；缩放平移时整体变换已有图元，不重画底图上的标注。
+"""
+import drawer
+from annotations import AnnotationSet
+
+OVERLAY_TAG = "overlay"
+
+
+def _obj_tag(index):
+    return f"obj{index}"
+
+
+class CanvasOverlay:
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.objects = AnnotationSet.empty()
+        self.geometry = self.objects.geometry
+        self.drawn = set()  # 当前已有图元的目标下标
+        self.transform = None
+        self.options = None
+
+    def clear(self):
+        self.canvas.delete(OVERLAY_TAG)
+        self.drawn.clear()
+
+    def set_objects(self, objects, geometry=None):
+        """
+        标注重新加载后调用，清空已有图元
+        :param objects: annotations.AnnotationSet
+        :param geometry: 与 objects 对应的 geometry.ObjectGeometry，为 None 时使用 objects.geometry
+        """
+        self.clear()
+        self.objects = objects
+        self.geometry = geometry if geometry is not None else objects.geometry
+
+    def set_transform(self, transform):
+        """
+        视口变化时整体变换已有图元，而不是逐个重建
+        画布坐标 s = 原图坐标 * ratio + offset，故 s' = s * f + (offset' - offset * f)，f = ratio' / ratio
+        """
+        if self.transform == transform:
+            return
+        old = self.transform
+        self.transform = transform
+        if old is None or not self.drawn:
+            return
+        f = transform[0] / old[0]
+        self.canvas.scale(OVERLAY_TAG, 0, 0, f, f)
+        self.canvas.move(OVERLAY_TAG, transform[1] - old[1] * f, transform[2] - old[2] * f)
+
+    def sync(self, visible, options):
+        """
+        使画布上的图元与可见掩码一致，只对状态发生变化的目标增删图元
+        :param visible: 布尔掩码，None 表示全部隐藏
+        :param options: drawer.draw_on_image 的绘图参数，改变时全部重建
+        """
+        if options != self.options:
+            self.clear()
+            self.options = dict(options)
+        if not self._ready():
+            return
+
+        wanted = set() if visible is None else set(int(i) for i in visible.nonzero()[0])
+        for index in self.drawn - wanted:
+            self.canvas.delete(_obj_tag(index))
+        for index in wanted - self.drawn:
+            self._create_items(index)
+        self.drawn = wanted
+
+    def set_visible(self, index, flag):
+        """切换单个目标，耗时与目标总数无关"""
+        if not self._ready():
+            return
+        if flag and index not in self.drawn:
+            self._create_items(index)
+            self.drawn.add(index)
+        elif not flag and index in self.drawn:
+            self.canvas.delete(_obj_tag(index))
+            self.drawn.discard(index)
+
+    def _ready(self):
+        """
+        首次渲染完成 (sync 与 set_transform) 之前没有绘图参数与视口变换，此时不创建图元，
+        之后的 sync 会按可见掩码补齐
+        """
+        return self.options is not None and self.transform is not None
+
+    def _create_items(self, index):
+        opts = self.options
+        geom = self.geometry.take([index])
+        hbb = opts['dota_mode'] == 'HBB'
+        n = 4 if geom.is_box[0] or hbb else int(geom.counts[0])
+        if n < 3:
+            return
+        ratio, off_x, off_y = self.transform
+        verts = geom.outlines(hbb)[0, :n] * ratio + (off_x, off_y)
+        points = verts.ravel().tolist() + verts[0].tolist()
+        anchor_pt = (geom.label_anchors(hbb)[0] * ratio + (off_x, off_y)).tolist()
+
+        tags = (OVERLAY_TAG, _obj_tag(index))
+        dash = drawer.DASH_PATTERNS.get(opts['line_style'], '')
+        self.canvas.create_line(*points, fill=opts['color_name'], width=opts['line_width'], dash=dash, tags=tags)
+        if opts['show_labels']:
+            self.canvas.create_text(anchor_pt[0], anchor_pt[1] - 2, text=self.objects.class_name(index), anchor='sw',
+                                    fill=opts['color_name'], tags=tags)
@@ -1,4 +1,9 @@
+import json
 import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 
 # VisDrone 官方类别映射 (根据你的数据样例补充了 0 和 11)
 # 0 通常是 Ignored regions, 1-10 是标准目标
@@ -108,46 +113,704 @@ def parse_visdrone(line_parts, img_w, img_h):
         return None
 
 
-# 注册解析器
-DATASET_PARSERS = {
-    'AI-TOD': parse_aitod,
-    'DOTA': parse_dota,
-    'VisDrone2019': parse_visdrone
-}
+# ================= 列式批量解析 =================
+# 一次读入整个文件，把所有目标的数值字段一次性转换为 NumPy 数组，
+# 避免逐行构造 dict。旧的 list-of-dicts 结果由 columns_to_objects 从列数据生成。
 
+def _numeric_block(rows, n_cols):
+    """
+    将每行前 n_cols 个字段批量转换为 float32 矩阵
+    :return: (block, valid) 其中 valid 为布尔掩码，标记可以成功转换的行
+    """
+    fields = [r[:n_cols] for r in rows]
+    valid = np.ones(len(fields), dtype=bool)
+    if not fields:
+        return np.zeros((0, n_cols), dtype=np.float32), valid
 
-def parse_label_file(file_path, dataset_type, img_size):
-    img_w, img_h = img_size
-    parser_func = DATASET_PARSERS.get(dataset_type)
+    try:
+        return np.array(fields, dtype=np.float32), valid
+    except ValueError:
+        pass
+
+    # 批量转换失败时才逐行定位坏行 (例如混入了无法解析的文字)
+    for i, f in enumerate(fields):
+        try:
+            [float(v) for v in f]
+        except ValueError:
+            valid[i] = False
+    good = [f for f, ok in zip(fields, valid) if ok]
+    block = np.array(good, dtype=np.float32).reshape(-1, n_cols)
+    return block, valid
+
+
+def _empty_result(n_cols):
+    return {
+        'index': np.zeros(0, dtype=np.int64),
+        'coords': np.zeros((0, n_cols), dtype=np.float32),
+        'labels': [],
+        'difficulty': np.zeros(0, dtype=np.int32),
+        'score': np.zeros(0, dtype=np.float32),
+        'bounds_error': False
+    }
+
+
+def parse_aitod_columns(rows, img_w, img_h):
+    """AI-TOD 列式解析: x1, y1, x2, y2, class_name"""
+    index = np.array([i for i, r in enumerate(rows) if len(r) >= 5], dtype=np.int64)
+    if len(index) == 0:
+        return _empty_result(4)
+
+    kept = [rows[i] for i in index]
+    coords, valid = _numeric_block(kept, 4)
+    index = index[valid]
+    labels = [r[4] for r, ok in zip(kept, valid) if ok]
+    return _aitod_result(index, coords, labels, img_w, img_h)
+
+
+def _aitod_result(index, coords, labels, img_w, img_h):
+    # 与 parse_aitod 相同的 +50 像素容错越界检查，越界行被丢弃并标记
+    in_bounds = (coords[:, 0] <= img_w + 50) & (coords[:, 1] <= img_h + 50)
+    bounds_error = not bool(in_bounds.all())
+    if bounds_error:
+        coords = coords[in_bounds]
+        index = index[in_bounds]
+        labels = [l for l, ok in zip(labels, in_bounds) if ok]
+
+    n = len(index)
+    return {
+        'index': index,
+        'coords': coords,
+        'labels': labels,
+        'difficulty': np.zeros(n, dtype=np.int32),
+        'score': np.ones(n, dtype=np.float32),
+        'bounds_error': bounds_error
+    }
+
+
+def parse_dota_columns(rows, img_w, img_h):
+    """DOTA 列式解析: x1, y1, ..., x4, y4, category, difficulty"""
+    index = []
+    for i, r in enumerate(rows):
+        first_item = r[0].lower()
+        if 'imagesource' in first_item or 'gsd' in first_item:
+            continue
+        if len(r) >= 9:
+            index.append(i)
+    index = np.array(index, dtype=np.int64)
+    if len(index) == 0:
+        return _empty_result(8)
+
+    kept = [rows[i] for i in index]
+    coords, valid = _numeric_block(kept, 8)
+    index = index[valid]
+    kept = [r for r, ok in zip(kept, valid) if ok]
+    labels = [r[8] for r in kept]
+    # difficulty 列可缺省，缺省或非法时记为 0
+    diff_tokens = [r[9] if len(r) > 9 else '0' for r in kept]
+    return _dota_result(index, coords, labels, diff_tokens)
+
+
+def _dota_result(index, coords, labels, diff_tokens):
+    try:
+        difficulty = np.array(diff_tokens, dtype=np.float32).astype(np.int32)
+    except ValueError:
+        difficulty = np.array([int(t) if t.isdigit() else 0 for t in diff_tokens], dtype=np.int32)
+
+    return {
+        'index': index,
+        'coords': coords,
+        'labels': labels,
+        'difficulty': difficulty.reshape(-1),
+        'score': np.ones(len(index), dtype=np.float32),
+        'bounds_error': False
+    }
+
+
+def parse_visdrone_columns(rows, img_w, img_h):
+    """VisDrone 列式解析: x, y, w, h, score, category, truncation, occlusion"""
+    index = np.array([i for i, r in enumerate(rows) if len(r) >= 6], dtype=np.int64)
+    if len(index) == 0:
+        return _empty_result(4)
+
+    kept = [rows[i] for i in index]
+    block, valid = _numeric_block(kept, 5)
+    index = index[valid]
+    kept = [r for r, ok in zip(kept, valid) if ok]
+
+    return _visdrone_result(index, block, np.array([r[5] for r in kept], dtype=object))
+
+
+def _visdrone_result(index, block, cls_tokens):
+    coords = block[:, :4].copy()
+    coords[:, 2] += coords[:, 0]
+    coords[:, 3] += coords[:, 1]
+
+    # 只对出现过的类别 ID 查表，而不是每个目标查一次
+    uniq, inverse = np.unique(cls_tokens, return_inverse=True)
+    names = [VISDRONE_CLASS_MAP.get(str(c), f"Class {c}") for c in uniq]
+    labels = [names[k] for k in inverse]
+
+    return {
+        'index': index,
+        'coords': coords,
+        'labels': labels,
+        'difficulty': np.zeros(len(index), dtype=np.int32),
+        'score': block[:, 4].copy(),
+        'bounds_error': False
+    }
+
+
+def parse_yolo_columns(rows, img_w, img_h):
+    """YOLO 列式解析: class, cx, cy, w, h [, conf]，坐标为相对图片宽高的比例"""
+    index = np.array([i for i, r in enumerate(rows) if len(r) >= 5], dtype=np.int64)
+    if len(index) == 0:
+        return _empty_result(4)
+
+    kept = [rows[i] for i in index]
+    block, valid = _numeric_block(kept, 5)
+    index = index[valid]
+    kept = [r for r, ok in zip(kept, valid) if ok]
+    score = _optional_column(kept, 5, 1.0)
+    return _yolo_result(index, block[:, 0], block[:, 1:5], score, img_w, img_h)
+
+
+def parse_yolo_obb_columns(rows, img_w, img_h):
+    """YOLO-OBB 列式解析: class, x1, y1, ..., x4, y4 [, conf]，坐标为比例"""
+    index = np.array([i for i, r in enumerate(rows) if len(r) >= 9], dtype=np.int64)
+    if len(index) == 0:
+        return _empty_result(8)
+
+    kept = [rows[i] for i in index]
+    block, valid = _numeric_block(kept, 9)
+    index = index[valid]
+    kept = [r for r, ok in zip(kept, valid) if ok]
+    score = _optional_column(kept, 9, 1.0)
+    return _yolo_result(index, block[:, 0], block[:, 1:9], score, img_w, img_h)
+
+
+def _optional_column(rows, col, default):
+    """可缺省的数值列 (例如置信度)，缺省或非法时取 default"""
+    values = np.full(len(rows), default, dtype=np.float32)
+    for i, r in enumerate(rows):
+        if len(r) > col:
+            try:
+                values[i] = float(r[col])
+            except ValueError:
+                pass
+    return values
+
+
+def _yolo_result(index, cls_values, values, score, img_w, img_h):
+    if values.shape[1] == 4:
+        cx, cy = values[:, 0] * img_w, values[:, 1] * img_h
+        hw, hh = values[:, 2] * img_w / 2, values[:, 3] * img_h / 2
+        coords = np.column_stack([cx - hw, cy - hh, cx + hw, cy + hh]).astype(np.float32)
+    else:
+        coords = (values * np.tile([img_w, img_h], 4)).astype(np.float32)
+    # 类别序号统一写成整数文本，由 parse_label_columns 映射为类别名
+    ids = cls_values.astype(np.int64)
+    uniq, inverse = np.unique(ids, return_inverse=True)
+    names = [str(c) for c in uniq]
+    return {
+        'index': index,
+        'coords': coords,
+        'labels': [names[k] for k in inverse.reshape(-1)],
+        'difficulty': np.zeros(len(index), dtype=np.int32),
+        'score': np.asarray(score, dtype=np.float32),
+        'bounds_error': False
+    }
+
+
+# ================= 快速路径：整文件一次分词 =================
+# 标注文件绝大多数是每行字段数相同的规整文本，此时整个文件一次 split 得到 N×K 字段表，
+# 数值列在 C 层逐个调用 float 转换，省去逐行构造列表与逐行判断。
+# 字段数不一致、含非数值字段等情况返回 None / 抛出 ValueError，退回上面的逐行解析 (可以定位坏行)。
+
+def split_rows(text):
+    """逐行分词，返回 (清理后的字段列表, 原始行)"""
+    rows = []
+    raw_lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line: continue
+        rows.append(clean_line(line))
+        raw_lines.append(line)
+    return rows, raw_lines
+
+
+_ROW_END = '\x01'  # 行尾哨兵字段 (不是空白字符，也不会出现在标注文本中)
+
+
+def token_table(text, is_header=None):
+    """
+    把整个文件分词为 N×K 的字段表 (object 数组)
+    :param is_header: 可选，is_header(首字段小写) 为 True 的开头几行视为元数据行跳过 (如 DOTA 的 imagesource / gsd)
+    :return: (table, raw_lines)；文件为空或各行字段数不一致时返回 None
+    """
+    raw_lines = [line.strip() for line in text.splitlines()]
+    raw_lines = [line for line in raw_lines if line]
+    if is_header is not None:
+        start = 0
+        while start < len(raw_lines) and is_header(raw_lines[start].split(None, 1)[0].lower()):
+            start += 1
+        raw_lines = raw_lines[start:]
+    if not raw_lines:
+        return None
+
+    # 每行末尾追加一个哨兵字段：总数能整除且每行最后一列都是哨兵，才说明各行字段数一致
+    tokens = (f' {_ROW_END} '.join(raw_lines) + f' {_ROW_END}').replace(',', ' ').split()
+    k = len(tokens) // len(raw_lines)
+    if k < 2 or k * len(raw_lines) != len(tokens):
+        return None
+    table = np.array(tokens, dtype=object).reshape(-1, k)
+    if not (table[:, -1] == _ROW_END).all():
+        return None
+    return table[:, :-1], raw_lines
+
+
+def table_floats(columns):
+    """字段表的若干列 -> float32 矩阵；含非数值字段时抛出 ValueError"""
+    return columns.astype(np.float32)
+
+
+def _is_dota_header(first_item):
+    return 'imagesource' in first_item or 'gsd' in first_item
+
+
+def bulk_aitod(text, img_w, img_h):
+    parsed = token_table(text)
+    if parsed is None or parsed[0].shape[1] < 5:
+        return None
+    table, raw_lines = parsed
+    coords = table_floats(table[:, :4])
+    return _aitod_result(np.arange(len(table)), coords, table[:, 4].tolist(), img_w, img_h), raw_lines
+
+
+def bulk_dota(text, img_w, img_h):
+    parsed = token_table(text, _is_dota_header)
+    if parsed is None or parsed[0].shape[1] < 9:
+        return None
+    table, raw_lines = parsed
+    coords = table_floats(table[:, :8])
+    diff_tokens = table[:, 9].tolist() if table.shape[1] > 9 else ['0'] * len(table)
+    return _dota_result(np.arange(len(table)), coords, table[:, 8].tolist(), diff_tokens), raw_lines
+
+
+def bulk_visdrone(text, img_w, img_h):
+    parsed = token_table(text)
+    if parsed is None or parsed[0].shape[1] < 6:
+        return None
+    table, raw_lines = parsed
+    block = table_floats(table[:, :5])
+    return _visdrone_result(np.arange(len(table)), block, table[:, 5]), raw_lines
+
+
+def _bulk_yolo(text, img_w, img_h, n_values):
+    parsed = token_table(text)
+    if parsed is None or parsed[0].shape[1] not in (n_values + 1, n_values + 2):
+        return None
+    table, raw_lines = parsed
+    block = table_floats(table)
+    score = block[:, n_values + 1] if table.shape[1] > n_values + 1 else np.ones(len(table), dtype=np.float32)
+    return _yolo_result(np.arange(len(table)), block[:, 0], block[:, 1:n_values + 1], score, img_w, img_h), raw_lines
+
+
+def bulk_yolo(text, img_w, img_h):
+    return _bulk_yolo(text, img_w, img_h, 4)
+
+
+def bulk_yolo_obb(text, img_w, img_h):
+    return _bulk_yolo(text, img_w, img_h, 8)
+
+
+# ================= COCO JSON =================
+# 一个 COCO 标注文件包含整个数据集的所有图片；按文件缓存解析后的索引，逐图读取时不重复加载 JSON
+COCO_CACHE_FILES = 2
+_coco_cache = OrderedDict()
+_coco_lock = threading.Lock()  # 预取线程与主线程会同时访问
 
-    if not parser_func:
-        raise ValueError(f"未知的解析类型: {dataset_type}")
 
-    objects = []
-    is_bounds_error = False
+def _coco_index(file_path):
+    st = os.stat(file_path)
+    key = (os.path.abspath(file_path), st.st_mtime_ns, st.st_size)
+    with _coco_lock:
+        index = _coco_cache.get(key)
+        if index is not None:
+            _coco_cache.move_to_end(key)
+            return index
 
     with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+        data = json.load(f)
+    if not isinstance(data, dict) or 'images' not in data:
+        raise ValueError("COCO 文件缺少 images 字段 (检测结果列表无法对应到图片文件名)")
+    categories = {c['id']: c['name'] for c in data.get('categories', [])}
+    by_id = {}
+    for ann in data.get('annotations', []):
+        by_id.setdefault(ann['image_id'], []).append(ann)
+    by_name, by_stem = {}, {}
+    for img in data['images']:
+        name = os.path.basename(img['file_name'])
+        anns = by_id.get(img['id'], [])
+        by_name[name] = anns
+        by_stem[os.path.splitext(name)[0]] = anns
+    index = {'categories': categories, 'by_name': by_name, 'by_stem': by_stem}
+
+    with _coco_lock:
+        _coco_cache[key] = index
+        while len(_coco_cache) > COCO_CACHE_FILES:
+            _coco_cache.popitem(last=False)
+    return index
+
+
+def read_coco(file_path, img_w, img_h, image_name=None):
+    """
+    读取 COCO JSON 中一张图片的 bbox 标注 (x, y, w, h)
+    :param image_name: 图片文件名 (按文件名或去掉扩展名后的名字匹配)；文件中只有一张图片时可省略
+    """
+    index = _coco_index(file_path)
+    if image_name is None:
+        if len(index['by_name']) != 1:
+            raise ValueError("COCO 文件包含多张图片，需要指定图片文件名")
+        anns = next(iter(index['by_name'].values()))
+    else:
+        name = os.path.basename(image_name)
+        anns = index['by_name'].get(name)
+        if anns is None:
+            anns = index['by_stem'].get(os.path.splitext(name)[0], [])
+
+    n = len(anns)
+    bbox = np.array([a['bbox'] for a in anns], dtype=np.float32).reshape(-1, 4)
+    coords = bbox.copy()
+    coords[:, 2:] += coords[:, :2]
+    categories = index['categories']
+    result = {
+        'index': np.arange(n),
+        'coords': coords,
+        'labels': [categories.get(a['category_id'], f"Class {a['category_id']}") for a in anns],
+        'difficulty': np.array([a.get('iscrowd', 0) for a in anns], dtype=np.int32),
+        'score': np.array([a.get('score', 1.0) for a in anns], dtype=np.float32),
+        'bounds_error': False
+    }
+    raw_lines = [json.dumps(a, ensure_ascii=False, separators=(',', ':')) for a in anns]
+    return result, raw_lines
+
+
+# ================= YOLO 类别名 =================
+YOLO_NAME_FILES = ('classes.txt', 'data.yaml', 'dataset.yaml')
+
+
+def _yaml_names(text):
+    """从 YOLO 的 data.yaml 中读取 names (支持 [a, b] 列表、- a 列表与 0: a 映射三种写法)"""
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if not line.startswith('names:'):
+            continue
+        rest = line[len('names:'):].strip()
+        if rest.startswith('['):
+            return [t.strip().strip('\'"') for t in rest.strip('[]').split(',') if t.strip()]
+        names = {}
+        for sub in lines[i + 1:]:
+            s = sub.strip()
+            if not s or s.startswith('#'):
+                continue
+            if not sub.startswith((' ', '\t', '-')):
+                break
+            if s.startswith('-'):
+                names[len(names)] = s[1:].strip().strip('\'"')
+            elif ':' in s:
+                k, v = s.split(':', 1)
+                if k.strip().isdigit():
+                    names[int(k)] = v.strip().strip('\'"')
+        return [names.get(k, f"Class {k}") for k in range(max(names) + 1)] if names else []
+    return []
+
+
+def yolo_class_file(label_path):
+    """在标注所在目录及其上级目录中查找 classes.txt / data.yaml，找不到时返回 None"""
+    label_dir = os.path.dirname(os.path.abspath(label_path))
+    for folder in (label_dir, os.path.dirname(label_dir)):
+        for name in YOLO_NAME_FILES:
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def yolo_class_names(label_path):
+    """读取 yolo_class_file 找到的类别名文件，找不到时返回空表"""
+    path = yolo_class_file(label_path)
+    if path is None:
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if os.path.basename(path) == 'classes.txt':
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    return _yaml_names(text)
+
+
+# ================= 格式嗅探 =================
+SNIFF_BYTES = 4096  # 只读取文件开头的一小段
+SNIFF_LINES = 20
+SNIFF_MIN_SCORE = 0.5
+
+
+def _is_number(token):
+    try:
+        float(token)
+        return True
+    except ValueError:
+        return False
 
-    for idx, line in enumerate(lines):
-        line = line.strip()
-        if not line: continue
 
-        # 使用通用清理函数处理逗号和空格
-        parts = clean_line(line)
+def _fraction(lines, check):
+    """符合 check 的行所占比例"""
+    return sum(1 for line in lines if check(line)) / len(lines)
 
-        try:
-            obj = parser_func(parts, img_w, img_h)
-            if obj:
-                obj['id'] = len(objects) + 1  # 重置 ID 顺序，排除被跳过的 header
-                obj['raw_line'] = line
-                objects.append(obj)
-            # 如果 obj 是 None (比如 header 行)，则直接跳过，不报错
 
+def sniff_aitod(lines, ext):
+    def check(line):
+        parts = line.split()
+        return 5 <= len(parts) <= 6 and all(_is_number(p) for p in parts[:4]) and not _is_number(parts[4])
+    return 0.9 * _fraction(lines, check) if ext == '.txt' else 0.0
+
+
+def sniff_dota(lines, ext):
+    if any(_is_dota_header(line.split(None, 1)[0].lower()) for line in lines[:2]):
+        return 1.0
+
+    def check(line):
+        parts = line.split()
+        return len(parts) >= 9 and all(_is_number(p) for p in parts[:8]) and not _is_number(parts[8])
+    return 0.9 * _fraction(lines, check) if ext == '.txt' else 0.0
+
+
+def sniff_visdrone(lines, ext):
+    def check(line):
+        parts = [p for p in line.split(',') if p.strip()]
+        return ',' in line and len(parts) >= 6 and all(p.strip().lstrip('-').isdigit() for p in parts[:6])
+    return 0.95 * _fraction(lines, check) if ext == '.txt' else 0.0
+
+
+def _sniff_yolo(lines, n_values):
+    def check(line):
+        parts = line.split()
+        if len(parts) not in (n_values + 1, n_values + 2) or not parts[0].isdigit():
+            return False
+        try:
+            values = [float(p) for p in parts[1:]]
         except ValueError:
-            is_bounds_error = True
-        except Exception as e:
-            print(f"解析行 {idx + 1} 失败: {e}")
-            continue
+            return False
+        # 坐标为 0~1 的比例 (越界标注略微超出)
+        return all(-0.01 <= v <= 1.01 for v in values[:n_values])
+    return 0.95 * _fraction(lines, check)
+
+
+def sniff_yolo(lines, ext):
+    return _sniff_yolo(lines, 4) if ext == '.txt' else 0.0
+
+
+def sniff_yolo_obb(lines, ext):
+    return _sniff_yolo(lines, 8) if ext == '.txt' else 0.0
+
+
+def sniff_coco(lines, ext):
+    head = '\n'.join(lines).lstrip()
+    if not head.startswith('{'):
+        return 0.0
+    if any(f'"{key}"' in head for key in ('images', 'annotations', 'categories', 'info', 'licenses')):
+        return 1.0
+    return 0.6 if ext == '.json' else 0.0
 
-    return objects, is_bounds_error
\ No newline at end of file
+
+def read_head_lines(file_path):
+    """读取文件开头 SNIFF_BYTES 字节内的前 SNIFF_LINES 个非空行 (被截断的最后一行丢弃)"""
+    with open(file_path, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        truncated = bool(f.read(1))
+    lines = head.decode('utf-8', errors='ignore').splitlines()
+    if truncated and len(lines) > 1:
+        lines = lines[:-1]
+    return [line.strip() for line in lines if line.strip()][:SNIFF_LINES]
+
+
+# ================= 格式注册表 =================
+AUTO = 'auto'  # 自动识别格式
+
+
+class LabelFormat:
+    """
+    一种标注格式
+    :param kind: 'box' (N×4) 或 'poly' (N×8)
+    :param sniff: sniff(开头若干非空行, 小写扩展名) -> 0~1 的置信度
+    :param parse_rows: parse_rows(rows, img_w, img_h) -> result，逐行分词后的通用解析
+    :param bulk: bulk(text, img_w, img_h) -> (result, raw_lines)，整文件快速路径；不适用时返回 None 或抛出 ValueError
+    :param read: read(file_path, img_w, img_h, image_name) -> (result, raw_lines)，非逐行文本的格式 (COCO JSON) 使用
+    :param class_names: class_names(file_path) -> 类别名表，标注中只有类别序号的格式 (YOLO) 使用
+    :param class_names_file: class_names_file(file_path) -> class_names 读取的文件路径或 None (缓存键据此失效)
+    :param line_parser: 旧版逐行解析函数 (DATASET_PARSERS 兼容)
+    :param normalized: 坐标是否为相对图片宽高的比例 (解析结果依赖图片尺寸)
+    :param is_header: is_header(首字段小写) 判断文件开头的元数据行 (不是目标，也不是坏行)
+    """
+
+    def __init__(self, name, kind, sniff, parse_rows=None, bulk=None, read=None, class_names=None,
+                 class_names_file=None, extensions=('.txt',), line_parser=None, normalized=False, is_header=None):
+        self.name = name
+        self.kind = kind
+        self.sniff = sniff
+        self.parse_rows = parse_rows
+        self.bulk = bulk
+        self.read = read
+        self.class_names = class_names
+        self.class_names_file = class_names_file
+        self.extensions = extensions
+        self.line_parser = line_parser
+        self.normalized = normalized
+        self.is_header = is_header
+
+
+FORMATS = OrderedDict()
+
+
+def register_format(fmt):
+    """注册 (或替换) 一种标注格式；注册顺序即界面中的显示顺序"""
+    FORMATS[fmt.name] = fmt
+    return fmt
+
+
+def format_names(auto=False):
+    """已注册的格式名称，auto=True 时附加 AUTO (命令行 --dataset 的可选值)"""
+    return list(FORMATS) + ([AUTO] if auto else [])
+
+
+def label_extensions(dataset_type=None, shared=False):
+    """
+    标注文件的扩展名 (小写，按注册顺序)，遍历标注目录时使用
+    :param dataset_type: 格式名称；AUTO (或 None) 时为所有已注册格式的并集
+    :param shared: 只取一个文件可以包含多张图片的格式 (带 read 的格式，例如 COCO JSON)
+    """
+    if dataset_type and dataset_type != AUTO:
+        if dataset_type not in FORMATS:
+            raise ValueError(f"未知的解析类型: {dataset_type}")
+        formats = [FORMATS[dataset_type]]
+    else:
+        formats = FORMATS.values()
+    return tuple(dict.fromkeys(ext for fmt in formats if not shared or fmt.read is not None
+                               for ext in fmt.extensions))
+
+
+register_format(LabelFormat('AI-TOD', 'box', sniff_aitod, parse_aitod_columns, bulk_aitod, line_parser=parse_aitod))
+register_format(LabelFormat('DOTA', 'poly', sniff_dota, parse_dota_columns, bulk_dota, line_parser=parse_dota,
+                            is_header=_is_dota_header))
+register_format(LabelFormat('VisDrone2019', 'box', sniff_visdrone, parse_visdrone_columns, bulk_visdrone,
+                            line_parser=parse_visdrone))
+register_format(LabelFormat('YOLO', 'box', sniff_yolo, parse_yolo_columns, bulk_yolo, class_names=yolo_class_names,
+                            class_names_file=yolo_class_file, normalized=True))
+register_format(LabelFormat('YOLO-OBB', 'poly', sniff_yolo_obb, parse_yolo_obb_columns, bulk_yolo_obb,
+                            class_names=yolo_class_names, class_names_file=yolo_class_file, normalized=True))
+register_format(LabelFormat('COCO', 'box', sniff_coco, read=read_coco, extensions=('.json',)))
+
+# 旧版逐行解析函数表：基线版本的公开接口，benchmark 的 legacy 对照也用它逐行解析
+DATASET_PARSERS = {name: fmt.line_parser for name, fmt in FORMATS.items() if fmt.line_parser}
+
+
+def sniff_format(file_path):
+    """
+    根据文件开头的内容猜测格式
+    :return: 格式名称；文件为空时返回 ''，无法识别时返回 None
+    """
+    lines = read_head_lines(file_path)
+    if not lines:
+        return ''
+    ext = os.path.splitext(file_path)[1].lower()
+    best, best_score = None, SNIFF_MIN_SCORE
+    for fmt in FORMATS.values():
+        score = fmt.sniff(lines, ext)
+        if score >= best_score:
+            best, best_score = fmt.name, score
+    return best
+
+
+def resolve_format(file_path, dataset_type):
+    """dataset_type 为 AUTO (或 None) 时自动识别，返回实际使用的格式名称"""
+    if dataset_type and dataset_type != AUTO:
+        if dataset_type not in FORMATS:
+            raise ValueError(f"未知的解析类型: {dataset_type}")
+        return dataset_type
+    name = sniff_format(file_path)
+    if name is None:
+        raise ValueError(f"无法识别标注格式: {os.path.basename(file_path)}")
+    return name or next(iter(FORMATS))  # 空文件按任意格式解析结果都为空
+
+
+def parse_label_columns(file_path, dataset_type, img_size, image_name=None):
+    """
+    列式解析标注文件
+    :param dataset_type: 格式名称，AUTO 表示根据文件开头自动识别
+    :param image_name: 图片文件名，COCO 等一个文件包含多张图片的格式用来选取对应的标注
+    :return: dict，包含
+        type: 'box' (N×4: x1,y1,x2,y2) 或 'poly' (N×8: x1,y1,...,x4,y4)
+        coords: float32 坐标矩阵
+        class_ids: int32 类别索引，对应 class_names 表
+        class_names: 类别名称表
+        difficulty: int32 难度列 (DOTA)，其余数据集为 0
+        score: float32 置信度列 (VisDrone / YOLO / COCO 检测结果)，其余数据集为 1
+        raw_lines: 每个目标对应的原始文本行
+        is_bounds_error: 是否有目标因越界被丢弃
+    """
+    img_w, img_h = img_size
+    fmt = FORMATS[resolve_format(file_path, dataset_type)]
+
+    if fmt.read is not None:
+        result, raw_lines = fmt.read(file_path, img_w, img_h, image_name)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        parsed = None
+        if fmt.bulk is not None:
+            try:
+                parsed = fmt.bulk(text, img_w, img_h)
+            except ValueError:
+                parsed = None  # 含无法转换的字段，交给逐行解析跳过坏行
+        if parsed is None:
+            rows, raw_lines = split_rows(text)
+            result = fmt.parse_rows(rows, img_w, img_h)
+        else:
+            result, raw_lines = parsed
+
+    # 类别编码：集合去重后排序，比对 object 数组 np.unique 快得多
+    labels = result['labels']
+    class_names = sorted(set(labels))
+    lookup = {name: i for i, name in enumerate(class_names)}
+    class_ids = np.fromiter(map(lookup.__getitem__, labels), dtype=np.int32, count=len(labels))
+    if fmt.class_names is not None and class_names:
+        # 只对出现过的类别序号查表
+        table = fmt.class_names(file_path)
+        class_names = [table[int(n)] if n.isdigit() and int(n) < len(table) else f"Class {n}" for n in class_names]
+
+    return {
+        'type': fmt.kind,
+        'coords': result['coords'],
+        'class_ids': class_ids,
+        'class_names': class_names,
+        'difficulty': result['difficulty'],
+        'score': result['score'],
+        'raw_lines': [raw_lines[i] for i in result['index']],
+        'is_bounds_error': result['bounds_error']
+    }
+
+
+def columns_to_objects(columns):
+    """由列式结果生成旧版 list-of-dicts 视图，供 GUI 与 drawer 使用"""
+    kind = columns['type']
+    names = columns['class_names']
+    return [
+        {'type': kind, 'coords': coords, 'class_name': names[cid], 'id': idx + 1, 'raw_line': raw}
+        for idx, (coords, cid, raw) in enumerate(zip(columns['coords'].tolist(),
+                                                     columns['class_ids'].tolist(),
+                                                     columns['raw_lines']))
+    ]
+
+
+def parse_label_file(file_path, dataset_type, img_size, image_name=None):
+    columns = parse_label_columns(file_path, dataset_type, img_size, image_name)
+    return columns_to_objects(columns), columns['is_bounds_error']
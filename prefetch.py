@@ -0,0 +1,182 @@
+# prefetch.py
+"""
+后台预取：在线程池中提前解码相邻图片、构建金字塔、预渲染适应画布的视图并解析标注，
+完成后通过队列交还给 Tk 主线程 (由 root.after 轮询)，避免在主线程中做任何解码。
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import batch_render
+import image_source
+import label_cache
+import parsers
+import profiling
+import tiles
+
+POLL_MS = 30
+PREFETCH_BYTES = 1 << 30  # 窗口内已解码图片的总内存上限 (PNG 等格式每张图片完整解码)
+
+
+def load_entry(image_path, label_path, dataset_type, canvas_size):
+    """
+    工作线程：解码图片、构建金字塔并预渲染适应画布的视图，同时解析标注
+    :return: dict，包含 source / pyramid / fit_params / objects (annotations.AnnotationSet) / is_bounds_error / error，
+        以及可能出现的 label_error (标注解析失败) 与 cache_error (写入标注缓存失败)
+    """
+    result = {'image_path': image_path, 'label_path': label_path, 'dataset': dataset_type,
+              'objects': None, 'is_bounds_error': False, 'error': None}
+    try:
+        with profiling.span('prefetch_image'):
+            source = image_source.open_source(image_path)
+            pyramid = tiles.ImagePyramid(source)
+
+            # 预渲染一次适应画布的视图，使对应层级的图块进入缓存，切换过去时无需再解码
+            cw, ch = canvas_size
+            iw, ih = pyramid.size
+            ratio = min(cw / iw, ch / ih)
+            fit_params = {'ratio': ratio,
+                          'offset_x': (cw - int(iw * ratio)) // 2,
+                          'offset_y': (ch - int(ih * ratio)) // 2}
+            pyramid.render(fit_params['ratio'], fit_params['offset_x'], fit_params['offset_y'], canvas_size)
+
+        result.update(source=source, pyramid=pyramid, fit_params=fit_params)
+    except Exception as e:
+        result['error'] = f"加载图片失败: {e}"
+        return result
+
+    if label_path:
+        try:
+            with profiling.span('prefetch_labels'):
+                objects, is_bounds_error = label_cache.load_annotations(
+                    label_path, dataset_type, source.size, os.path.basename(image_path),
+                    on_cache_error=lambda e: result.update(cache_error=str(e)))
+                objects.geometry  # 几何量在工作线程中算好，主线程直接使用
+            result.update(objects=objects, is_bounds_error=is_bounds_error)
+        except Exception as e:
+            result['label_error'] = str(e)
+    return result
+
+
+class Prefetcher:
+    """
+    以当前序号为中心，预取前后 window 张图片；窗口外的结果会被丢弃以限制内存
+    窗口内已解码的数据合计不超过 max_bytes：超出时离当前序号较远的结果释放解码数据 (显示时按需重新解码)，
+    已经超出时不再预取新的图片
+    窗口内结果 (包括正在显示的一张) 的金字塔由预取器负责释放
+    """
+
+    def __init__(self, root, workers=2, window=2, max_bytes=PREFETCH_BYTES):
+        self.root = root
+        self.window = window
+        self.max_bytes = max_bytes
+        self._wanted = []  # 当前窗口，按优先级排列 (第一个为正在显示的序号)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.entries = OrderedDict()  # index -> Future
+        self.callbacks = {}  # index -> 完成后在主线程调用的回调
+        self.done_queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.loader = None
+        self._poll()
+
+    def reset(self, loader):
+        """
+        切换数据集目录时调用
+        :param loader: loader(index) -> 在工作线程中执行的加载函数返回值
+        """
+        with self.lock:
+            for fut in self.entries.values():
+                fut.cancel()
+            self._release(list(self.entries.keys()))
+            self.callbacks.clear()
+            self.loader = loader
+
+    def request(self, index, callback):
+        """请求某一项，完成后在主线程调用 callback(result)；已完成时立即调用"""
+        fut = self._schedule(index)
+        if fut.done():
+            callback(fut.result())
+        else:
+            self.callbacks[index] = callback
+
+    def prefetch_around(self, index, count):
+        wanted = [index]
+        for step in range(1, self.window + 1):
+            wanted += [i for i in (index + step, index - step) if 0 <= i < count]
+        self._wanted = wanted
+        with self.lock:
+            stale = [i for i in self.entries if i not in wanted]
+        self._release(stale)
+        used = self._trim_memory()
+        for i in wanted:
+            if i != index and used >= self.max_bytes:
+                break
+            self._schedule(i)
+
+    def _trim_memory(self):
+        """
+        按优先级累计窗口内已完成结果的解码数据，超出 max_bytes 的结果释放解码数据 (正在显示的一张除外)
+        :return: 保留的字节数
+        """
+        used = 0
+        for rank, i in enumerate(self._wanted):
+            fut = self.entries.get(i)
+            if fut is None or not fut.done() or fut.cancelled():
+                continue
+            pyramid = fut.result().get('pyramid')
+            if pyramid is None:
+                continue
+            size = pyramid.source.decoded_bytes()
+            if rank and used + size > self.max_bytes:
+                pyramid.close()
+            else:
+                used += size
+        return used
+
+    def _schedule(self, index):
+        with self.lock:
+            fut = self.entries.get(index)
+            if fut is None:
+                fut = self.executor.submit(self.loader, index)
+                fut.add_done_callback(lambda f, i=index: self.done_queue.put((i, f)))
+                self.entries[index] = fut
+            return fut
+
+    def _release(self, indices):
+        for i in indices:
+            fut = self.entries.pop(i, None)
+            self.callbacks.pop(i, None)
+            if fut is None: continue
+            if not fut.cancel() and fut.done() and not fut.cancelled():
+                pyramid = fut.result().get('pyramid')
+                if pyramid: pyramid.close()
+
+    def _poll(self):
+        """在 Tk 主线程中把完成的结果交给回调"""
+        try:
+            while True:
+                index, fut = self.done_queue.get_nowait()
+                callback = self.callbacks.pop(index, None)
+                if callback and not fut.cancelled() and self.entries.get(index) is fut:
+                    callback(fut.result())
+                if self.entries.get(index) is fut:
+                    self._trim_memory()
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self._poll)
+
+
+def list_images(image_dir):
+    exts = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+    return sorted(os.path.join(image_dir, n) for n in os.listdir(image_dir) if n.lower().endswith(exts))
+
+
+def label_for(image_path, label_dir, dataset_type=None):
+    """同名标注 (扩展名取自格式注册表)；没有时使用目录中唯一的 COCO JSON"""
+    if not label_dir:
+        return None
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return batch_render.find_label(label_dir, stem, parsers.label_extensions(dataset_type),
+                                   batch_render.shared_label_file(label_dir, dataset_type))
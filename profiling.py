@@ -0,0 +1,201 @@
+# profiling.py
+"""
+渲染管线的性能埋点：计时区间 (span)、计数器 (counter)、按帧汇总与跟踪文件。
+
+    with profiling.frame('redraw'):          # 一帧 (一次重绘 / 一次标注加载)
+        with profiling.span('resample'):     # 帧内的一个阶段
+            ...
+        profiling.count('objects_drawn', n)
+
+默认关闭：关闭时 span() 返回共用的空上下文、count() 直接返回，埋点的开销只有一次函数调用。
+开启后每帧的各阶段耗时与计数保存在 last_frames 中 (界面 HUD 显示)；
+开始记录跟踪后，所有区间以 Chrome Trace Event 格式写入文件，可用 chrome://tracing 或 Perfetto 打开。
+
+环境变量 RSVIS_PROFILE=1 启动时开启统计，RSVIS_TRACE=路径 启动时开始记录跟踪。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class _NullSpan:
+    """关闭时使用的空上下文"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class FrameRecord:
+    """一帧的汇总：各阶段耗时 (毫秒，按首次出现的顺序) 与计数器"""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.total_ms = 0.0
+        self.spans = OrderedDict()
+        self.counters = OrderedDict()
+
+    def summary(self):
+        """HUD 上显示的多行文字"""
+        lines = [f"{self.name}: {self.total_ms:.1f} ms"]
+        lines += [f"  {name:<16} {ms:8.1f} ms" for name, ms in self.spans.items()]
+        lines += [f"  {name:<16} {value:>11,}" for name, value in self.counters.items()]
+        return "\n".join(lines)
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _Frame:
+    __slots__ = ('profiler', 'record', 'previous')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.record = FrameRecord(name)
+
+    def __enter__(self):
+        local = self.profiler._local
+        self.previous = getattr(local, 'frame', None)
+        local.frame = self.record
+        return self.record
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        record = self.record
+        record.total_ms = (end - record.start) * 1000.0
+        self.profiler._local.frame = self.previous
+        self.profiler._finish_frame(record, end)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.last_frames = OrderedDict()  # 帧名 -> 最近一次的 FrameRecord (后台线程也会写入，读写都需持有 _lock)
+        self.on_frame = None  # 每帧结束后的回调 (界面刷新 HUD)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._trace = None
+        self._trace_path = None
+        self._epoch = time.perf_counter()
+
+    # ---------- 开关 ----------
+    def enable(self, flag=True):
+        self.enabled = bool(flag) or self._trace is not None
+
+    def frames(self):
+        """各类帧最近一次的记录 (列表副本，可在界面线程中安全遍历)"""
+        with self._lock:
+            return list(self.last_frames.values())
+
+    def clear_frames(self):
+        with self._lock:
+            self.last_frames.clear()
+
+    @property
+    def tracing(self):
+        return self._trace is not None
+
+    def start_trace(self, path):
+        """开始把区间写入跟踪文件 (同时开启统计)"""
+        self.stop_trace()
+        self._trace = open(path, 'w', encoding='utf-8')
+        self._trace_path = path
+        # Trace Event 的 JSON 数组格式允许省略结尾的 "]"，进程意外退出时文件仍可打开
+        self._trace.write('[\n')
+        self._write_event({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+                           'args': {'name': 'RS Detection Viewer'}})
+        self.enabled = True
+
+    def stop_trace(self):
+        """结束记录，返回跟踪文件路径 (未在记录时返回 None)"""
+        with self._lock:
+            trace, path = self._trace, self._trace_path
+            self._trace = self._trace_path = None
+        if trace is None:
+            return None
+        # 最后一个事件 (线程名) 之后补上 "]"，使文件成为合法的 JSON
+        trace.write(json.dumps({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                                'tid': threading.main_thread().ident, 'args': {'name': 'main'}}) + ']\n')
+        trace.close()
+        return path
+
+    # ---------- 埋点 ----------
+    def span(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name)
+
+    def frame(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Frame(self, name)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        record = getattr(self._local, 'frame', None)
+        if record is not None:
+            record.counters[name] = record.counters.get(name, 0) + int(value)
+
+    # ---------- 内部 ----------
+    def _record(self, name, start, end):
+        record = getattr(self._local, 'frame', None)
+        if record is not None:
+            record.spans[name] = record.spans.get(name, 0.0) + (end - start) * 1000.0
+        if self._trace is not None:
+            self._write_event({'name': name, 'ph': 'X', 'ts': (start - self._epoch) * 1e6,
+                               'dur': (end - start) * 1e6, 'pid': os.getpid(), 'tid': threading.get_ident()})
+
+    def _finish_frame(self, record, end):
+        with self._lock:
+            self.last_frames[record.name] = record
+            self.last_frames.move_to_end(record.name)
+        if self._trace is not None:
+            self._write_event({'name': record.name, 'ph': 'X', 'ts': (record.start - self._epoch) * 1e6,
+                               'dur': (end - record.start) * 1e6, 'pid': os.getpid(),
+                               'tid': threading.get_ident(), 'args': dict(record.counters)})
+        if self.on_frame is not None:
+            self.on_frame(record)
+
+    def _write_event(self, event):
+        line = json.dumps(event, separators=(',', ':')) + ',\n'
+        with self._lock:
+            if self._trace is not None:
+                self._trace.write(line)
+
+
+# 进程内共用的实例，各模块通过下面的函数埋点
+PROFILER = Profiler()
+atexit.register(PROFILER.stop_trace)
+span = PROFILER.span
+frame = PROFILER.frame
+count = PROFILER.count
+
+if os.environ.get('RSVIS_PROFILE'):
+    PROFILER.enable()
+if os.environ.get('RSVIS_TRACE'):
+    PROFILER.start_trace(os.environ['RSVIS_TRACE'])
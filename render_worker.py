@@ -0,0 +1,188 @@
+# render_worker.py
+"""
+后台视口渲染：底图缩放与标注绘制在工作线程中完成，拖动窗口边缘、缩放或平移大图时界面不再卡顿。
+
+每次提交的渲染任务带有递增的代号 (generation)，新任务提交后之前的任务全部作废：
+还在排队的直接丢弃，正在执行的在下一个阶段检查点中止，已交付的结果在主线程中按代号过滤，
+只有最新一次请求的结果会显示到画布上。
+
+一次渲染分两步交付：先用更粗的金字塔层级和 NEAREST 插值生成预览 (不画类别文字)，
+再生成完整画质的结果替换预览。同一次轮询中已经拿到完整结果时直接跳过预览。
+PhotoImage 的创建与画布操作必须在 Tk 主线程中进行，由 on_result 回调负责。
+"""
+import queue
+import threading
+
+from PIL import Image
+
+import compare
+import drawer
+import heatmap
+import lod
+import profiling
+
+POLL_MS = 15
+PREVIEW_LEVEL_BIAS = 1  # 预览读取比合适层级粗一级的金字塔层
+PREVIEW_MAX_OBJECTS = 20000  # 可见目标超过该数量时预览只显示底图，标注留给完整渲染
+
+
+class Cancelled(Exception):
+    """任务已被更新的请求取代"""
+
+
+class RenderJob:
+    def __init__(self, worker, generation, func):
+        self.worker = worker
+        self.generation = generation
+        self.func = func
+
+    def cancelled(self):
+        return self.generation != self.worker.generation
+
+    def check(self):
+        """阶段检查点：任务已作废时抛出 Cancelled 中止执行"""
+        if self.cancelled():
+            raise Cancelled()
+
+    def publish(self, result, final=True):
+        """交付一个结果 (可多次交付，final=False 表示之后还有更精细的结果)"""
+        self.check()
+        self.worker._results.put((self.generation, result, final, None))
+
+
+class RenderWorker:
+    """单个工作线程，任务槽中只保留最新提交的一个任务"""
+
+    def __init__(self, root, on_result, on_error=None, poll_ms=POLL_MS):
+        """
+        :param on_result: on_result(result, final)，在主线程中调用，只会收到最新任务的结果
+        :param on_error: on_error(exc)，最新任务抛出异常时在主线程中调用
+        """
+        self.root = root
+        self.on_result = on_result
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self.generation = 0
+        self._pending = None
+        self._cond = threading.Condition()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="render", daemon=True)
+        self._thread.start()
+        self._poll()
+
+    def submit(self, func):
+        """
+        提交新任务，之前提交的任务全部作废
+        :param func: func(job)，在工作线程中执行，通过 job.publish 交付结果
+        :return: 新任务的代号
+        """
+        with self._cond:
+            self.generation += 1
+            self._pending = RenderJob(self, self.generation, func)
+            self._cond.notify()
+            return self.generation
+
+    def cancel(self):
+        """作废所有已提交的任务 (例如切换图片时)"""
+        with self._cond:
+            self.generation += 1
+            self._pending = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                job, self._pending = self._pending, None
+            try:
+                job.func(job)
+            except Cancelled:
+                pass
+            except Exception as e:
+                self._results.put((job.generation, None, True, e))
+
+    def _poll(self):
+        """主线程：取出已交付的结果，只处理最新任务的最后一个结果"""
+        latest = None
+        try:
+            while True:
+                item = self._results.get_nowait()
+                if item[0] == self.generation:
+                    latest = item
+        except queue.Empty:
+            pass
+        if latest is not None:
+            _, result, final, error = latest
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(error)
+            else:
+                self.on_result(result, final)
+        self.root.after(self.poll_ms, self._poll)
+
+
+def render_scene(scene, preview=False, check=None):
+    """
+    在工作线程中渲染一帧视口图片
+    :param scene: 主线程在提交时收集的渲染参数快照 (dict)，包含
+        pyramid / transform (ratio, offset_x, offset_y) / canvas_size
+        mode: None (只显示底图)、'compare'、'heatmap'、'lod' 或 'draw'
+        objects / visible (勾选状态的副本) / hit_index / pred_objects / compare_result / heat_mode / options
+    :param preview: 生成快速预览
+    :param check: 无参回调，在底图缩放之后、标注绘制之前以及绘制过程中调用，任务作废时抛出 Cancelled
+    :return: 画布大小的 PIL 图片
+    """
+    if check is None:
+        check = _no_check
+    ratio, off_x, off_y = scene['transform']
+    if preview:
+        view = scene['pyramid'].render(ratio, off_x, off_y, scene['canvas_size'],
+                                       resample=Image.Resampling.NEAREST, level_bias=PREVIEW_LEVEL_BIAS)
+    else:
+        view = scene['pyramid'].render(ratio, off_x, off_y, scene['canvas_size'])
+
+    mode = scene['mode']
+    if mode is None:
+        return view
+    check()
+    options = dict(scene['options'])
+    if preview:
+        if mode != 'heatmap' and int(scene['visible'].sum()) > PREVIEW_MAX_OBJECTS:
+            return view
+        options['show_labels'] = False
+
+    objects, visible, transform = scene['objects'], scene['visible'], scene['transform']
+    with profiling.span('draw'):
+        if mode == 'compare':
+            compare.draw_comparison(view, objects, scene['pred_objects'], scene['compare_result'],
+                                    gt_visible=visible, transform=transform, show_labels=options['show_labels'],
+                                    line_width=options['line_width'], dota_mode=options['dota_mode'],
+                                    check=check)
+        elif mode == 'heatmap':
+            heatmap.draw_view(view, objects.geometry.envelopes, transform, visible, mode=scene['heat_mode'])
+        elif mode == 'lod' or preview:
+            # 预览统一走 LOD：视口外的目标被剔除，缩小时的小目标只画点
+            lod.draw_view(view, objects, transform, visible=visible, index=scene['hit_index'], check=check,
+                          **options)
+        else:
+            drawer.draw_on_image(view, objects, visible=visible, transform=transform, inplace=True, check=check,
+                                 **options)
+    return view
+
+
+def _no_check():
+    pass
+
+
+def render_job(scene):
+    """生成提交给 RenderWorker 的任务：先交付预览，再交付完整结果"""
+    def run(job):
+        if scene.get('preview', True):
+            with profiling.frame('preview'):
+                view = render_scene(scene, preview=True, check=job.check)
+            job.publish(view, final=False)
+        job.check()
+        with profiling.frame('redraw'):
+            view = render_scene(scene, check=job.check)
+        job.publish(view, final=True)
+    return run
@@ -0,0 +1,129 @@
+# spatial_index.py
+"""
+基于均匀网格的空间索引，用于点击命中测试与区域查询。
+每个目标按外接矩形 (HBB) 登记到它覆盖的所有网格中，查询时只对少量候选目标做精确判断。
+"""
+import numpy as np
+
+MAX_GRID_DIM = 1024
+
+
+class GridIndex:
+    def __init__(self, boxes, cell_size=None):
+        """
+        :param boxes: N×4 外接矩形数组 [x1, y1, x2, y2]
+        :param cell_size: 网格边长，默认取目标尺寸中位数的两倍
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        # 兼容 x1 > x2 的标注
+        self.boxes = np.column_stack([np.minimum(boxes[:, 0], boxes[:, 2]), np.minimum(boxes[:, 1], boxes[:, 3]),
+                                      np.maximum(boxes[:, 0], boxes[:, 2]), np.maximum(boxes[:, 1], boxes[:, 3])])
+        n = len(self.boxes)
+        if n == 0:
+            self.origin = (0.0, 0.0)
+            self.cell_size = 1.0
+            self.nx = self.ny = 0
+            self.items = np.zeros(0, dtype=np.int64)
+            self.starts = np.zeros(1, dtype=np.int64)
+            return
+
+        x0, y0 = self.boxes[:, 0].min(), self.boxes[:, 1].min()
+        extent = max(self.boxes[:, 2].max() - x0, self.boxes[:, 3].max() - y0, 1.0)
+        if cell_size is None:
+            sides = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+            cell_size = max(float(np.median(sides)) * 2, 1.0)
+        cell_size = max(cell_size, extent / MAX_GRID_DIM)
+
+        self.origin = (x0, y0)
+        self.cell_size = cell_size
+        self.nx = int(np.floor((self.boxes[:, 2].max() - x0) / cell_size)) + 1
+        self.ny = int(np.floor((self.boxes[:, 3].max() - y0) / cell_size)) + 1
+
+        gx0, gy0, gx1, gy1 = self._cell_range(self.boxes)
+        w = gx1 - gx0 + 1
+        counts = w * (gy1 - gy0 + 1)
+
+        # 向量化展开: 每个 (目标, 网格) 对一行，再按网格编号排序成 CSR 结构
+        obj_ids = np.repeat(np.arange(n), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        k = np.arange(len(obj_ids)) - first
+        cx = gx0[obj_ids] + k % w[obj_ids]
+        cy = gy0[obj_ids] + k // w[obj_ids]
+        cells = cy * self.nx + cx
+
+        order = np.argsort(cells, kind='stable')
+        self.items = obj_ids[order]
+        self.starts = np.searchsorted(cells[order], np.arange(self.nx * self.ny + 1))
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def _cell_range(self, boxes):
+        ox, oy = self.origin
+        cs = self.cell_size
+        gx0 = np.clip(np.floor((boxes[:, 0] - ox) / cs).astype(np.int64), 0, self.nx - 1)
+        gy0 = np.clip(np.floor((boxes[:, 1] - oy) / cs).astype(np.int64), 0, self.ny - 1)
+        gx1 = np.clip(np.floor((boxes[:, 2] - ox) / cs).astype(np.int64), 0, self.nx - 1)
+        gy1 = np.clip(np.floor((boxes[:, 3] - oy) / cs).astype(np.int64), 0, self.ny - 1)
+        return gx0, gy0, gx1, gy1
+
+    def query_point(self, x, y):
+        """返回外接矩形包含 (x, y) 的目标下标 (升序)"""
+        if self.nx == 0:
+            return np.zeros(0, dtype=np.int64)
+        ox, oy = self.origin
+        gx = int(np.floor((x - ox) / self.cell_size))
+        gy = int(np.floor((y - oy) / self.cell_size))
+        if not (0 <= gx < self.nx and 0 <= gy < self.ny):
+            return np.zeros(0, dtype=np.int64)
+
+        cell = gy * self.nx + gx
+        cand = self.items[self.starts[cell]:self.starts[cell + 1]]
+        b = self.boxes[cand]
+        hit = (b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3])
+        return np.sort(cand[hit])
+
+    def query_box(self, x1, y1, x2, y2):
+        """返回外接矩形与给定矩形相交的目标下标 (升序)"""
+        if self.nx == 0:
+            return np.zeros(0, dtype=np.int64)
+        gx0, gy0, gx1, gy1 = (int(v[0]) for v in self._cell_range(np.array([[x1, y1, x2, y2]], dtype=np.float64)))
+        ox, oy = self.origin
+        if x2 < ox or y2 < oy:
+            return np.zeros(0, dtype=np.int64)
+
+        rows = [self.items[self.starts[gy * self.nx + gx0]:self.starts[gy * self.nx + gx1 + 1]]
+                for gy in range(gy0, gy1 + 1)]
+        cand = np.unique(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+        b = self.boxes[cand]
+        hit = (b[:, 0] <= x2) & (x1 <= b[:, 2]) & (b[:, 1] <= y2) & (y1 <= b[:, 3])
+        return cand[hit]
+
+    def query_boxes(self, boxes):
+        """
+        批量查询：返回外接矩形与查询矩形相交的所有 (查询下标, 目标下标) 对，按查询下标升序，每对只出现一次
+        用于两组目标之间的候选配对 (例如真值与预测的 IoU 匹配)，无需逐个查询
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        n = len(self.boxes)
+        if self.nx == 0 or len(boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # 展开每个查询矩形覆盖的网格，再取出每个网格中登记的目标
+        gx0, gy0, gx1, gy1 = self._cell_range(boxes)
+        w = gx1 - gx0 + 1
+        counts = w * (gy1 - gy0 + 1)
+        q = np.repeat(np.arange(len(boxes)), counts)
+        k = np.arange(len(q)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (gy0[q] + k // w[q]) * self.nx + gx0[q] + k % w[q]
+
+        sizes = self.starts[cells + 1] - self.starts[cells]
+        pos = np.repeat(self.starts[cells] - (np.cumsum(sizes) - sizes), sizes) + np.arange(int(sizes.sum()))
+        q = np.repeat(q, sizes)
+        items = self.items[pos]
+
+        b, qb = self.boxes[items], boxes[q]
+        hit = (b[:, 0] <= qb[:, 2]) & (qb[:, 0] <= b[:, 2]) & (b[:, 1] <= qb[:, 3]) & (qb[:, 1] <= b[:, 3])
+        # 同一对可能在多个共同网格中出现
+        keys = np.unique(q[hit] * n + items[hit])
+        return keys // n, keys % n
@@ -0,0 +1,299 @@
+# split.py
+"""
+大图切分：把 DOTA / AI-TOD 图片切成相互重叠的定长切片 (默认 1024×1024、重叠 200 像素)，
+同时把标注裁剪到每个切片并按原格式写出，用于训练前的数据准备。
+
+- 切片窗口按步长 chip_size - overlap 滑动，最后一个窗口贴齐图片右/下边缘 (与 DOTA_devkit 一致)；
+  小于切片尺寸的图片在右/下方补零
+- 旋转框 (DOTA) 与矩形框 (AI-TOD) 被切片边界截断时，裁剪后剩余面积占原面积的比例低于 --min-area-ratio
+  的目标被丢弃；保留下来的截断目标裁剪到切片内，DOTA 多边形化简回 4 个顶点，难度记为 2 (DOTA_devkit 的约定)
+- 切片命名为 "原名__1__x___y"，可直接使用 DOTA_devkit 的合并脚本
+- 每张图片在进程池中处理，图片按窗口读取 (image_source)，分块 TIFF 不会整张解码
+
+用法:
+    python split.py --images DOTA/images --labels DOTA/labelTxt --dataset DOTA --output DOTA_split
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import geometry
+import image_source
+import parsers
+from batch_render import iter_bounded, iter_pairs
+
+SPLIT_FORMATS = ('DOTA', 'AI-TOD')
+LABEL_DIRS = {'DOTA': 'labelTxt', 'AI-TOD': 'labels'}
+TRUNCATED_DIFFICULTY = 2
+
+
+# ================= 切片窗口 =================
+def chip_origins(length, chip_size, stride):
+    """一个方向上各切片的起点，最后一个切片贴齐边缘"""
+    if length <= chip_size:
+        return [0]
+    origins = list(range(0, length - chip_size, stride))
+    origins.append(length - chip_size)
+    return origins
+
+
+def chip_windows(size, chip_size, overlap):
+    """
+    :param size: 图片尺寸 (w, h)
+    :return: [(x0, y0, x1, y1), ...]，x1 - x0 与 y1 - y0 不超过 chip_size (图片较小时为图片尺寸)
+    """
+    if not 0 <= overlap < chip_size:
+        raise ValueError("重叠像素数必须小于切片尺寸")
+    w, h = size
+    stride = chip_size - overlap
+    return [(x0, y0, min(x0 + chip_size, w), min(y0 + chip_size, h))
+            for y0 in chip_origins(h, chip_size, stride)
+            for x0 in chip_origins(w, chip_size, stride)]
+
+
+# ================= 标注裁剪 =================
+def clip_boxes(boxes, window, min_ratio):
+    """
+    把矩形框裁剪到窗口内
+    :param boxes: N×4 [x1, y1, x2, y2] (原图坐标)
+    :return: (保留目标的下标, 裁剪后的 M×4 坐标 (窗口坐标), 是否被截断的布尔数组)
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    x0, y0, x1, y1 = window
+    lo = np.minimum(boxes[:, :2], boxes[:, 2:])
+    hi = np.maximum(boxes[:, :2], boxes[:, 2:])
+    c_lo = np.maximum(lo, (x0, y0))
+    c_hi = np.minimum(hi, (x1, y1))
+    inter = np.clip(c_hi - c_lo, 0, None).prod(axis=1)
+    area = (hi - lo).prod(axis=1)
+    inside = (lo[:, 0] >= x0) & (lo[:, 1] >= y0) & (hi[:, 0] <= x1) & (hi[:, 1] <= y1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(area > 0, inter / area, 0.0)
+    keep = inside | ((inter > 0) & (ratio >= min_ratio))
+    index = np.flatnonzero(keep)
+    out = np.where(inside[index, None], boxes[index], np.hstack([c_lo, c_hi])[index])
+    return index, out - (x0, y0, x0, y0), ~inside[index]
+
+
+def clip_polygon(points, window):
+    """Sutherland–Hodgman 算法把一个多边形裁剪到矩形窗口内，返回顶点列表 (可能为空)"""
+    x0, y0, x1, y1 = window
+    # (坐标轴, 边界值, 保留 >= 边界的一侧)
+    for axis, bound, keep_greater in ((0, x0, True), (0, x1, False), (1, y0, True), (1, y1, False)):
+        if not points:
+            break
+        result = []
+        prev = points[-1]
+        prev_in = (prev[axis] >= bound) if keep_greater else (prev[axis] <= bound)
+        for cur in points:
+            cur_in = (cur[axis] >= bound) if keep_greater else (cur[axis] <= bound)
+            if cur_in != prev_in:
+                t = (bound - prev[axis]) / (cur[axis] - prev[axis])
+                cross = (prev[0] + t * (cur[0] - prev[0]), prev[1] + t * (cur[1] - prev[1]))
+                result.append(cross)
+            if cur_in:
+                result.append(cur)
+            prev, prev_in = cur, cur_in
+        points = result
+    return points
+
+
+def _area(points):
+    pts = np.asarray(points, dtype=np.float64)
+    return float(geometry.polygon_area(pts[None])[0])
+
+
+def to_quad(points, first):
+    """
+    把裁剪后的多边形化简为 4 个顶点：多于 4 个时反复把最短边合并为其中点，3 个时在最长边中点插入顶点
+    起始顶点取离原多边形第一个顶点最近的一个，保持 DOTA 的顶点顺序习惯
+    """
+    points = [tuple(p) for p in points]
+    while len(points) > 4:
+        n = len(points)
+        lengths = [np.hypot(points[(i + 1) % n][0] - points[i][0], points[(i + 1) % n][1] - points[i][1])
+                   for i in range(n)]
+        i = int(np.argmin(lengths))
+        j = (i + 1) % n
+        mid = ((points[i][0] + points[j][0]) / 2, (points[i][1] + points[j][1]) / 2)
+        points[i] = mid
+        del points[j]
+    if len(points) == 3:
+        lengths = [np.hypot(points[(i + 1) % 3][0] - points[i][0], points[(i + 1) % 3][1] - points[i][1])
+                   for i in range(3)]
+        i = int(np.argmax(lengths))
+        j = (i + 1) % 3
+        points.insert(i + 1, ((points[i][0] + points[j][0]) / 2, (points[i][1] + points[j][1]) / 2))
+    start = int(np.argmin([np.hypot(p[0] - first[0], p[1] - first[1]) for p in points]))
+    return points[start:] + points[:start]
+
+
+def clip_polygons(coords, window, min_ratio):
+    """
+    把四边形裁剪到窗口内；完全在窗口内的目标 (绝大多数) 向量化处理，只有跨越切片边界的目标逐个裁剪
+    :param coords: N×8 [x1, y1, ..., x4, y4] (原图坐标)
+    :return: (保留目标的下标, M×8 坐标 (窗口坐标), 是否被截断的布尔数组)
+    """
+    verts = geometry.poly_vertices(np.asarray(coords, dtype=np.float64).reshape(-1, 8))
+    env = geometry.envelopes(verts)
+    x0, y0, x1, y1 = window
+    touch = (env[:, 0] < x1) & (env[:, 2] > x0) & (env[:, 1] < y1) & (env[:, 3] > y0)
+    inside = (env[:, 0] >= x0) & (env[:, 1] >= y0) & (env[:, 2] <= x1) & (env[:, 3] <= y1)
+
+    index = [np.flatnonzero(inside)]
+    out = [verts[index[0]].reshape(-1, 8)]
+    partial = np.flatnonzero(touch & ~inside)
+    if len(partial):
+        areas = geometry.polygon_area(verts[partial])
+        kept, quads = [], []
+        for i, area in zip(partial.tolist(), areas.tolist()):
+            clipped = clip_polygon(verts[i].tolist(), window)
+            if len(clipped) < 3 or area <= 0 or _area(clipped) < min_ratio * area:
+                continue
+            kept.append(i)
+            quads.append(to_quad(clipped, verts[i, 0]))
+        if kept:
+            index.append(np.array(kept, dtype=np.int64))
+            out.append(np.array(quads, dtype=np.float64).reshape(-1, 8))
+
+    index = np.concatenate(index)
+    out = np.concatenate(out) - np.tile((x0, y0), 4)
+    truncated = np.zeros(len(index), dtype=bool)
+    truncated[np.count_nonzero(inside):] = True
+    order = np.argsort(index, kind='stable')  # 保持原文件中的目标顺序
+    return index[order], out[order], truncated[order]
+
+
+# ================= 写出 =================
+def format_lines(dataset, coords, class_names, difficulty):
+    """按原格式生成标注行 (坐标保留一位小数)"""
+    lines = []
+    for row, name, diff in zip(coords.tolist(), class_names, difficulty):
+        text = ' '.join(f"{v:.1f}" for v in row)
+        lines.append(f"{text} {name} {diff}" if dataset == 'DOTA' else f"{text} {name}")
+    return lines
+
+
+def chip_stem(stem, window):
+    """DOTA_devkit 的切片命名 (缩放比例固定为 1)"""
+    return f"{stem}__1__{window[0]}___{window[1]}"
+
+
+def split_one(task):
+    """
+    工作进程：切分一张图片及其标注
+    :return: (image_path, 切片数, 写出的目标数, 错误信息或 None)
+    """
+    image_path, label_path, image_dir, label_dir, options = task
+    source = None
+    try:
+        source = image_source.open_source(image_path)
+        columns = parsers.parse_label_columns(label_path, options['dataset'], source.size,
+                                              os.path.basename(image_path))
+        coords = columns['coords']
+        names = np.array(columns['class_names'], dtype=object)[columns['class_ids']] if len(coords) else []
+        clip = clip_polygons if columns['type'] == 'poly' else clip_boxes
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        chip_size = options['chip_size']
+
+        n_chips = n_objects = 0
+        for window in chip_windows(source.size, chip_size, options['overlap']):
+            index, chip_coords, truncated = clip(coords, window, options['min_ratio'])
+            if options['skip_empty'] and not len(index):
+                continue
+            difficulty = np.where(truncated, TRUNCATED_DIFFICULTY, columns['difficulty'][index])
+            lines = format_lines(options['dataset'], chip_coords, [names[i] for i in index], difficulty.tolist())
+
+            chip = source.read_region(0, window)
+            if options['pad'] and chip.size != (chip_size, chip_size):
+                padded = Image.new(chip.mode, (chip_size, chip_size))
+                padded.paste(chip, (0, 0))
+                chip = padded
+            name = chip_stem(stem, window)
+            out_image = os.path.join(image_dir, name + (options['ext'] or os.path.splitext(image_path)[1]))
+            if out_image.lower().endswith(('.jpg', '.jpeg')) and chip.mode not in ('RGB', 'L'):
+                chip = chip.convert('RGB')
+            chip.save(out_image)
+            with open(os.path.join(label_dir, name + '.txt'), 'w', encoding='utf-8') as f:
+                f.write(''.join(line + '\n' for line in lines))
+            n_chips += 1
+            n_objects += len(lines)
+        return image_path, n_chips, n_objects, None
+    except Exception as e:
+        return image_path, 0, 0, str(e)
+    finally:
+        if source is not None:
+            source.close()
+
+
+def iter_tasks(args, image_dir, label_dir, options):
+    for image_path, label_path in iter_pairs(args.images, args.labels, args.dataset):
+        yield image_path, label_path, image_dir, label_dir, options
+
+
+def run(args):
+    image_dir = os.path.join(args.output, 'images')
+    label_dir = os.path.join(args.output, LABEL_DIRS[args.dataset])
+    os.makedirs(image_dir, exist_ok=True)
+    os.makedirs(label_dir, exist_ok=True)
+    options = {
+        'dataset': args.dataset,
+        'chip_size': args.chip_size,
+        'overlap': args.overlap,
+        'min_ratio': args.min_area_ratio,
+        'ext': args.ext,
+        'pad': not args.no_pad,
+        'skip_empty': args.skip_empty
+    }
+    chip_windows((1, 1), args.chip_size, args.overlap)  # 参数检查
+
+    workers = args.workers or os.cpu_count() or 1
+    max_pending = workers * 2
+
+    done, failed, chips, objects = 0, 0, 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for image_path, n_chips, n_objects, error in iter_bounded(
+                pool, split_one, iter_tasks(args, image_dir, label_dir, options), max_pending):
+            if error:
+                failed += 1
+                print(f"[失败] {os.path.basename(image_path)}: {error}", file=sys.stderr)
+            else:
+                done += 1
+                chips += n_chips
+                objects += n_objects
+                if not args.quiet:
+                    print(f"[完成] {os.path.basename(image_path)} ({n_chips} 个切片, {n_objects} 个目标)")
+
+    print(f"共切分 {done} 张图片，得到 {chips} 个切片、{objects} 个目标，失败 {failed} 张")
+    return 0 if failed == 0 else 1
+
+
+def build_arg_parser():
+    p = argparse.ArgumentParser(description="大图切片 (标注随之裁剪)")
+    p.add_argument('--images', required=True, help="图片目录")
+    p.add_argument('--labels', required=True, help="标注目录 (与图片同名的 .txt)")
+    p.add_argument('--output', required=True, help="输出目录 (其下生成 images/ 与 labelTxt/ 或 labels/)")
+    p.add_argument('--dataset', required=True, choices=SPLIT_FORMATS, help="数据集类型")
+    p.add_argument('--chip-size', type=int, default=1024, help="切片边长 (像素)")
+    p.add_argument('--overlap', type=int, default=200, help="相邻切片的重叠像素数")
+    p.add_argument('--min-area-ratio', type=float, default=0.7,
+                   help="被截断的目标保留在切片内的面积比例低于该值时丢弃")
+    p.add_argument('--ext', default='.png', help="切片图片扩展名 (为空时与原图相同)")
+    p.add_argument('--no-pad', action='store_true', help="小于切片尺寸的图片不补零")
+    p.add_argument('--skip-empty', action='store_true', help="不输出没有目标的切片")
+    p.add_argument('--workers', type=int, default=0, help="进程数，默认使用全部 CPU 核心")
+    p.add_argument('--quiet', action='store_true', help="只输出错误与汇总")
+    return p
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+# stats.py
+"""
+数据集统计：多进程流式解析所有标注文件，使用可合并的累加器汇总
+(计数、固定分箱直方图、对数分箱的近似分位数)，内存占用与目标总数无关。
+
+用法:
+    python stats.py --labels AI-TOD/labels --images AI-TOD/images --dataset AI-TOD --json report.json --csv report.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import geometry
+import image_source
+import parsers
+from batch_render import IMAGE_EXTS, iter_bounded
+
+FILES_PER_TASK = 64
+UNBOUNDED_SIZE = (1 << 30, 1 << 30)  # 找不到图片或需要保留越界目标时解析使用的尺寸
+# AI-TOD 尺度划分 (按 sqrt(面积)): very tiny / tiny / small / medium+
+SIZE_BUCKET_EDGES = [0, 8, 16, 32, np.inf]
+SIZE_BUCKET_NAMES = ['very_tiny', 'tiny', 'small', 'medium+']
+ASPECT_EDGES = [1, 1.5, 2, 3, 4, 6, 8, 12, 16, np.inf]
+OBJECTS_PER_IMAGE_EDGES = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, np.inf]
+
+
+def _num(value):
+    """JSON 中用 null 表示 inf / nan"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class FixedHistogram:
+    """固定分箱直方图，合并时直接相加"""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        idx = np.searchsorted(self.edges, values, side='right') - 1
+        idx = np.clip(idx, 0, len(self.counts) - 1)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    def to_dict(self):
+        return {'edges': [_num(e) for e in self.edges], 'counts': self.counts.tolist()}
+
+
+class LogHistogram(FixedHistogram):
+    """
+    对数分箱直方图，用于近似分位数
+    每个十倍程 per_decade 个分箱，相对误差约为 10^(1/per_decade) - 1
+    """
+
+    def __init__(self, lo=0.1, hi=1e5, per_decade=24):
+        decades = np.log10(hi) - np.log10(lo)
+        super().__init__(np.logspace(np.log10(lo), np.log10(hi), int(decades * per_decade) + 1))
+        self.total = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        super().add(np.clip(values, self.edges[0], self.edges[-1]))
+        self.total += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        super().merge(other)
+        self.total += other.total
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if self.total == 0:
+            return float('nan')
+        target = q * self.total
+        cum = np.cumsum(self.counts)
+        b = int(np.searchsorted(cum, target, side='left'))
+        b = min(b, len(self.counts) - 1)
+        prev = cum[b - 1] if b > 0 else 0
+        frac = (target - prev) / self.counts[b] if self.counts[b] else 0.0
+        lo, hi = self.edges[b], self.edges[b + 1]
+        value = lo * (hi / lo) ** frac  # 分箱内按几何插值
+        return float(min(max(value, self.min), self.max))
+
+    def summary(self):
+        if self.total == 0:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None, 'p10': None, 'p50': None, 'p90': None}
+        return {
+            'count': int(self.total),
+            'mean': self.sum / self.total,
+            'min': self.min,
+            'max': self.max,
+            'p10': self.quantile(0.1),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9)
+        }
+
+
+def object_geometry(columns):
+    """
+    由列式解析结果计算每个目标的尺寸 sqrt(面积)、长宽比与外接矩形
+    :return: (size, aspect, hbb)
+    """
+    verts = geometry.vertices_from_columns(columns)
+    area = geometry.polygon_area(verts)
+    long_side, short_side = geometry.side_lengths(verts)
+    hbb = geometry.envelopes(verts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aspect = np.where(short_side > 0, long_side / short_side, np.inf)
+    return np.sqrt(area), aspect, hbb
+
+
+class DatasetStats:
+    def __init__(self):
+        self.n_images = 0
+        self.n_failed = 0
+        self.n_objects = 0
+        self.n_out_of_bounds = 0
+        self.n_unknown_size = 0  # 找不到对应图片、无法做越界检查的标注文件
+        self.n_dropped_files = 0  # 解析时已有目标因越界被丢弃的标注文件 (按真实尺寸解析的 AI-TOD)
+        self.class_counts = Counter()
+        self.objects_per_image = FixedHistogram(OBJECTS_PER_IMAGE_EDGES)
+        self.size = LogHistogram()
+        self.aspect = FixedHistogram(ASPECT_EDGES)
+        self.class_size = {}
+        self.class_buckets = {}
+
+    def add_columns(self, columns, img_size=None):
+        """
+        :param columns: parsers.parse_label_columns 的结果；越界目标需要计入统计时按极大尺寸解析 (见 _stats_batch)
+        :param img_size: 图片的真实尺寸，用于越界检查；为 None 时跳过检查
+        """
+        self.n_images += 1
+        if columns.get('is_bounds_error'):
+            self.n_dropped_files += 1
+        n = len(columns['coords'])
+        self.n_objects += n
+        self.objects_per_image.add([n])
+        if n == 0:
+            return
+
+        size, aspect, hbb = object_geometry(columns)
+        self.size.add(size)
+        self.aspect.add(aspect)
+
+        if img_size is None:
+            self.n_unknown_size += 1
+        else:
+            w, h = img_size
+            oob = (hbb[:, 0] < 0) | (hbb[:, 1] < 0) | (hbb[:, 2] > w) | (hbb[:, 3] > h)
+            self.n_out_of_bounds += int(oob.sum())
+
+        class_ids = columns['class_ids']
+        for cid, name in enumerate(columns['class_names']):
+            sel = class_ids == cid
+            count = int(sel.sum())
+            if not count: continue
+            self.class_counts[name] += count
+            if name not in self.class_size:
+                self.class_size[name] = LogHistogram()
+                self.class_buckets[name] = FixedHistogram(SIZE_BUCKET_EDGES)
+            self.class_size[name].add(size[sel])
+            self.class_buckets[name].add(size[sel])
+
+    def merge(self, other):
+        self.n_images += other.n_images
+        self.n_failed += other.n_failed
+        self.n_objects += other.n_objects
+        self.n_out_of_bounds += other.n_out_of_bounds
+        self.n_unknown_size += other.n_unknown_size
+        self.n_dropped_files += other.n_dropped_files
+        self.class_counts.update(other.class_counts)
+        self.objects_per_image.merge(other.objects_per_image)
+        self.size.merge(other.size)
+        self.aspect.merge(other.aspect)
+        for name, hist in other.class_size.items():
+            if name in self.class_size:
+                self.class_size[name].merge(hist)
+                self.class_buckets[name].merge(other.class_buckets[name])
+            else:
+                self.class_size[name] = hist
+                self.class_buckets[name] = other.class_buckets[name]
+
+    def class_rows(self):
+        """每个类别一行的汇总，供 CSV 与界面表格使用"""
+        rows = []
+        for name, count in self.class_counts.most_common():
+            s = self.class_size[name].summary()
+            buckets = self.class_buckets[name].counts
+            row = {'class': name, 'count': count,
+                   'size_p10': s['p10'], 'size_p50': s['p50'], 'size_p90': s['p90']}
+            for bucket_name, c in zip(SIZE_BUCKET_NAMES, buckets):
+                row[f'{bucket_name}_ratio'] = c / count
+            rows.append(row)
+        return rows
+
+    def to_dict(self):
+        return {
+            'images': self.n_images,
+            'failed_files': self.n_failed,
+            'objects': self.n_objects,
+            'out_of_bounds': self.n_out_of_bounds,
+            'files_without_image': self.n_unknown_size,
+            'files_with_dropped_objects': self.n_dropped_files,
+            'objects_per_image': self.objects_per_image.to_dict(),
+            'size': self.size.summary(),
+            'aspect_ratio': self.aspect.to_dict(),
+            'size_buckets': SIZE_BUCKET_NAMES,
+            'classes': self.class_rows()
+        }
+
+
+# ================= 并行统计 =================
+def find_image(image_dir, stem):
+    if not image_dir:
+        return None
+    for ext in IMAGE_EXTS:
+        path = os.path.join(image_dir, stem + ext)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def parse_size(label_path, dataset_type, size):
+    """
+    解析标注时使用的图片尺寸
+    找不到图片 (size 为 None) 时用极大尺寸，避免 AI-TOD 的越界检查丢弃目标；
+    比例坐标的格式 (YOLO 等) 没有真实尺寸无法换算为像素，抛出 ValueError，由调用方按失败计
+    """
+    if size is not None:
+        return size
+    if parsers.FORMATS[parsers.resolve_format(label_path, dataset_type)].normalized:
+        raise ValueError("比例坐标的标注需要图片尺寸，未找到对应图片")
+    return UNBOUNDED_SIZE
+
+
+def iter_label_files(label_dir, dataset_type=None):
+    """目录中的标注文件，扩展名取自格式注册表 (YOLO 的类别名文件除外)"""
+    exts = parsers.label_extensions(dataset_type)
+    with os.scandir(label_dir) as it:
+        for entry in it:
+            name = entry.name.lower()
+            if os.path.splitext(name)[1] in exts and name not in parsers.YOLO_NAME_FILES and entry.is_file():
+                yield entry.path
+
+
+def _stats_batch(task):
+    label_paths, image_dir, dataset_type = task
+    stats = DatasetStats()
+    for label_path in label_paths:
+        stem = os.path.splitext(os.path.basename(label_path))[0]
+        try:
+            img_path = find_image(image_dir, stem)
+            size = image_source.image_size(img_path) if img_path else None
+            fmt = parsers.FORMATS[parsers.resolve_format(label_path, dataset_type)]
+            # 像素坐标按极大尺寸解析 (与 integrity 相同)，AI-TOD 远超图片范围的目标不会被丢弃，由 add_columns 计入越界
+            parse = parse_size(label_path, fmt.name, size) if fmt.normalized else UNBOUNDED_SIZE
+            columns = parsers.parse_label_columns(label_path, fmt.name, parse)
+            stats.add_columns(columns, size)
+        except Exception:
+            stats.n_failed += 1
+    return stats
+
+
+def _batched(iterable, n):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == n:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def compute_stats(label_dir, dataset_type, image_dir=None, workers=None, progress=None):
+    """
+    :param progress: 可选回调 progress(已处理文件数)
+    """
+    workers = workers or os.cpu_count() or 1
+    total = DatasetStats()
+    tasks = ((batch, image_dir, dataset_type) for batch in _batched(iter_label_files(label_dir, dataset_type), FILES_PER_TASK))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in iter_bounded(pool, _stats_batch, tasks, workers * 2):
+            total.merge(partial)
+            if progress:
+                progress(total.n_images + total.n_failed)
+    return total
+
+
+def write_json(stats, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def write_csv(stats, path):
+    rows = stats.class_rows()
+    if not rows:
+        return
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="数据集统计")
+    p.add_argument('--labels', required=True, help="标注目录")
+    p.add_argument('--images', default=None, help="图片目录 (用于越界检查，可选)")
+    p.add_argument('--dataset', required=True, choices=parsers.format_names(auto=True),
+                   help="数据集类型 (auto 为按文件内容自动识别)")
+    p.add_argument('--json', default=None, help="输出 JSON 报告路径")
+    p.add_argument('--csv', default=None, help="输出按类别汇总的 CSV 路径")
+    p.add_argument('--workers', type=int, default=None, help="进程数，默认使用全部 CPU 核心")
+    args = p.parse_args(argv)
+
+    stats = compute_stats(args.labels, args.dataset, args.images, args.workers)
+    if args.json:
+        write_json(stats, args.json)
+    if args.csv:
+        write_csv(stats, args.csv)
+    if not args.json:
+        print(json.dumps(stats.to_dict(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""真值与预测对比：旋转框 IoU"""
+import numpy as np
+import pytest
+
+import compare
+
+
+def _quad(*points):
+    return np.array(points, dtype=np.float64)
+
+
+SQUARE = _quad((0, 0), (10, 0), (10, 10), (0, 10))
+
+
+@pytest.mark.parametrize('other, expected', [
+    (SQUARE, 1.0),
+    (SQUARE[::-1], 1.0),                                      # 顶点方向相反
+    (SQUARE + (5, 0), 50 / 150),                              # 平移半个边长
+    (SQUARE + (5, 5), 25 / 175),                              # 只有一个角重叠
+    (SQUARE + (10, 0), 0.0),                                  # 只共享一条边
+    (SQUARE + (30, 30), 0.0),                                 # 完全分离
+    (_quad((5, 0), (10, 5), (5, 10), (0, 5)), 50 / 100),      # 内接的 45° 菱形
+    (_quad((5, -5), (15, 5), (5, 15), (-5, 5)), 100 / 200),   # 外接的 45° 菱形
+    (_quad((2, 2), (8, 2), (8, 8), (2, 8)), 36 / 100),        # 包含关系
+])
+def test_obb_iou_known_overlaps(other, expected):
+    iou = compare.obb_iou(SQUARE[None], other[None])
+    assert iou == pytest.approx([expected], abs=1e-9)
+    # IoU 与参数顺序无关
+    assert compare.obb_iou(other[None], SQUARE[None]) == pytest.approx([expected], abs=1e-9)
+
+
+def test_obb_iou_is_pairwise():
+    """批量输入逐对计算，且结果与 HBB IoU 在轴对齐矩形上一致"""
+    rng = np.random.default_rng(0)
+    lo = rng.uniform(0, 50, (200, 2))
+    hi = lo + rng.uniform(1, 30, (200, 2))
+    a = np.hstack([lo, hi])
+    b_lo = lo + rng.uniform(-10, 10, (200, 2))
+    b = np.hstack([b_lo, b_lo + rng.uniform(1, 30, (200, 2))])
+
+    def corners(boxes):
+        x1, y1, x2, y2 = boxes.T
+        return np.stack([np.column_stack(p) for p in ((x1, y1), (x2, y1), (x2, y2), (x1, y2))], axis=1)
+
+    np.testing.assert_allclose(compare.obb_iou(corners(a), corners(b)), compare.hbb_iou(a, b), atol=1e-9)
@@ -0,0 +1,58 @@
+"""分块导出与整图绘制逐像素一致"""
+import numpy as np
+import pytest
+from PIL import Image
+
+import export
+import image_source
+import parsers
+from annotations import AnnotationSet
+
+SIZE = (700, 600)
+
+
+def _load(tmp_path, lines):
+    path = tmp_path / 'labels.txt'
+    path.write_text('\n'.join(lines) + '\n')
+    return AnnotationSet.from_columns(parsers.parse_label_columns(str(path), 'DOTA', SIZE))
+
+
+def _diamond(cx, cy, r):
+    """边与坐标轴成 45° 的四边形"""
+    coords = [cx, cy - r, cx + r, cy, cx, cy + r, cx - r, cy]
+    return ' '.join(f"{v:.1f}" for v in coords) + ' plane 0'
+
+
+def _source():
+    pixels = np.random.default_rng(1).integers(0, 255, (SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    return image_source.MemorySource(Image.fromarray(pixels))
+
+
+@pytest.mark.parametrize('line_style', ['dashed_loose', 'dashed_dense'])
+@pytest.mark.parametrize('line_width', [1, 3])
+def test_dashed_45_degree_quads_are_seamless(tmp_path, line_style, line_width):
+    rng = np.random.default_rng(0)
+    lines = [_diamond(250.3, 260.7, 62.3)]  # 跨越图块边界的 45° 边
+    lines += [_diamond(round(rng.uniform(70, SIZE[0] - 70), 1), round(rng.uniform(70, SIZE[1] - 70), 1),
+                       round(rng.uniform(5, 60), 1)) for _ in range(80)]
+    objects = _load(tmp_path, lines)
+    options = dict(line_style=line_style, line_width=line_width, dota_mode='OBB')
+    for tile_size in (128, 200):
+        assert export.verify_tiles(_source(), objects, draw_options=options, tile_size=tile_size) == 0
+
+
+@pytest.mark.parametrize('dota_mode', ['OBB', 'HBB'])
+@pytest.mark.parametrize('line_style', ['solid', 'dashed_loose'])
+def test_random_objects_with_labels_are_seamless(tmp_path, dota_mode, line_style):
+    rng = np.random.default_rng(2)
+    lines = []
+    for _ in range(150):
+        cx, cy = rng.uniform(0, SIZE[0]), rng.uniform(0, SIZE[1])
+        w, h, angle = rng.uniform(4, 120), rng.uniform(4, 80), rng.uniform(0, np.pi)
+        c, s = np.cos(angle), np.sin(angle)
+        corners = [(cx + dx * c - dy * s, cy + dx * s + dy * c)
+                   for dx, dy in ((-w / 2, -h / 2), (w / 2, -h / 2), (w / 2, h / 2), (-w / 2, h / 2))]
+        lines.append(' '.join(f"{v:.1f}" for p in corners for v in p) + f" class{rng.integers(5)} 0")
+    objects = _load(tmp_path, lines)
+    options = dict(line_style=line_style, line_width=2, dota_mode=dota_mode, show_labels=True)
+    assert export.verify_tiles(_source(), objects, draw_options=options, tile_size=160) == 0
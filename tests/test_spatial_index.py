@@ -0,0 +1,53 @@
+"""网格空间索引：与逐个比较的结果一致"""
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex
+
+
+def _random_boxes(rng, n, lo=-50, hi=550):
+    xy = rng.uniform(lo, hi, (n, 2))
+    wh = rng.exponential(15, (n, 2))
+    wh[rng.random(n) < 0.05] *= 20  # 少量大目标跨越许多网格
+    return np.hstack([xy, xy + wh])
+
+
+def _brute_force(boxes, queries):
+    b, q = boxes[None], queries[:, None]
+    hit = (b[..., 0] <= q[..., 2]) & (q[..., 0] <= b[..., 2]) & (b[..., 1] <= q[..., 3]) & (q[..., 1] <= b[..., 3])
+    return np.nonzero(hit)
+
+
+@pytest.mark.parametrize('cell_size', [None, 0.5, 7.0, 1000.0])
+def test_query_boxes_matches_brute_force(cell_size):
+    rng = np.random.default_rng(0)
+    boxes = _random_boxes(rng, 500)
+    boxes[:10, 2:] = boxes[:10, :2]  # 退化为点的目标
+    # 查询框包含完全在索引范围外的框
+    queries = _random_boxes(rng, 300, lo=-200, hi=700)
+    index = GridIndex(boxes, cell_size=cell_size)
+
+    q, items = index.query_boxes(queries)
+    expected_q, expected_items = _brute_force(boxes, queries)
+    assert q.tolist() == expected_q.tolist()
+    assert items.tolist() == expected_items.tolist()
+
+    for i in range(0, len(queries), 17):
+        assert index.query_box(*queries[i]).tolist() == expected_items[expected_q == i].tolist()
+
+
+def test_reversed_boxes_and_points():
+    rng = np.random.default_rng(1)
+    boxes = _random_boxes(rng, 200)
+    index = GridIndex(boxes[:, [2, 3, 0, 1]])  # x1 > x2 的标注按外接矩形登记
+    for x, y in rng.uniform(-50, 600, (200, 2)):
+        hit = (boxes[:, 0] <= x) & (x <= boxes[:, 2]) & (boxes[:, 1] <= y) & (y <= boxes[:, 3])
+        assert index.query_point(x, y).tolist() == np.flatnonzero(hit).tolist()
+
+
+def test_empty_index():
+    index = GridIndex(np.zeros((0, 4)))
+    q, items = index.query_boxes([[0, 0, 10, 10]])
+    assert len(q) == len(items) == 0
+    assert len(index.query_box(0, 0, 10, 10)) == 0
+    assert len(index.query_point(0, 0)) == 0
@@ -0,0 +1,64 @@
+"""数据集切片：跨越切片边界的目标裁剪"""
+import numpy as np
+import pytest
+
+import geometry
+import split
+
+
+def _rect(x1, y1, x2, y2):
+    return [x1, y1, x2, y1, x2, y2, x1, y2]
+
+
+def test_clip_polygons_at_chip_boundary():
+    coords = np.array([
+        _rect(10, 10, 30, 30),     # 0: 完全在左侧切片内
+        _rect(90, 10, 110, 30),    # 1: 跨越 x=100，两侧各一半
+        _rect(98, 40, 118, 60),    # 2: 只有 10% 在左侧切片内
+        _rect(150, 10, 170, 30),   # 3: 完全在右侧切片内
+        _rect(40, 90, 60, 110),    # 4: 跨越下边界 y=100，窗口外部分被裁掉
+    ], dtype=np.float64)
+
+    index, out, truncated = split.clip_polygons(coords, (0, 0, 100, 100), min_ratio=0.3)
+    assert index.tolist() == [0, 1, 4]
+    assert truncated.tolist() == [False, True, True]
+    np.testing.assert_allclose(out[0], _rect(10, 10, 30, 30))
+    np.testing.assert_allclose(out[1], _rect(90, 10, 100, 30))
+    np.testing.assert_allclose(out[2], _rect(40, 90, 60, 100))
+
+    # 右侧切片：输出为切片内坐标
+    index, out, truncated = split.clip_polygons(coords, (100, 0, 200, 100), min_ratio=0.3)
+    assert index.tolist() == [1, 2, 3]
+    assert truncated.tolist() == [True, True, False]
+    np.testing.assert_allclose(out[0], _rect(0, 10, 10, 30))
+    np.testing.assert_allclose(out[1], _rect(0, 40, 18, 60))
+    np.testing.assert_allclose(out[2], _rect(50, 10, 70, 30))
+
+
+def test_clip_polygons_keeps_vertex_order_and_area():
+    """旋转框被边界截断后化简为四边形：起点靠近原第一个顶点，顶点都在窗口内，面积不超过裁剪前"""
+    diamond = np.array([[100, 40, 120, 60, 100, 80, 80, 60]], dtype=np.float64)
+    window = (0, 0, 100, 100)
+    index, out, truncated = split.clip_polygons(diamond, window, min_ratio=0.3)
+    assert index.tolist() == [0] and truncated.tolist() == [True]
+
+    quad = out[0].reshape(4, 2)
+    assert quad[:, 0].min() >= 80 - 1e-9 and quad[:, 0].max() <= 100 + 1e-9
+    np.testing.assert_allclose(quad[0], (100, 40))
+    # 左半个菱形是三角形 (面积 400)，补出的第四个顶点在最长边上，面积不变
+    assert abs(geometry.polygon_area(quad[None])[0]) == pytest.approx(400)
+
+
+@pytest.mark.parametrize('min_ratio', [0.0, 0.5, 0.9])
+def test_clip_polygons_matches_chip_boxes(min_ratio):
+    """轴对齐矩形按多边形裁剪的结果与 clip_boxes 一致"""
+    rng = np.random.default_rng(1)
+    lo = rng.uniform(-20, 220, (300, 2))
+    boxes = np.hstack([lo, lo + rng.uniform(1, 40, (300, 2))])
+    rects = np.array([_rect(*b) for b in boxes])
+    for window in split.chip_windows((200, 200), 100, 20):
+        p_index, p_out, p_trunc = split.clip_polygons(rects, window, min_ratio)
+        b_index, b_out, b_trunc = split.clip_boxes(boxes, window, min_ratio)
+        assert p_index.tolist() == b_index.tolist()
+        assert p_trunc.tolist() == b_trunc.tolist()
+        np.testing.assert_allclose(p_out[:, [0, 1, 4, 5]], b_out, atol=1e-9)
@@ -0,0 +1,27 @@
+"""数据集统计：越界检查"""
+from PIL import Image
+
+import stats
+
+
+def test_far_out_of_range_aitod_rows_are_counted(tmp_path):
+    labels, images = tmp_path / 'labels', tmp_path / 'images'
+    labels.mkdir()
+    images.mkdir()
+    Image.new('RGB', (100, 80)).save(images / 'a.png')
+    (labels / 'a.txt').write_text(
+        "10 10 20 20 car\n"       # 图内
+        "90 70 120 90 car\n"      # 部分越界
+        "400 10 420 30 ship\n")   # 超出图片宽度 50px 以上，按真实尺寸解析时会被丢弃
+    result = stats.compute_stats(str(labels), 'AI-TOD', str(images), workers=1)
+    assert result.n_objects == 3
+    assert result.n_out_of_bounds == 2
+    assert result.class_counts == {'car': 2, 'ship': 1}
+    assert result.to_dict()['files_with_dropped_objects'] == 0
+
+
+def test_bounds_error_flag_is_reported():
+    columns = {'coords': [], 'is_bounds_error': True}
+    result = stats.DatasetStats()
+    result.add_columns(columns, (100, 100))
+    assert result.to_dict()['files_with_dropped_objects'] == 1
@@ -0,0 +1,183 @@
+# tiles.py
+"""
+分块金字塔渲染：重绘时只读取、拼接与当前视口相交的图块，图块保存在 LRU 缓存中。
+各层图块按需从图像数据源 (image_source) 读取，大图无需整张解码进内存。
+"""
+import itertools
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+import image_source
+import profiling
+
+TILE_SIZE = 512
+
+
+class TileCache:
+    """按字节数限制容量的 LRU 图块缓存，可被多个金字塔共享"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(tile):
+        w, h = tile.size
+        return w * h * len(tile.getbands())
+
+    def get(self, key):
+        with self._lock:
+            tile = self._items.get(key)
+            if tile is not None:
+                self._items.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = tile
+            self._bytes += self._sizeof(tile)
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= self._sizeof(old)
+
+    def drop(self, owner):
+        """移除某个金字塔的全部图块 (切换图片时调用)"""
+        with self._lock:
+            for key in [k for k in self._items if k[0] == owner]:
+                self._bytes -= self._sizeof(self._items.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+# 所有金字塔共享一个缓存，总内存占用与打开过多少张图片无关
+DEFAULT_CACHE = TileCache()
+
+
+class ImagePyramid:
+    """
+    多分辨率图像金字塔
+    level 0 为原图，level k 为原图的 1/2^k，直到最长边不超过一个图块
+    """
+    _ids = itertools.count()
+
+    def __init__(self, source, tile_size=TILE_SIZE, cache=None):
+        """
+        :param source: image_source.ImageSource，或已打开的 PIL 图片
+        """
+        self.tile_size = tile_size
+        self.cache = cache or DEFAULT_CACHE
+        self.owner = next(ImagePyramid._ids)
+
+        if isinstance(source, Image.Image):
+            source = image_source.MemorySource(source)
+        self.source = source
+        self.size = source.size
+        self.mode = source.mode
+
+        self.level_sizes = [tuple(self.size)]
+        while max(self.level_sizes[-1]) > tile_size:
+            self.level_sizes.append(image_source.level_size(self.size, len(self.level_sizes)))
+
+    def close(self):
+        """释放缓存中属于该金字塔的图块以及数据源已解码的数据 (之后仍可按需重新读取)"""
+        self.cache.drop(self.owner)
+        self.source.close()
+
+    def level_scale(self, level):
+        """level 层相对原图的缩放 (sx, sy)；奇数边长向上取整，两个方向不完全相同"""
+        (lw, lh), (w0, h0) = self.level_sizes[level], self.size
+        return lw / w0, lh / h0
+
+    def level_for(self, ratio):
+        """选择分辨率不低于显示比例的最粗层级，保证缩小时的画质"""
+        if ratio >= 1:
+            return 0
+        level = int(math.floor(math.log2(1.0 / ratio)))
+        return max(0, min(level, len(self.level_sizes) - 1))
+
+    def get_tile(self, level, tx, ty):
+        key = (self.owner, level, tx, ty)
+        tile = self.cache.get(key)
+        if tile is None:
+            lw, lh = self.level_sizes[level]
+            ts = self.tile_size
+            box = (tx * ts, ty * ts, min((tx + 1) * ts, lw), min((ty + 1) * ts, lh))
+            tile = self.source.read_region(level, box)
+            tile.load()
+            self.cache.put(key, tile)
+            profiling.count('tiles_decoded')
+        return tile
+
+    def read_region(self, level, box):
+        """从缓存图块拼出 level 层上的矩形区域 (整数像素坐标，已裁剪到图像范围内)"""
+        x0, y0, x1, y1 = box
+        ts = self.tile_size
+        region = Image.new(self.mode, (x1 - x0, y1 - y0))
+        for ty in range(y0 // ts, (y1 - 1) // ts + 1):
+            for tx in range(x0 // ts, (x1 - 1) // ts + 1):
+                region.paste(self.get_tile(level, tx, ty), (tx * ts - x0, ty * ts - y0))
+        return region
+
+    def render(self, ratio, offset_x, offset_y, canvas_size, background=(51, 51, 51), resample=None,
+               level_bias=0):
+        """
+        渲染当前视口
+        :param ratio: 显示比例 (画布像素 / 原图像素)
+        :param offset_x: 原图左上角在画布上的位置
+        :param canvas_size: 画布尺寸 (cw, ch)
+        :param level_bias: 在合适层级的基础上改用更粗的层级 (快速预览时读取的像素减少为 1/4^k)
+        :return: 画布大小的 PIL 图片
+        """
+        cw, ch = canvas_size
+        out_mode = 'RGB' if self.mode == 'L' else self.mode
+        canvas = Image.new(out_mode, (cw, ch), background)
+
+        iw, ih = self.size
+        # 画布可见范围对应的原图区域
+        vx0 = max(0.0, -offset_x / ratio)
+        vy0 = max(0.0, -offset_y / ratio)
+        vx1 = min(float(iw), (cw - offset_x) / ratio)
+        vy1 = min(float(ih), (ch - offset_y) / ratio)
+        if vx1 <= vx0 or vy1 <= vy0:
+            return canvas
+
+        level = min(self.level_for(ratio) + level_bias, len(self.level_sizes) - 1)
+        sx, sy = self.level_scale(level)
+        lw, lh = self.level_sizes[level]
+
+        # 在 level 层上取整后的读取区域
+        lx0, ly0 = int(math.floor(vx0 * sx)), int(math.floor(vy0 * sy))
+        lx1, ly1 = min(lw, int(math.ceil(vx1 * sx))), min(lh, int(math.ceil(vy1 * sy)))
+        if lx1 <= lx0 or ly1 <= ly0:
+            return canvas
+        with profiling.span('decode'):
+            region = self.read_region(level, (lx0, ly0, lx1, ly1))
+
+        # 目标区域在画布上的像素范围
+        dx0 = int(round(vx0 * ratio + offset_x))
+        dy0 = int(round(vy0 * ratio + offset_y))
+        dx1 = int(round(vx1 * ratio + offset_x))
+        dy1 = int(round(vy1 * ratio + offset_y))
+        if dx1 <= dx0 or dy1 <= dy0:
+            return canvas
+
+        if resample is None:
+            resample = Image.Resampling.NEAREST if ratio > 1 else Image.Resampling.LANCZOS
+        src_box = (vx0 * sx - lx0, vy0 * sy - ly0, vx1 * sx - lx0, vy1 * sy - ly0)
+        with profiling.span('resample'):
+            view = region.resize((dx1 - dx0, dy1 - dy0), resample, box=src_box)
+            if view.mode != out_mode:
+                view = view.convert(out_mode)
+            canvas.paste(view, (dx0, dy0))
+        profiling.count('pixels_resampled', (dx1 - dx0) * (dy1 - dy0))
+        return canvas